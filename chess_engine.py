@@ -0,0 +1,3270 @@
+import random
+import numpy as np
+import math
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import struct
+import mmap
+from array import array
+import time
+import os
+import threading
+
+# The engine of main44.py: the rules, the players, the search and the training, without
+# pygame. Importing this file only defines things, nothing is started and no window opens,
+# so the worker processes and other programs can use Chess and Thinky without paying for SDL.
+
+
+def apply_dx_dy(grid_pos, dxdy):
+    return grid_pos[0] + dxdy[1], grid_pos[1] + dxdy[0]
+
+
+# 1. each square has a number from 0 to 63: row * 8 + column
+def grid_to_index(grid_pos):
+    return grid_pos[0] * 8 + grid_pos[1]
+
+
+ORTHOGONAL = ((0, -1), (0, 1), (1, 0), (-1, 0))
+DIAGONAL = ((-1, -1), (1, 1), (1, -1), (-1, 1))
+
+
+# 1. walk every ray once when the program starts.
+#    RAY_SQUARES[dxdy][index] holds (index, grid_pos) of each square in that direction, nearest first
+def make_ray_squares(dxdy):
+    table = []
+    for index in range(64):
+        squares = []
+        gp = apply_dx_dy((index // 8, index % 8), dxdy)
+        while 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+            squares.append((grid_to_index(gp), gp))
+            gp = apply_dx_dy(gp, dxdy)
+        table.append(tuple(squares))
+    return table
+
+
+RAY_SQUARES = {dxdy: make_ray_squares(dxdy) for dxdy in ORTHOGONAL + DIAGONAL}
+
+
+# 1. Identify and remove the draw function
+class Piece:
+    # 2. remove image
+    def __init__(self, color, grid_pos):
+        self.color = color
+        self.grid_pos = grid_pos
+        self.moved = False
+        # 1. the squares (0 to 63) this piece attacks, kept up to date by Chess
+        self.attacks = []
+
+    def clone_params(self, piece):
+        piece.moved = self.moved
+        piece.attacks = self.attacks
+
+    def value(self):
+        return 0
+
+    # 6. get_role()
+    def get_role(self):
+        return 'unknown'
+
+    # 2. one loop over the ray tables replaces the recursive trace_legal_moves
+    #    and the list concatenation in trace_orthogonal and trace_diagonal
+    def trace_rays(self, chess, directions, cont, danger_zone):
+        legal_moves = []
+        board = chess.board
+        index = grid_to_index(self.grid_pos)
+        for dxdy in directions:
+            for square, gp in RAY_SQUARES[dxdy][index]:
+                piece = board[square]
+                if piece is None:
+                    legal_moves.append(gp)
+                    if not cont:
+                        break
+                else:
+                    # a friend is only included for the danger_zone
+                    if piece.color != self.color or danger_zone:
+                        legal_moves.append(gp)
+                    break
+        return legal_moves
+
+    def get_legal_moves(self, chess, ignore_castile=False):
+        print("not implemented")
+        return []
+
+
+class Rook(Piece):
+    def clone(self):
+        new = Rook(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 10
+
+    def get_role(self):
+        return 'rook'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        return self.trace_rays(chess, ORTHOGONAL, True, ignore_castle)
+
+
+class Knight(Piece):
+    def clone(self):
+        new = Knight(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 2
+
+    def get_role(self):
+        return 'knight'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        moves = (
+            (-1, -2), (1, -2),
+            (-1, 2), (1, 2),
+            (2, -1), (2, 1),
+            (-2, -1), (-2, 1)
+        )
+        legal_moves = []
+        for move in moves:
+            gp = apply_dx_dy(self.grid_pos, move)
+            side = chess.report(gp, self.color)
+            if side == 'opponent' or side == 'none' or ignore_castle:
+                legal_moves.append(gp)
+        return legal_moves
+
+
+class Bishop(Piece):
+    def clone(self):
+        new = Bishop(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 5
+
+    def get_role(self):
+        return 'bishop'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        return self.trace_rays(chess, DIAGONAL, True, ignore_castle)
+
+
+class Queen(Piece):
+    def clone(self):
+        new = Queen(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 100
+
+    def get_role(self):
+        return 'queen'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        return self.trace_rays(chess, ORTHOGONAL + DIAGONAL, True, ignore_castle)
+
+
+class King(Piece):
+    def clone(self):
+        new = King(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 10000
+
+    def get_role(self):
+        return 'king'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        legal_moves = self.trace_rays(chess, ORTHOGONAL + DIAGONAL, False, ignore_castle)
+        # 1. the king may not castle out of check, through check or into check
+        if not self.moved and not ignore_castle and not chess.in_danger(self.grid_pos, self.color):
+            for rook in filter(lambda x: isinstance(x, Rook) and x.color == self.color, chess.pieces):
+                if not rook.moved and rook.grid_pos[0] == self.grid_pos[0]:
+                    xs = range(rook.grid_pos[1] + 1, self.grid_pos[1]) \
+                        if rook.grid_pos[1] < self.grid_pos[1] else range(self.grid_pos[1] + 1, rook.grid_pos[1])
+                    gps = map(lambda x: chess.report((self.grid_pos[0], x), self.color) == 'none', xs)
+                    if all(gps):
+                        step = -1 if rook.grid_pos[1] < self.grid_pos[1] else 1
+                        ys = (self.grid_pos[1] + step, self.grid_pos[1] + 2 * step)
+                        gs = map(lambda x: chess.in_danger((self.grid_pos[0], x), self.color), ys)
+                        if not any(gs):
+                            legal_moves.append((self.grid_pos[0], self.grid_pos[1] + 2 * step))
+        # 10. remove all moves from within danger_zone
+        if not ignore_castle:
+            legal_moves = list(filter(lambda move: not chess.in_danger(move, self.color), legal_moves))
+        return legal_moves
+
+
+class Pawn(Piece):
+    def clone(self):
+        new = Pawn(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 1
+
+    def get_role(self):
+        return 'pawn'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        legal_moves = []
+        dy = -1 if self.color == 'white' else 1
+        # en passant capture?
+        if chess.en_passant:
+            if chess.en_passant[0] == self.grid_pos[0] and abs(chess.en_passant[1] - self.grid_pos[1]) == 1:
+                legal_moves.append((self.grid_pos[0] + dy, chess.en_passant[1]))
+        # capture?
+        for dx in [-1, 1]:
+            gp = apply_dx_dy(self.grid_pos, (dx, dy))
+            side = chess.report(gp, self.color)
+            if side == 'opponent' or ignore_castle: # 11. fix pawn movement for danger_zone
+                legal_moves.append(gp)
+        # march 1?
+        if not ignore_castle: # 11. fix pawn movement for danger_zone
+            gp = apply_dx_dy(self.grid_pos, (0, dy))
+            side = chess.report(gp, self.color)
+            if side == 'none':
+                legal_moves.append(gp)
+                # march 2?
+                if (self.color == 'black' and self.grid_pos[0] == 1) or \
+                        (self.color == 'white' and self.grid_pos[0] == 6):
+                    dy = -2 if self.color == 'white' else 2
+                    gp = apply_dx_dy(self.grid_pos, (0, dy))
+                    side = chess.report(gp, self.color)
+                    if side == 'none':
+                        legal_moves.append(gp)
+        return legal_moves
+
+
+# 3. remove piece_images and piece_images.get_image(color, role)
+def create_pieces():
+    return [
+        Rook('black', (0, 0)),
+        Knight('black', (0, 1)),
+        Bishop('black', (0, 2)),
+        Queen('black', (0, 3)),
+        King('black', (0, 4)),
+        Bishop('black', (0, 5)),
+        Knight('black', (0, 6)),
+        Rook('black', (0, 7)),
+        *[Pawn('black', (1, n)) for n in range(8)],
+
+        *[Pawn('white', (6, n)) for n in range(8)],
+        Rook('white', (7, 0)),
+        Knight('white', (7, 1)),
+        Bishop('white', (7, 2)),
+        Queen('white', (7, 3)),
+        King('white', (7, 4)),
+        Bishop('white', (7, 5)),
+        Knight('white', (7, 6)),
+        Rook('white', (7, 7))
+    ]
+
+
+# 1. Zobrist hashing: a random 64-bit number for every piece on every square, for black
+#    to move, for the castling rights and for the en passant column. A position's key is
+#    all its numbers XORed together, so a move only XORs out what left and XORs in what
+#    came instead of looking at the whole board again. The seed keeps the keys the same
+#    from run to run.
+ROLES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+zobrist_random = random.Random(29)
+ZOBRIST_PIECES = {color: {role: [zobrist_random.getrandbits(64) for index in range(64)] for role in ROLES}
+                  for color in ('white', 'black')}
+ZOBRIST_BLACK = zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [zobrist_random.getrandbits(64) for castling in range(16)]
+ZOBRIST_EN_PASSANT = [zobrist_random.getrandbits(64) for column in range(8)]
+# the king and rook squares of the four castling rights: white king side, white queen side,
+# black king side, black queen side
+CASTLING_SQUARES = ((60, 63), (60, 56), (4, 7), (4, 0))
+
+
+# 1. everything make_move changes, so that unmake_move can put it back
+class Undo:
+    def __init__(self, chess, piece, move):
+        self.move = move
+        self.piece = piece
+        self.moved = piece.moved
+        self.changed_squares = [grid_to_index(move[0]), grid_to_index(move[1])]
+        self.captured = None
+        self.captured_index = None
+        self.rook = None
+        self.rook_source = None
+        self.rook_moved = False
+        self.promoted = None
+        self.piece_index = None
+        self.player = chess.player
+        self.winner = chess.winner
+        self.en_passant = chess.en_passant
+        self.check = chess.check
+        self.checkmate = chess.checkmate
+        self.stalemate = chess.stalemate
+        self.castling = chess.castling
+        self.key = chess.key
+        self.score = chess.score
+
+
+class Chess:
+    def __init__(self, pieces, attack_map=None):
+        self.pieces = pieces
+        # 2. the board remembers which piece stands on each of the 64 squares
+        self.board = [None] * 64
+        for piece in self.pieces:
+            self.board[grid_to_index(piece.grid_pos)] = piece
+        self.deadpile = []
+        self.player = 'white'
+        self.winner = None
+        self.en_passant = None
+        self.check = False
+        self.checkmate = False
+        self.stalemate = False
+        # 2. the castling rights as 4 bits and the Zobrist key of the position
+        self.castling = self.get_castling()
+        self.key = self.get_key()
+        # 1. the material score, white minus black. make_move changes it on captures and promotions
+        self.score = self.get_score()
+        # 2. attack_map[color][square] counts the pieces of color attacking the square
+        if attack_map:
+            self.attack_map = {color: list(attack_map[color]) for color in attack_map}
+        else:
+            self.attack_map = {'white': [0] * 64, 'black': [0] * 64}
+            for piece in self.pieces:
+                self.add_attacks(piece)
+
+    def clone(self):
+        new_pieces = [piece.clone() for piece in self.pieces]
+        # 3. the cloned pieces keep their attacks, so copy the map instead of rebuilding it
+        new_chess = Chess(new_pieces, self.attack_map)
+        new_chess.player = self.player
+        new_chess.winner = self.winner
+        new_chess.en_passant = self.en_passant
+        new_chess.check = self.check
+        new_chess.checkmate = self.checkmate
+        new_chess.stalemate = self.stalemate
+        new_chess.castling = self.castling
+        new_chess.key = self.key
+        new_chess.score = self.score
+        return new_chess
+
+    # 3. a right is still there while the king and that corner's rook have never moved
+    def get_castling(self):
+        castling = 0
+        for bit, (king_index, rook_index) in enumerate(CASTLING_SQUARES):
+            color = 'white' if bit < 2 else 'black'
+            king = self.board[king_index]
+            rook = self.board[rook_index]
+            if isinstance(king, King) and king.color == color and not king.moved and \
+                    isinstance(rook, Rook) and rook.color == color and not rook.moved:
+                castling |= 1 << bit
+        return castling
+
+    # 4. the key from scratch, make_move keeps it up to date without calling this
+    def get_key(self):
+        key = ZOBRIST_CASTLING[self.get_castling()]
+        for piece in self.pieces:
+            key ^= ZOBRIST_PIECES[piece.color][piece.get_role()][grid_to_index(piece.grid_pos)]
+        if self.player == 'black':
+            key ^= ZOBRIST_BLACK
+        if self.en_passant:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+        return key
+
+    def compute_legal_moves(self, piece):
+        return piece.get_legal_moves(self)
+
+    # 3. keep self.pieces and self.board in sync
+    def add_piece(self, piece):
+        self.pieces.append(piece)
+        self.board[grid_to_index(piece.grid_pos)] = piece
+        self.add_attacks(piece)
+
+    def remove_piece(self, piece):
+        self.pieces.remove(piece)
+        self.board[grid_to_index(piece.grid_pos)] = None
+        self.remove_attacks(piece)
+
+    # 4. a piece's attacks are its danger_zone moves that stay on the board
+    def add_attacks(self, piece):
+        attacks = set()
+        for gp in piece.get_legal_moves(self, ignore_castle=True):
+            if 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+                attacks.add(grid_to_index(gp))
+        piece.attacks = list(attacks)
+        for square in piece.attacks:
+            self.attack_map[piece.color][square] += 1
+
+    def remove_attacks(self, piece):
+        for square in piece.attacks:
+            self.attack_map[piece.color][square] -= 1
+        piece.attacks = []
+
+    # 5. after a move, only the moved pieces and the rooks, bishops and queens whose
+    #    rays reached one of the changed squares attack something different
+    def update_attacks(self, squares, moved_pieces):
+        for piece in self.pieces:
+            if piece in moved_pieces or \
+                    (isinstance(piece, (Rook, Bishop, Queen)) and any(square in piece.attacks for square in squares)):
+                self.remove_attacks(piece)
+                self.add_attacks(piece)
+
+    def in_danger(self, grid_pos, color):
+        # is grid_pos attacked by the opponent of color?
+        oppo_color = 'black' if color == 'white' else 'white'
+        return self.attack_map[oppo_color][grid_to_index(grid_pos)] > 0
+
+    def move_piece(self, piece, destination):
+        self.board[grid_to_index(piece.grid_pos)] = None
+        piece.grid_pos = destination
+        self.board[grid_to_index(destination)] = piece
+
+    # 4. look up the board instead of searching every piece
+    def report(self, grid_pos, color):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            piece = self.board[grid_to_index(grid_pos)]
+            if piece is None:
+                return 'none'
+            return 'friend' if piece.color == color else 'opponent'
+        else:
+            return 'OOB'
+
+    def get_piece(self, grid_pos):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            return self.board[grid_to_index(grid_pos)]
+        return None
+
+    def get_legal_moves(self, grid_pos):
+        piece = self.get_piece(grid_pos)
+        if piece and piece.color == self.player:
+            return [move[1] for move in self.get_all_moves() if move[0] == grid_pos]
+        return []
+
+    def get_danger_zone(self, color):
+        oppo_color = 'black' if color == 'white' else 'white'
+        return {(square // 8, square % 8) for square in range(64) if self.attack_map[oppo_color][square] > 0}
+
+    def get_line(self, grid_pos, target):
+        # the squares from grid_pos (not included) to target (included) when they are on one line
+        index = grid_to_index(grid_pos)
+        for dxdy in ORTHOGONAL + DIAGONAL:
+            line = []
+            for square, gp in RAY_SQUARES[dxdy][index]:
+                line.append(gp)
+                if gp == target:
+                    return line
+                if self.board[square]:
+                    break
+        return [target]
+
+    # 2. a friend is pinned when it is the only piece between our king and an opponent
+    #    rook, bishop or queen on that line. It may only move along the line.
+    def get_pins(self, king):
+        pins = {}
+        index = grid_to_index(king.grid_pos)
+        for dxdy in ORTHOGONAL + DIAGONAL:
+            sliders = (Rook, Queen) if dxdy in ORTHOGONAL else (Bishop, Queen)
+            friend = None
+            line = []
+            for square, gp in RAY_SQUARES[dxdy][index]:
+                line.append(gp)
+                piece = self.board[square]
+                if piece is None:
+                    continue
+                if piece.color == king.color and friend is None:
+                    friend = piece
+                    continue
+                if friend and piece.color != king.color and isinstance(piece, sliders):
+                    pins[friend] = line
+                break
+        return pins
+
+    def is_safe(self, move, king):
+        # try the move and see if our king is attacked afterwards
+        undo = self.make_move(move, checkmate_check=False)
+        safe = not self.in_danger(king.grid_pos, king.color)
+        self.unmake_move(undo)
+        return safe
+
+    # 3. only legal moves: find the checkers and pins once, then keep the moves that
+    #    leave our king safe
+    def get_all_moves(self):
+        pieces = list(filter(lambda x: x.color == self.player, self.pieces))
+        king = next(filter(lambda x: isinstance(x, King), pieces))
+        king_index = grid_to_index(king.grid_pos)
+        checkers = list(filter(lambda x: x.color != self.player and king_index in x.attacks, self.pieces))
+        # with one checker, the others must capture it or block its line
+        blocks = self.get_line(king.grid_pos, checkers[0].grid_pos) if len(checkers) == 1 else None
+        # the king may not step back along the line of a checking rook, bishop or queen,
+        # that square is only safe because the king itself stands in the way
+        behind = []
+        for checker in checkers:
+            if isinstance(checker, (Rook, Bishop, Queen)):
+                dy = (king.grid_pos[0] > checker.grid_pos[0]) - (king.grid_pos[0] < checker.grid_pos[0])
+                dx = (king.grid_pos[1] > checker.grid_pos[1]) - (king.grid_pos[1] < checker.grid_pos[1])
+                behind.append(apply_dx_dy(king.grid_pos, (dx, dy)))
+        pins = self.get_pins(king)
+        moves = []
+        for piece in pieces:
+            if piece is not king and len(checkers) > 1:
+                continue
+            destinations = piece.get_legal_moves(self)
+            for destination in destinations:
+                move = piece.grid_pos, destination
+                if piece is king:
+                    if destination in behind:
+                        continue
+                elif isinstance(piece, Pawn) and destination[1] != piece.grid_pos[1] and \
+                        self.board[grid_to_index(destination)] is None:
+                    # en passant removes two pawns from one row, so simply try it
+                    if not self.is_safe(move, king):
+                        continue
+                else:
+                    if blocks and destination not in blocks:
+                        continue
+                    if piece in pins and destination not in pins[piece]:
+                        continue
+                moves.append(move)
+        return moves
+
+    def apply_move(self, source, destination, promotion=None, checkmate_check=True):
+        # check the state
+        # 5. find the moving piece on the board
+        piece = self.get_piece(source)
+        if piece and piece.color == self.player:
+            if destination in self.get_legal_moves(source):
+                self.make_move((source, destination), promotion, checkmate_check)
+
+    # 2. make_move does the work of apply_move without checking the move again,
+    #    and returns an Undo so that unmake_move can take it back
+    def make_move(self, move, promotion=None, checkmate_check=True):
+        source, destination = move
+        piece = self.get_piece(source)
+        undo = Undo(self, piece, move)
+        # capture opponent piece
+        # 1. fix: capture the piece on destination, or the pawn passed by en passant,
+        #    never another piece next to it
+        oppo_piece = self.get_piece(destination)
+        if oppo_piece is None and isinstance(piece, Pawn) and destination[1] != source[1]:
+            oppo_piece = self.get_piece((source[0], destination[1]))
+        if oppo_piece and oppo_piece.color != self.player:
+            undo.changed_squares.append(grid_to_index(oppo_piece.grid_pos))
+            undo.captured = oppo_piece
+            undo.captured_index = self.pieces.index(oppo_piece)
+            self.remove_piece(oppo_piece)
+            self.deadpile.append(oppo_piece)
+            self.key ^= ZOBRIST_PIECES[oppo_piece.color][oppo_piece.get_role()][grid_to_index(oppo_piece.grid_pos)]
+            # 2. the captured piece no longer counts
+            self.score -= oppo_piece.value() if oppo_piece.color == 'white' else -oppo_piece.value()
+            if isinstance(oppo_piece, King):
+                self.winner = 'black' if oppo_piece.color == 'white' else 'white'
+        # move
+        # 5. XOR out everything that changes, and XOR the new values in below
+        if self.en_passant:
+            self.key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+        self.en_passant = None  # Muse be placed AFTER capture
+        # castling?
+        if isinstance(piece, King) and abs(piece.grid_pos[1] - destination[1]) > 1:
+            if destination[1] > piece.grid_pos[1]:
+                gp = piece.grid_pos[0], 7
+                gpd = piece.grid_pos[0], destination[1] - 1
+            else:
+                gp = piece.grid_pos[0], 0
+                gpd = piece.grid_pos[0], destination[1] + 1
+            rook = self.get_piece(gp)
+            undo.changed_squares += [grid_to_index(gp), grid_to_index(gpd)]
+            undo.rook = rook
+            undo.rook_source = gp
+            undo.rook_moved = rook.moved
+            self.move_piece(rook, gpd)
+            rook.moved = True
+            self.key ^= ZOBRIST_PIECES[rook.color]['rook'][grid_to_index(gp)] ^ \
+                ZOBRIST_PIECES[rook.color]['rook'][grid_to_index(gpd)]
+        self.move_piece(piece, destination)
+        zobrist = ZOBRIST_PIECES[piece.color][piece.get_role()]
+        self.key ^= zobrist[grid_to_index(source)] ^ zobrist[grid_to_index(destination)]
+        # 4. Fix promotion
+        if promotion and isinstance(piece, Pawn) and (destination[0] == 0 or destination[0] == 7):
+            role = promotion
+            if role == 'queen':
+                new_piece = Queen(piece.color, destination)
+            elif role == 'bishop':
+                new_piece = Bishop(piece.color, destination)
+            elif role == 'knight':
+                new_piece = Knight(piece.color, destination)
+            else:
+                new_piece = Rook(piece.color, destination)
+            undo.piece_index = self.pieces.index(piece)
+            undo.promoted = new_piece
+            self.remove_piece(piece)
+            self.deadpile.append(piece)
+            self.add_piece(new_piece)
+            self.key ^= zobrist[grid_to_index(destination)] ^ \
+                ZOBRIST_PIECES[new_piece.color][new_piece.get_role()][grid_to_index(destination)]
+            gain = new_piece.value() - piece.value()
+            self.score += gain if piece.color == 'white' else -gain
+            piece = new_piece
+        self.update_attacks(undo.changed_squares, [piece, undo.rook])
+        piece.moved = True
+        if isinstance(piece, Pawn) and 2 == abs(source[0] - destination[0]):
+            self.en_passant = destination
+            self.key ^= ZOBRIST_EN_PASSANT[destination[1]]
+        if self.castling:
+            castling = self.get_castling()
+            self.key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+            self.castling = castling
+        # check?
+        self.check = False
+        if self.winner is None:
+            oppo_king = next(filter(lambda x: isinstance(x, King) and x.color != self.player, self.pieces))
+            # 1. detect Checkmate! only inside check
+            self.check = self.in_danger(oppo_king.grid_pos, oppo_king.color)
+        self.player = 'white' if self.player == 'black' else 'black'
+        self.key ^= ZOBRIST_BLACK
+        # 4. no legal moves after switching player: checkmate in check, otherwise stalemate
+        if checkmate_check and self.winner is None and not self.get_all_moves():
+            if self.check:
+                self.winner = 'black' if self.player == 'white' else 'white'
+                self.checkmate = True
+            else:
+                self.winner = 'draw'
+                self.stalemate = True
+        return undo
+
+    # 4. put everything back the way it was before make_move
+    def unmake_move(self, undo):
+        piece = undo.piece
+        source, destination = undo.move
+        self.player = undo.player
+        self.winner = undo.winner
+        self.en_passant = undo.en_passant
+        self.check = undo.check
+        self.checkmate = undo.checkmate
+        self.stalemate = undo.stalemate
+        self.castling = undo.castling
+        self.key = undo.key
+        self.score = undo.score
+        if undo.promoted:
+            self.remove_piece(undo.promoted)
+            self.deadpile.pop()
+            self.pieces.insert(undo.piece_index, piece)
+            self.board[grid_to_index(destination)] = piece
+        self.move_piece(piece, source)
+        piece.moved = undo.moved
+        if undo.rook:
+            self.move_piece(undo.rook, undo.rook_source)
+            undo.rook.moved = undo.rook_moved
+        if undo.captured:
+            self.deadpile.pop()
+            self.pieces.insert(undo.captured_index, undo.captured)
+            self.board[grid_to_index(undo.captured.grid_pos)] = undo.captured
+        # the attacks only depend on the board, so update them the same way as make_move did
+        self.update_attacks(undo.changed_squares, [piece, undo.rook, undo.captured])
+
+    # 1. a null move only passes the turn to the opponent, the search uses it to see how good
+    #    a position is even without moving. Not allowed in check.
+    def make_null_move(self):
+        undo = self.en_passant, self.check, self.key
+        if self.en_passant:
+            self.key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+        self.en_passant = None
+        self.check = False
+        self.player = 'white' if self.player == 'black' else 'black'
+        self.key ^= ZOBRIST_BLACK
+        return undo
+
+    def unmake_null_move(self, undo):
+        self.en_passant, self.check, self.key = undo
+        self.player = 'white' if self.player == 'black' else 'black'
+
+    def has_pieces(self, color):
+        # any pieces other than pawns and the king?
+        return any(piece.color == color and not isinstance(piece, (Pawn, King)) for piece in self.pieces)
+
+    # 1. cheap enough to ask at every node, before looking for a tablebase
+    def count_pieces(self):
+        return len(self.pieces)
+
+    # 3. the score from scratch, like get_key
+    def get_score(self):
+        sum = 0
+        for piece in self.pieces:
+            sign = 1 if piece.color == 'white' else -1
+            sum += piece.value() * sign
+        return sum
+
+    def evaluate(self):
+        return self.score
+
+    # 1. Every child of the position with its score, (move, score) pairs. With an evaluator the
+    #    children are scored in one batch. Without one the material of a child is this score
+    #    minus what the move captures, so the moves are not even made.
+    def score_children(self, moves=None, evaluator=None):
+        if moves is None:
+            moves = self.get_all_moves()
+        if evaluator:
+            return list(zip(moves, evaluator.evaluate_children(self, moves)))
+        children = []
+        for move in moves:
+            source, destination = move
+            captured = self.board[grid_to_index(destination)]
+            if captured is None and isinstance(self.board[grid_to_index(source)], Pawn) and destination[1] != source[1]:
+                captured = self.board[grid_to_index((source[0], destination[1]))]
+            score = self.score
+            if captured and captured.color != self.player:
+                score -= captured.value() if captured.color == 'white' else -captured.value()
+            # a pawn reaching the last row becomes a queen, as in the search
+            if (destination[0] == 0 or destination[0] == 7) and isinstance(self.board[grid_to_index(source)], Pawn):
+                gain = ROLE_VALUES['queen'] - ROLE_VALUES['pawn']
+                score += gain if self.player == 'white' else -gain
+            children.append((move, score))
+        return children
+
+    # 2. the board as 64 (color, role) pairs, used as the Q-Learning state
+    def get_state(self):
+        chess_state = [('empty', '')] * 64
+        for piece in self.pieces:
+            chess_state[grid_to_index(piece.grid_pos)] = piece.color, piece.get_role()
+        return tuple(chess_state)
+
+    # 1. the board as an 8x8x12 tensor: plane PLANES[color, role] is 1 where such a piece stands
+    def get_tensor(self):
+        tensor = np.zeros((64, 12), np.float32)
+        for piece in self.pieces:
+            tensor[grid_to_index(piece.grid_pos), PLANES[piece.color, piece.get_role()]] = 1
+        return tensor.reshape(8, 8, 12)
+
+
+# 3. Bitboards: one 64-bit number per color and role.
+#    Bit number row * 8 + column is 1 when that kind of piece stands on the square.
+ROLE_CLASSES = {'pawn': Pawn, 'knight': Knight, 'bishop': Bishop, 'rook': Rook, 'queen': Queen, 'king': King}
+ROLE_VALUES = {role: ROLE_CLASSES[role]('white', (0, 0)).value() for role in ROLES}
+INDEX_TO_GRID = [(index // 8, index % 8) for index in range(64)]
+
+
+def other_color(color):
+    return 'black' if color == 'white' else 'white'
+
+
+def get_bits(bits):
+    # the square numbers of all the 1 bits, lowest first
+    indexes = []
+    while bits:
+        low = bits & -bits
+        indexes.append(low.bit_length() - 1)
+        bits ^= low
+    return indexes
+
+
+# 4. precompute where a knight, king or pawn attacks from every square
+def make_step_table(steps):
+    table = []
+    for index in range(64):
+        bits = 0
+        for step in steps:
+            gp = apply_dx_dy(INDEX_TO_GRID[index], step)
+            if 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+                bits |= 1 << grid_to_index(gp)
+        table.append(bits)
+    return table
+
+
+KNIGHT_ATTACKS = make_step_table(((-1, -2), (1, -2), (-1, 2), (1, 2), (2, -1), (2, 1), (-2, -1), (-2, 1)))
+KING_ATTACKS = make_step_table(((0, -1), (0, 1), (1, 0), (-1, 0), (-1, -1), (1, 1), (1, -1), (-1, 1)))
+PAWN_ATTACKS = {
+    'white': make_step_table(((-1, -1), (1, -1))),
+    'black': make_step_table(((-1, 1), (1, 1)))
+}
+
+# 5. precompute the rays: every square a rook or bishop could reach on an empty board
+def make_ray_table(dxdy):
+    table = []
+    for index in range(64):
+        bits = 0
+        gp = apply_dx_dy(INDEX_TO_GRID[index], dxdy)
+        while 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+            bits |= 1 << grid_to_index(gp)
+            gp = apply_dx_dy(gp, dxdy)
+        table.append(bits)
+    return table
+
+
+RAYS = {dxdy: make_ray_table(dxdy) for dxdy in ORTHOGONAL + DIAGONAL}
+
+
+def slide(index, occupancy, directions):
+    # 6. cut each ray after the first piece in its way (the blocker itself is included)
+    attacks = 0
+    for dxdy in directions:
+        ray = RAYS[dxdy][index]
+        blockers = ray & occupancy
+        if blockers:
+            if dxdy[1] * 8 + dxdy[0] > 0:
+                first = (blockers & -blockers).bit_length() - 1  # lowest bit is the nearest
+            else:
+                first = blockers.bit_length() - 1  # highest bit is the nearest
+            ray ^= RAYS[dxdy][first]
+        attacks |= ray
+    return attacks
+
+
+# 7. a slider only cares about the pieces on its own lines (rank, file and two diagonals).
+#    For every square and line, remember the answer of slide() for every way those squares
+#    can be filled, then look it up instead of walking the rays.
+def make_line_table(index, dxdy):
+    back = (-dxdy[0], -dxdy[1])
+    mask = 0
+    for direction in (dxdy, back):
+        ray = RAYS[direction][index]
+        if ray:
+            last = ray.bit_length() - 1 if direction[1] * 8 + direction[0] > 0 else (ray & -ray).bit_length() - 1
+            mask |= ray ^ (1 << last)  # the last square of a ray never blocks anything
+    table = {}
+    subset = 0
+    while True:
+        table[subset] = slide(index, subset, (dxdy, back))
+        subset = (subset - mask) & mask
+        if subset == 0:
+            break
+    return mask, table
+
+
+ORTHOGONAL_LINES = [(make_line_table(index, (1, 0)), make_line_table(index, (0, 1))) for index in range(64)]
+DIAGONAL_LINES = [(make_line_table(index, (1, 1)), make_line_table(index, (1, -1))) for index in range(64)]
+
+
+def rook_attacks(index, occupancy):
+    (mask1, table1), (mask2, table2) = ORTHOGONAL_LINES[index]
+    return table1[occupancy & mask1] | table2[occupancy & mask2]
+
+
+def bishop_attacks(index, occupancy):
+    (mask1, table1), (mask2, table2) = DIAGONAL_LINES[index]
+    return table1[occupancy & mask1] | table2[occupancy & mask2]
+
+
+# 5. BETWEEN[a][b] has the squares strictly between a and b when they share a line
+def make_between_table():
+    table = [[0] * 64 for index in range(64)]
+    for index in range(64):
+        for dxdy in ORTHOGONAL + DIAGONAL:
+            for square in get_bits(RAYS[dxdy][index]):
+                table[index][square] = RAYS[dxdy][index] & ~RAYS[dxdy][square] & ~(1 << square)
+    return table
+
+
+BETWEEN = make_between_table()
+
+
+class BitChess:
+    # 8. same methods and attributes as Chess, so every bot can use either one
+    def __init__(self, pieces):
+        self.boards = {color: {role: 0 for role in ROLES} for color in ('white', 'black')}
+        self.occupancy = {'white': 0, 'black': 0}
+        self.unmoved = 0  # squares of the pieces that never moved, used for castling
+        for piece in pieces:
+            self.put(piece.color, piece.get_role(), grid_to_index(piece.grid_pos))
+            if not piece.moved:
+                self.unmoved |= 1 << grid_to_index(piece.grid_pos)
+        self.player = 'white'
+        self.winner = None
+        self.en_passant = None
+        self.check = False
+        self.checkmate = False
+        self.stalemate = False
+        self.castling = self.get_castling()
+        self.key = self.get_key()
+        self.score = self.get_score()
+
+    def clone(self):
+        new_chess = BitChess([])
+        new_chess.boards = {color: dict(self.boards[color]) for color in self.boards}
+        new_chess.occupancy = dict(self.occupancy)
+        new_chess.unmoved = self.unmoved
+        new_chess.player = self.player
+        new_chess.winner = self.winner
+        new_chess.en_passant = self.en_passant
+        new_chess.check = self.check
+        new_chess.checkmate = self.checkmate
+        new_chess.stalemate = self.stalemate
+        new_chess.castling = self.castling
+        new_chess.key = self.key
+        new_chess.score = self.score
+        return new_chess
+
+    # 6. the same castling rights and Zobrist key as Chess, so both give one position one key
+    def get_castling(self):
+        castling = 0
+        for bit, (king_index, rook_index) in enumerate(CASTLING_SQUARES):
+            boards = self.boards['white' if bit < 2 else 'black']
+            if boards['king'] & self.unmoved & (1 << king_index) and boards['rook'] & self.unmoved & (1 << rook_index):
+                castling |= 1 << bit
+        return castling
+
+    def get_key(self):
+        key = ZOBRIST_CASTLING[self.get_castling()]
+        for color in ('white', 'black'):
+            for role in ROLES:
+                for index in get_bits(self.boards[color][role]):
+                    key ^= ZOBRIST_PIECES[color][role][index]
+        if self.player == 'black':
+            key ^= ZOBRIST_BLACK
+        if self.en_passant:
+            key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+        return key
+
+    def put(self, color, role, index):
+        self.boards[color][role] |= 1 << index
+        self.occupancy[color] |= 1 << index
+
+    def take(self, color, role, index):
+        self.boards[color][role] &= ~(1 << index)
+        self.occupancy[color] &= ~(1 << index)
+
+    def find(self, index):
+        bit = 1 << index
+        for color in ('white', 'black'):
+            if self.occupancy[color] & bit:
+                for role in ROLES:
+                    if self.boards[color][role] & bit:
+                        return color, role
+        return None, None
+
+    @property
+    def pieces(self):
+        # only for drawing: build Piece objects from the bits
+        pieces = []
+        for color in ('white', 'black'):
+            for role in ROLES:
+                for index in get_bits(self.boards[color][role]):
+                    pieces.append(self.get_piece(INDEX_TO_GRID[index]))
+        return pieces
+
+    def report(self, grid_pos, color):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            bit = 1 << grid_to_index(grid_pos)
+            if self.occupancy[color] & bit:
+                return 'friend'
+            if self.occupancy[other_color(color)] & bit:
+                return 'opponent'
+            return 'none'
+        else:
+            return 'OOB'
+
+    def get_piece(self, grid_pos):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            index = grid_to_index(grid_pos)
+            color, role = self.find(index)
+            if color:
+                piece = ROLE_CLASSES[role](color, grid_pos)
+                piece.moved = not (self.unmoved & (1 << index))
+                return piece
+        return None
+
+    def get_state(self):
+        chess_state = [('empty', '')] * 64
+        for color in ('white', 'black'):
+            for role in ROLES:
+                for index in get_bits(self.boards[color][role]):
+                    chess_state[index] = color, role
+        return tuple(chess_state)
+
+    def get_tensor(self):
+        # the bits of the 12 bitboards are already the 12 planes
+        boards = np.array([self.boards[color][role] for color in ('white', 'black') for role in ROLES], '<u8')
+        planes = np.unpackbits(boards.view(np.uint8), bitorder='little').reshape(12, 64)
+        return planes.T.reshape(8, 8, 12).astype(np.float32)
+
+    def get_attacks(self, color):
+        # 9. every square attacked by color, including squares of its own pieces
+        boards = self.boards[color]
+        occupancy = self.occupancy['white'] | self.occupancy['black']
+        attacks = 0
+        for index in get_bits(boards['pawn']):
+            attacks |= PAWN_ATTACKS[color][index]
+        for index in get_bits(boards['knight']):
+            attacks |= KNIGHT_ATTACKS[index]
+        for index in get_bits(boards['king']):
+            attacks |= KING_ATTACKS[index]
+        for index in get_bits(boards['bishop'] | boards['queen']):
+            attacks |= bishop_attacks(index, occupancy)
+        for index in get_bits(boards['rook'] | boards['queen']):
+            attacks |= rook_attacks(index, occupancy)
+        return attacks
+
+    def attacked(self, index, color):
+        # 10. is one square attacked by color? Look outwards from the square instead of
+        #    building the whole attack map
+        boards = self.boards[color]
+        occupancy = self.occupancy['white'] | self.occupancy['black']
+        return bool(PAWN_ATTACKS[other_color(color)][index] & boards['pawn'] or
+                    KNIGHT_ATTACKS[index] & boards['knight'] or
+                    KING_ATTACKS[index] & boards['king'] or
+                    bishop_attacks(index, occupancy) & (boards['bishop'] | boards['queen']) or
+                    rook_attacks(index, occupancy) & (boards['rook'] | boards['queen']))
+
+    def get_attackers(self, index, color, occupancy):
+        # 6. the pieces of color attacking one square, as bits
+        boards = self.boards[color]
+        return (PAWN_ATTACKS[other_color(color)][index] & boards['pawn'] |
+                KNIGHT_ATTACKS[index] & boards['knight'] |
+                KING_ATTACKS[index] & boards['king'] |
+                bishop_attacks(index, occupancy) & (boards['bishop'] | boards['queen']) |
+                rook_attacks(index, occupancy) & (boards['rook'] | boards['queen']))
+
+    def get_danger_zone(self, color):
+        return {INDEX_TO_GRID[index] for index in get_bits(self.get_attacks(other_color(color)))}
+
+    def get_targets(self, index, color, role):
+        # 11. the destinations of one piece as bits, following the same rules as Piece.get_legal_moves
+        own = self.occupancy[color]
+        opponent = self.occupancy[other_color(color)]
+        if role == 'knight':
+            return KNIGHT_ATTACKS[index] & ~own
+        if role == 'bishop':
+            return bishop_attacks(index, own | opponent) & ~own
+        if role == 'rook':
+            return rook_attacks(index, own | opponent) & ~own
+        if role == 'queen':
+            return (bishop_attacks(index, own | opponent) | rook_attacks(index, own | opponent)) & ~own
+        row, column = INDEX_TO_GRID[index]
+        if role == 'pawn':
+            targets = PAWN_ATTACKS[color][index] & opponent
+            dy = -1 if color == 'white' else 1
+            if self.en_passant:
+                if self.en_passant[0] == row and abs(self.en_passant[1] - column) == 1:
+                    targets |= 1 << grid_to_index((row + dy, self.en_passant[1]))
+            empty = ~(own | opponent)
+            if 0 <= row + dy < 8 and empty & (1 << (index + dy * 8)):
+                targets |= 1 << (index + dy * 8)
+                if (color == 'black' and row == 1) or (color == 'white' and row == 6):
+                    if empty & (1 << (index + dy * 16)):
+                        targets |= 1 << (index + dy * 16)
+            return targets
+        # king
+        oppo_color = other_color(color)
+        targets = KING_ATTACKS[index] & ~own
+        # 7. castle like the King class: not out of, through or into check
+        if self.unmoved & (1 << index) and not self.attacked(index, oppo_color):
+            for rook_index in get_bits(self.boards[color]['rook'] & self.unmoved):
+                rook_row, rook_column = INDEX_TO_GRID[rook_index]
+                if rook_row != row:
+                    continue
+                if rook_column < column:
+                    xs = range(rook_column + 1, column)
+                else:
+                    xs = range(column + 1, rook_column)
+                if all(self.report((row, x), color) == 'none' for x in xs):
+                    step = -1 if rook_column < column else 1
+                    if not self.attacked(index + step, oppo_color) and not self.attacked(index + 2 * step, oppo_color):
+                        targets |= 1 << (index + 2 * step)
+        # 8. look for attackers as if the king was already gone from its square,
+        #    so it cannot step back along the line of a checking rook, bishop or queen
+        occupancy = (own | opponent) & ~(1 << index)
+        for target in get_bits(targets):
+            if self.get_attackers(target, oppo_color, occupancy):
+                targets ^= 1 << target
+        return targets
+
+    def get_legal_moves(self, grid_pos):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            index = grid_to_index(grid_pos)
+            color, role = self.find(index)
+            if color == self.player:
+                return [move[1] for move in self.get_all_moves() if move[0] == grid_pos]
+        return []
+
+    def get_all_moves(self):
+        color = self.player
+        oppo_color = other_color(color)
+        boards = self.boards[color]
+        oppo_boards = self.boards[oppo_color]
+        own = self.occupancy[color]
+        opponent = self.occupancy[oppo_color]
+        occupancy = own | opponent
+        king_index = boards['king'].bit_length() - 1
+        king = INDEX_TO_GRID[king_index]
+        moves = [(king, INDEX_TO_GRID[target]) for target in get_bits(self.get_targets(king_index, color, 'king'))]
+        # 9. with two checkers only the king may move
+        checkers = self.get_attackers(king_index, oppo_color, occupancy)
+        if checkers & (checkers - 1):
+            return moves
+        # 10. with one checker, the other pieces must capture it or block its line
+        check_mask = ~0
+        if checkers:
+            check_mask = checkers | BETWEEN[king_index][checkers.bit_length() - 1]
+        # 11. look from the king through our own pieces: an opponent rook, bishop or queen
+        #     with exactly one of our pieces in between pins that piece to the line
+        pins = {}
+        snipers = rook_attacks(king_index, opponent) & (oppo_boards['rook'] | oppo_boards['queen']) | \
+            bishop_attacks(king_index, opponent) & (oppo_boards['bishop'] | oppo_boards['queen'])
+        for sniper in get_bits(snipers):
+            blockers = BETWEEN[king_index][sniper] & occupancy
+            if blockers & own and blockers & (blockers - 1) == 0:
+                pins[blockers.bit_length() - 1] = BETWEEN[king_index][sniper] | (1 << sniper)
+        # 12. knights and sliders need no special rules, so work them out right here
+        for role in ('knight', 'bishop', 'rook', 'queen'):
+            for index in get_bits(boards[role]):
+                if role == 'knight':
+                    targets = KNIGHT_ATTACKS[index]
+                elif role == 'bishop':
+                    targets = bishop_attacks(index, occupancy)
+                elif role == 'rook':
+                    targets = rook_attacks(index, occupancy)
+                else:
+                    targets = bishop_attacks(index, occupancy) | rook_attacks(index, occupancy)
+                targets &= ~own & check_mask
+                if index in pins:
+                    targets &= pins[index]
+                source = INDEX_TO_GRID[index]
+                while targets:
+                    low = targets & -targets
+                    moves.append((source, INDEX_TO_GRID[low.bit_length() - 1]))
+                    targets ^= low
+        for index in get_bits(boards['pawn']):
+            source = INDEX_TO_GRID[index]
+            targets = self.get_targets(index, color, 'pawn')
+            # en passant removes two pawns from one row, so simply try it
+            en_passant = targets & PAWN_ATTACKS[color][index] & ~opponent
+            targets &= ~en_passant & check_mask
+            if index in pins:
+                targets &= pins[index]
+            for target in get_bits(targets):
+                moves.append((source, INDEX_TO_GRID[target]))
+            if en_passant:
+                move = source, INDEX_TO_GRID[en_passant.bit_length() - 1]
+                undo = self.make_move(move, checkmate_check=False)
+                if not self.attacked(king_index, oppo_color):
+                    moves.append(move)
+                self.unmake_move(undo)
+        return moves
+
+    def apply_move(self, source, destination, promotion=None, checkmate_check=True):
+        index = grid_to_index(source)
+        color, role = self.find(index)
+        if color != self.player:
+            return
+        if destination not in self.get_legal_moves(source):
+            return
+        self.make_move((source, destination), promotion, checkmate_check)
+
+    # 5. a BitChess is only a few numbers, so its Undo is simply a copy of them
+    def make_move(self, move, promotion=None, checkmate_check=True):
+        undo = ({color: dict(self.boards[color]) for color in self.boards}, dict(self.occupancy), self.unmoved,
+                self.player, self.winner, self.en_passant, self.check, self.checkmate, self.stalemate,
+                self.castling, self.key, self.score)
+        source, destination = move
+        index = grid_to_index(source)
+        target = grid_to_index(destination)
+        color, role = self.find(index)
+        oppo_color = other_color(color)
+        # capture opponent piece (en passant takes the pawn beside the source)
+        captured_index = target
+        if role == 'pawn' and destination[1] != source[1] and not self.occupancy[oppo_color] & (1 << target):
+            captured_index = grid_to_index((source[0], destination[1]))
+        captured_color, captured_role = self.find(captured_index)
+        if captured_color == oppo_color:
+            self.take(oppo_color, captured_role, captured_index)
+            self.unmoved &= ~(1 << captured_index)
+            self.key ^= ZOBRIST_PIECES[oppo_color][captured_role][captured_index]
+            self.score -= ROLE_VALUES[captured_role] if oppo_color == 'white' else -ROLE_VALUES[captured_role]
+            if captured_role == 'king':
+                self.winner = color
+        if self.en_passant:
+            self.key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+        self.en_passant = None
+        # castling?
+        if role == 'king' and abs(source[1] - destination[1]) > 1:
+            if destination[1] > source[1]:
+                rook_index = grid_to_index((source[0], 7))
+                rook_target = target - 1
+            else:
+                rook_index = grid_to_index((source[0], 0))
+                rook_target = target + 1
+            self.take(color, 'rook', rook_index)
+            self.put(color, 'rook', rook_target)
+            self.unmoved &= ~(1 << rook_index)
+            self.key ^= ZOBRIST_PIECES[color]['rook'][rook_index] ^ ZOBRIST_PIECES[color]['rook'][rook_target]
+        self.take(color, role, index)
+        self.key ^= ZOBRIST_PIECES[color][role][index]
+        if promotion and role == 'pawn' and (destination[0] == 0 or destination[0] == 7):
+            role = promotion if promotion in ('queen', 'bishop', 'knight') else 'rook'
+            gain = ROLE_VALUES[role] - ROLE_VALUES['pawn']
+            self.score += gain if color == 'white' else -gain
+        self.put(color, role, target)
+        self.key ^= ZOBRIST_PIECES[color][role][target]
+        self.unmoved &= ~(1 << index)
+        if role == 'pawn' and 2 == abs(source[0] - destination[0]):
+            self.en_passant = destination
+            self.key ^= ZOBRIST_EN_PASSANT[destination[1]]
+        if self.castling:
+            castling = self.get_castling()
+            self.key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+            self.castling = castling
+        # check?
+        self.check = False
+        king = self.boards[oppo_color]['king']
+        if self.winner is None and king:
+            self.check = self.attacked(king.bit_length() - 1, color)
+        self.player = oppo_color
+        self.key ^= ZOBRIST_BLACK
+        if checkmate_check and self.winner is None and not self.get_all_moves():
+            if self.check:
+                self.winner = color
+                self.checkmate = True
+            else:
+                self.winner = 'draw'
+                self.stalemate = True
+        return undo
+
+    def unmake_move(self, undo):
+        boards, occupancy, self.unmoved, self.player, self.winner, self.en_passant, self.check, self.checkmate, \
+            self.stalemate, self.castling, self.key, self.score = undo
+        self.boards = boards
+        self.occupancy = occupancy
+
+    def make_null_move(self):
+        undo = self.en_passant, self.check, self.key
+        if self.en_passant:
+            self.key ^= ZOBRIST_EN_PASSANT[self.en_passant[1]]
+        self.en_passant = None
+        self.check = False
+        self.player = other_color(self.player)
+        self.key ^= ZOBRIST_BLACK
+        return undo
+
+    def unmake_null_move(self, undo):
+        self.en_passant, self.check, self.key = undo
+        self.player = other_color(self.player)
+
+    def has_pieces(self, color):
+        boards = self.boards[color]
+        return bool(boards['knight'] | boards['bishop'] | boards['rook'] | boards['queen'])
+
+    def count_pieces(self):
+        return bin(self.occupancy['white'] | self.occupancy['black']).count('1')
+
+    def get_score(self):
+        sum = 0
+        for role in ROLES:
+            sum += ROLE_VALUES[role] * (bin(self.boards['white'][role]).count('1') -
+                                        bin(self.boards['black'][role]).count('1'))
+        return sum
+
+    def evaluate(self):
+        return self.score
+
+    def score_children(self, moves=None, evaluator=None):
+        if moves is None:
+            moves = self.get_all_moves()
+        if evaluator:
+            return list(zip(moves, evaluator.evaluate_children(self, moves)))
+        oppo_color = other_color(self.player)
+        children = []
+        for move in moves:
+            source, destination = move
+            captured_index = grid_to_index(destination)
+            if not self.occupancy[oppo_color] & (1 << captured_index) and destination[1] != source[1] and \
+                    self.boards[self.player]['pawn'] & (1 << grid_to_index(source)):
+                captured_index = grid_to_index((source[0], destination[1]))
+            score = self.score
+            if self.occupancy[oppo_color] & (1 << captured_index):
+                value = ROLE_VALUES[self.find(captured_index)[1]]
+                score -= value if oppo_color == 'white' else -value
+            if (destination[0] == 0 or destination[0] == 7) and \
+                    self.boards[self.player]['pawn'] & (1 << grid_to_index(source)):
+                gain = ROLE_VALUES['queen'] - ROLE_VALUES['pawn']
+                score += gain if self.player == 'white' else -gain
+            children.append((move, score))
+        return children
+
+
+# 2. Piece-square tables: a bonus (or penalty) for a piece on each square, in pawns, as seen by
+#    white with row 0 at the top like the board. Black uses the same tables upside down.
+PIECE_SQUARES = {
+    'pawn': ((0, 0, 0, 0, 0, 0, 0, 0),
+             (50, 50, 50, 50, 50, 50, 50, 50),
+             (10, 10, 20, 30, 30, 20, 10, 10),
+             (5, 5, 10, 25, 25, 10, 5, 5),
+             (0, 0, 0, 20, 20, 0, 0, 0),
+             (5, -5, -10, 0, 0, -10, -5, 5),
+             (5, 10, 10, -20, -20, 10, 10, 5),
+             (0, 0, 0, 0, 0, 0, 0, 0)),
+    'knight': ((-50, -40, -30, -30, -30, -30, -40, -50),
+               (-40, -20, 0, 0, 0, 0, -20, -40),
+               (-30, 0, 10, 15, 15, 10, 0, -30),
+               (-30, 5, 15, 20, 20, 15, 5, -30),
+               (-30, 0, 15, 20, 20, 15, 0, -30),
+               (-30, 5, 10, 15, 15, 10, 5, -30),
+               (-40, -20, 0, 5, 5, 0, -20, -40),
+               (-50, -40, -30, -30, -30, -30, -40, -50)),
+    'bishop': ((-20, -10, -10, -10, -10, -10, -10, -20),
+               (-10, 0, 0, 0, 0, 0, 0, -10),
+               (-10, 0, 5, 10, 10, 5, 0, -10),
+               (-10, 5, 5, 10, 10, 5, 5, -10),
+               (-10, 0, 10, 10, 10, 10, 0, -10),
+               (-10, 10, 10, 10, 10, 10, 10, -10),
+               (-10, 5, 0, 0, 0, 0, 5, -10),
+               (-20, -10, -10, -10, -10, -10, -10, -20)),
+    'rook': ((0, 0, 0, 0, 0, 0, 0, 0),
+             (5, 10, 10, 10, 10, 10, 10, 5),
+             (-5, 0, 0, 0, 0, 0, 0, -5),
+             (-5, 0, 0, 0, 0, 0, 0, -5),
+             (-5, 0, 0, 0, 0, 0, 0, -5),
+             (-5, 0, 0, 0, 0, 0, 0, -5),
+             (-5, 0, 0, 0, 0, 0, 0, -5),
+             (0, 0, 0, 5, 5, 0, 0, 0)),
+    'queen': ((-20, -10, -10, -5, -5, -10, -10, -20),
+              (-10, 0, 0, 0, 0, 0, 0, -10),
+              (-10, 0, 5, 5, 5, 5, 0, -10),
+              (-5, 0, 5, 5, 5, 5, 0, -5),
+              (0, 0, 5, 5, 5, 5, 0, -5),
+              (-10, 5, 5, 5, 5, 5, 0, -10),
+              (-10, 0, 5, 0, 0, 0, 0, -10),
+              (-20, -10, -10, -5, -5, -10, -10, -20)),
+    'king': ((-30, -40, -40, -50, -50, -40, -40, -30),
+             (-30, -40, -40, -50, -50, -40, -40, -30),
+             (-30, -40, -40, -50, -50, -40, -40, -30),
+             (-30, -40, -40, -50, -50, -40, -40, -30),
+             (-20, -30, -30, -40, -40, -30, -30, -20),
+             (-10, -20, -20, -20, -20, -20, -20, -10),
+             (20, 20, 0, 0, 0, 0, 20, 20),
+             (20, 30, 10, 0, 0, 10, 30, 20))
+}
+PLANES = {(color, role): plane for plane, (color, role) in
+          enumerate((color, role) for color in ('white', 'black') for role in ROLES)}
+# the tables and the piece values as 12 planes, with black's counting negative
+PIECE_SQUARE_TABLE = np.zeros((8, 8, 12), np.float32)
+PLANE_VALUES = np.zeros(12, np.float32)
+for (color, role), plane in PLANES.items():
+    table = np.array(PIECE_SQUARES[role], np.float32) / 100
+    PIECE_SQUARE_TABLE[:, :, plane] = table if color == 'white' else -table[::-1]
+    PLANE_VALUES[plane] = ROLE_VALUES[role] if color == 'white' else -ROLE_VALUES[role]
+# both together: the material and the tables are one dot product with the tensor
+SQUARE_VALUES = (PIECE_SQUARE_TABLE + PLANE_VALUES).astype(np.float64).reshape(768)
+
+
+# 3. For every direction, the square each square is reached from, so that plane[..., shifts]
+#    moves every piece on the plane one step at once. Square 64 is always empty: it stands for
+#    off the board.
+def make_shift_table(steps):
+    table = np.full((len(steps), 65), 64)
+    for i, step in enumerate(steps):
+        for index in range(64):
+            gp = apply_dx_dy(INDEX_TO_GRID[index], step)
+            if 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+                table[i, grid_to_index(gp)] = index
+    return table
+
+
+KNIGHT_SHIFTS = make_shift_table(((-1, -2), (1, -2), (-1, 2), (1, 2), (2, -1), (2, 1), (-2, -1), (-2, 1)))
+KING_SHIFTS = make_shift_table(ORTHOGONAL + DIAGONAL)
+# the rays of all 8 directions, stacked as one array of 8 * 65 squares, the rook directions first
+SLIDER_SHIFTS = (np.arange(8)[:, None] * 65 + make_shift_table(ORTHOGONAL + DIAGONAL)).ravel()
+# the pawn attacks and the squares in front of the king, for white and for black
+PAWN_SHIFTS = np.stack((make_shift_table(((-1, -1), (1, -1))), make_shift_table(((-1, 1), (1, 1)))), 2)
+SHIELD_SHIFTS = np.stack((make_shift_table(((-1, -1), (0, -1), (1, -1))),
+                          make_shift_table(((-1, 1), (0, 1), (1, 1)))), 2)
+COLORS = np.arange(2)
+
+
+# 4. An evaluator that looks at more than the material, written as NumPy operations on whole
+#    planes instead of loops over the pieces. evaluate_batch scores N positions in one call,
+#    which costs little more than scoring one, so the bots score all children of a position
+#    together with evaluate_children (through score_children).
+class Evaluator:
+    def __init__(self, mobility_weight=0.05, shield_weight=0.2, danger_weight=0.1):
+        self.mobility_weight = mobility_weight  # per square a knight, bishop, rook or queen can go to
+        self.shield_weight = shield_weight  # per pawn right in front of the king
+        self.danger_weight = danger_weight  # per square around the king the opponent attacks
+
+    def evaluate_batch(self, tensors):
+        # tensors is N x 8 x 8 x 12, the result N values for white
+        n = len(tensors)
+        squares = tensors.reshape(n, 64, 12)
+        score = tensors.reshape(n, 768) @ SQUARE_VALUES
+        # planes[square, color, role, position], with the off-board square 64 added. The square
+        # comes first so that moving the pieces copies whole rows.
+        planes = np.zeros((65, 12, n), np.float32)
+        planes[:64] = squares.transpose(1, 2, 0)
+        planes = planes.reshape(65, 2, 6, n)
+        pawns, knights, bishops, rooks, queens, kings = (planes[:, :, role] for role in range(6))
+        own = planes.sum(2)
+        not_own = 1 - own
+        not_own[64] = 0
+        empty = 1 - own.sum(1)
+        empty[64] = 0
+        # mobility and attacked squares: knights step once, rooks, bishops and queens step
+        # until they hit a piece
+        rays = np.stack([rooks + queens] * 4 + [bishops + queens] * 4)
+        reach = np.zeros_like(rays)
+        for distance in range(7):
+            rays = rays.reshape(8 * 65, 2, n)[SLIDER_SHIFTS].reshape(8, 65, 2, n)
+            reach += rays
+            rays *= empty[:, None]
+        # how many of the pieces reach each square
+        reach = reach.sum(0) + knights[KNIGHT_SHIFTS].sum(0)
+        mobility = (reach * not_own).sum(0)
+        king_steps = kings[KING_SHIFTS].sum(0)
+        attacked = reach + king_steps + pawns[PAWN_SHIFTS, COLORS].sum(0)
+        # king safety: pawns shielding the king, and opponent attacks next to it
+        shield = (kings[SHIELD_SHIFTS, COLORS].sum(0) * pawns).sum(0)
+        danger = ((king_steps + kings > 0) & (attacked[:, ::-1] > 0)).sum(0)
+        score += self.mobility_weight * (mobility[0] - mobility[1])
+        score += self.shield_weight * (shield[0] - shield[1])
+        score -= self.danger_weight * (danger[0] - danger[1])
+        return score
+
+    def evaluate(self, chess):
+        return float(self.evaluate_batch(chess.get_tensor()[None])[0])
+
+    def evaluate_children(self, chess, moves):
+        tensors = np.empty((len(moves), 8, 8, 12), np.float32)
+        for i, move in enumerate(moves):
+            promotion = 'queen' if (move[1][0] == 0 or move[1][0] == 7) and \
+                isinstance(chess.get_piece(move[0]), Pawn) else None
+            undo = chess.make_move(move, promotion, checkmate_check=False)
+            tensors[i] = chess.get_tensor()
+            chess.unmake_move(undo)
+        return self.evaluate_batch(tensors).tolist()
+
+
+class Player:
+    def __init__(self, color):
+        self.color = color
+
+
+class Human(Player):
+    pass
+
+
+class Monkey(Player):
+    # 7. remove piece_images
+    # 13. ask chess for the moves so that Chess and BitChess both work
+    def get_move(self, chess):
+        moves = chess.get_all_moves()
+        move = random.choice(moves)
+        promotion = None
+        if (move[1][0] == 0 or move[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+            promotion = 'queen'
+        return move, promotion
+
+
+class Greedy(Player):
+    # 5. evaluator scores all the moves in one batch, without it only the material counts
+    def __init__(self, color, evaluator=None):
+        super().__init__(color)
+        self.evaluator = evaluator
+
+    def get_move(self, chess):
+        # 2. we have all possible moves with their values now, each child scored once
+        children = chess.score_children(evaluator=self.evaluator)
+        values = [value for move, value in children]
+        max_value = max(values) if self.color == 'white' else min(values)
+        valid_moves = [move for move, value in children if value == max_value]
+        move = random.choice(valid_moves)
+        promotion = None
+        if (move[1][0] == 0 or move[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+            promotion = 'queen'
+        return move, promotion
+
+
+# 1. the kinds of values a transposition table entry can hold
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+# 2. A transposition table remembers the result of every searched position by its Zobrist key.
+#    The same position is often reached by different move orders, and then its result is read
+#    back instead of searched again. The entries live in arrays made once, so the table never
+#    grows: the key picks a bucket of two entries, the first keeps the deepest search and the
+#    second always takes the newest one.
+class TranspositionTable:
+    def __init__(self, bits=16):
+        self.mask = (1 << bits) - 1
+        size = 2 << bits
+        self.keys = array('Q', [0]) * size
+        self.depths = array('b', [-1]) * size  # -1 is an empty entry
+        self.bounds = array('b', [EXACT]) * size
+        self.values = array('d', [0]) * size
+        self.moves = array('h', [-1]) * size  # source * 64 + destination
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        # the depth, bound, value and best move stored for key, or None
+        self.probes += 1
+        index = (key & self.mask) << 1
+        for slot in (index, index + 1):
+            if self.keys[slot] == key and self.depths[slot] >= 0:
+                self.hits += 1
+                move = self.moves[slot]
+                return self.depths[slot], self.bounds[slot], self.values[slot], \
+                    (INDEX_TO_GRID[move >> 6], INDEX_TO_GRID[move & 63])
+        return None
+
+    def store(self, key, depth, bound, value, move):
+        self.stores += 1
+        slot = (key & self.mask) << 1
+        if self.keys[slot] != key and self.depths[slot] >= 0:
+            if self.depths[slot] > depth:
+                slot += 1
+            else:
+                # a deeper search moves the old first entry down to the second one
+                self.keys[slot + 1], self.keys[slot] = self.keys[slot], self.keys[slot + 1]
+                self.depths[slot + 1], self.depths[slot] = self.depths[slot], self.depths[slot + 1]
+                self.bounds[slot + 1] = self.bounds[slot]
+                self.values[slot + 1] = self.values[slot]
+                self.moves[slot + 1] = self.moves[slot]
+            # a collision throws away the result of another position
+            if self.depths[slot] >= 0 and self.keys[slot] != key:
+                self.collisions += 1
+        self.keys[slot] = key
+        self.depths[slot] = depth
+        self.bounds[slot] = bound
+        self.values[slot] = value
+        self.moves[slot] = grid_to_index(move[0]) << 6 | grid_to_index(move[1])
+
+    def report(self):
+        used = sum(1 for depth in self.depths if depth >= 0)
+        hit_rate = 100 * self.hits / self.probes if self.probes else 0
+        collision_rate = 100 * self.collisions / self.stores if self.stores else 0
+        return f'TT: probes={self.probes} hits={self.hits} ({hit_rate:.1f}%) stores={self.stores} ' \
+               f'collisions={self.collisions} ({collision_rate:.1f}%) used={used}/{len(self.depths)}'
+
+
+# 1. Alpha/beta cuts the most when the best move is searched first. Without searching we can
+#    only guess: the move from the transposition table, then captures with the most valuable
+#    victim and least valuable attacker (MVV-LVA), then the killer moves that caused a cut at
+#    the same ply elsewhere in the tree, then the other quiet moves by their history of cuts.
+class MoveOrderer:
+    def __init__(self):
+        self.killers = {}  # ply -> the last two quiet moves that caused a cut
+        self.history = {'white': [0] * 4096, 'black': [0] * 4096}  # source * 64 + destination
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        # killers belong to the old plies, old history counts a little less
+        self.killers = {}
+        for color in self.history:
+            self.history[color] = [value // 2 for value in self.history[color]]
+
+    def get_victim(self, chess, move):
+        # the value of the captured piece, 0 for a quiet move
+        piece = chess.get_piece(move[1])
+        if piece:
+            return piece.value()
+        if chess.en_passant and chess.en_passant == (move[0][0], move[1][1]) and \
+                isinstance(chess.get_piece(move[0]), Pawn):
+            return ROLE_VALUES['pawn']
+        return 0
+
+    def order_moves(self, chess, moves, ply, hash_move):
+        killers = self.killers.get(ply, [])
+        history = self.history[chess.player]
+
+        def get_order(move):
+            if move == hash_move:
+                return 0, 0, 0
+            victim = self.get_victim(chess, move)
+            if victim:
+                return 1, -victim, chess.get_piece(move[0]).value()
+            if move in killers:
+                return 2, killers.index(move), 0
+            return 3, -history[grid_to_index(move[0]) << 6 | grid_to_index(move[1])], 0
+
+        moves.sort(key=get_order)
+
+    def cutoff(self, chess, move, ply, depth, first):
+        self.cutoffs += 1
+        if first:
+            self.first_move_cutoffs += 1
+        # captures are already ordered by MVV-LVA
+        if self.get_victim(chess, move):
+            return
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        # deep cuts save more, so they count more
+        self.history[chess.player][grid_to_index(move[0]) << 6 | grid_to_index(move[1])] += depth * depth
+
+    def report(self):
+        # with good ordering almost every cut comes from the first move
+        rate = 100 * self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0
+        return f'Ordering: cutoffs={self.cutoffs} first move={self.first_move_cutoffs} ({rate:.1f}%)'
+
+
+# 1. The same table in a block of shared memory, so that every process searching the game
+#    reads what the others found. An entry is two 64-bit words: the data (depth, bound, move
+#    and value packed together) and the key XOR the data. Processes write without locking,
+#    so a reader may see half of a new entry and half of an old one. Then key XOR data does
+#    not give the key back and the entry is simply missed.
+class SharedTranspositionTable:
+    ENTRY = struct.Struct('<bBhf')  # depth + 1 (0 is empty), bound, move, value: 8 bytes
+
+    def __init__(self, bits=16, name=None):
+        # without a name make a new table, with the name of a table join it
+        self.mask = (1 << bits) - 1
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=(2 << bits) * 16)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.words = self.memory.buf.cast('Q')
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        self.probes += 1
+        index = (key & self.mask) << 1
+        for slot in (index, index + 1):
+            data = self.words[2 * slot + 1]
+            if data and self.words[2 * slot] ^ data == key:
+                self.hits += 1
+                depth, bound, move, value = self.ENTRY.unpack(data.to_bytes(8, 'little'))
+                return depth - 1, bound, value, (INDEX_TO_GRID[move >> 6], INDEX_TO_GRID[move & 63])
+        return None
+
+    def store(self, key, depth, bound, value, move):
+        self.stores += 1
+        slot = (key & self.mask) << 1
+        data = self.words[2 * slot + 1]
+        if data and self.words[2 * slot] ^ data != key:
+            if self.ENTRY.unpack(data.to_bytes(8, 'little'))[0] - 1 > depth:
+                slot += 1
+            else:
+                # a deeper search moves the old first entry down to the second one
+                self.words[2 * slot + 2], self.words[2 * slot] = self.words[2 * slot], self.words[2 * slot + 2]
+                self.words[2 * slot + 3], self.words[2 * slot + 1] = data, self.words[2 * slot + 3]
+            if self.words[2 * slot + 1] and self.words[2 * slot] ^ self.words[2 * slot + 1] != key:
+                self.collisions += 1
+        data = self.ENTRY.pack(depth + 1, bound, grid_to_index(move[0]) << 6 | grid_to_index(move[1]), value)
+        data = int.from_bytes(data, 'little')
+        self.words[2 * slot] = key ^ data
+        self.words[2 * slot + 1] = data
+
+    def get_used(self):
+        return sum(1 for data in self.words[1::2] if data)
+
+    def report(self):
+        used = self.get_used()
+        hit_rate = 100 * self.hits / self.probes if self.probes else 0
+        collision_rate = 100 * self.collisions / self.stores if self.stores else 0
+        return f'Shared TT: probes={self.probes} hits={self.hits} ({hit_rate:.1f}%) stores={self.stores} ' \
+               f'collisions={self.collisions} ({collision_rate:.1f}%) used={used}/{len(self.words) // 2}'
+
+    def close(self):
+        # the process that made the table also removes it
+        self.words.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# 1. What a search did, counted while it runs. Nothing is printed during the search: printing
+#    a line for every node took longer than searching it. report() makes the lines afterwards.
+class SearchStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.evaluations = 0  # positions scored by the evaluation
+        self.moves_made = 0  # the search makes and unmakes moves, it never clones the board
+        self.table_hits = 0  # table entries that ended the search of a node
+        self.cutoffs = 0
+        self.cutoff_moves = []  # cutoff_moves[i]: how often the move tried i-th cut
+        self.researches = 0
+        self.null_moves = 0
+        self.null_move_cutoffs = 0
+        self.null_move_nodes = 0
+        self.reductions = 0
+        self.reduction_researches = 0
+        self.depths = []  # (depth, value, nodes, seconds) of every finished depth
+
+    def get_nodes(self):
+        return self.nodes + self.quiescence_nodes
+
+    def cutoff(self, i):
+        self.cutoffs += 1
+        if i >= len(self.cutoff_moves):
+            self.cutoff_moves.extend([0] * (i + 1 - len(self.cutoff_moves)))
+        self.cutoff_moves[i] += 1
+
+    def report(self):
+        lines = [f'Search: nodes={self.nodes} quiescence nodes={self.quiescence_nodes} '
+                 f'evaluations={self.evaluations} moves made={self.moves_made} table hits={self.table_hits} '
+                 f'researches={self.researches}']
+        if self.cutoffs:
+            shares = ' '.join(f'{100 * count / self.cutoffs:.1f}%' for count in self.cutoff_moves[:4])
+            lines.append(f'Cutoffs: {self.cutoffs}, by the 1st 2nd 3rd 4th move: {shares}')
+        if self.null_moves or self.reductions:
+            lines.append(f'Pruning: null moves={self.null_moves} cutoffs={self.null_move_cutoffs} '
+                         f'nodes={self.null_move_nodes} reductions={self.reductions} '
+                         f'searched again={self.reduction_researches}')
+        for depth, value, nodes, seconds in self.depths:
+            lines.append(f'Depth {depth}: value={value} nodes={nodes} time={seconds:.2f}s')
+        return '\n'.join(lines)
+
+
+class Thinky(Player):
+    # 3. Thinky keeps its table from move to move, values are always from white's side
+    # 1. depth is now the deepest search, time_limit (seconds) and node_limit stop it earlier
+    # 2. any object with the methods of MoveOrderer can order the moves
+    # 1. quiescence_depth limits the captures searched after depth 0 (None for no limit),
+    #    delta_margin is how much more than the captured piece a capture could still win
+    # 1. search is 'alphabeta' (lesson 17) or 'pvs', which also starts every depth with a
+    #    window of aspiration_window around the last value
+    # 2. null_move_reduction is how much shallower the null move is searched, late_move_after
+    #    is how many moves are searched at full depth before the quiet ones are reduced.
+    #    None turns them off.
+    # 1. workers is the number of processes for the parallel search, None searches in this one
+    # 2. table can be any table, like a SharedTranspositionTable. shared_table makes the workers
+    #    of the parallel search share one.
+    # 2. verbosity 0 is silent, 1 logs every move and depth with the reports, 2 also every node
+    #    of the search (slow). log is called with each line, print or a logger's info for example.
+    # 1. on_depth(depth, value, pv) is called after every finished depth, for a UCI front end
+    # 2. ponder searches on the opponent's time, see start_pondering
+    def __init__(self, color, depth=2, table_bits=16, time_limit=None, node_limit=None, orderer=None,
+                 quiescence_depth=None, delta_margin=2, search='alphabeta', aspiration_window=3,
+                 null_move_reduction=None, late_move_after=None, workers=None, table=None, shared_table=False,
+                 evaluator=None, book=None, tablebase=None, verbosity=0, log=print, on_depth=None, ponder=False):
+        super().__init__(color)
+        self.depth = depth
+        self.verbosity = verbosity
+        self.log = log
+        self.on_depth = on_depth
+        self.stats = SearchStats()
+        # how deep the node being searched is, to indent the lines of verbosity 2
+        self.ply = 0
+        # 6. a Tablebase: with few enough pieces its move is played, and the search reads its values
+        self.tablebase = tablebase
+        # 4. an OpeningBook: its moves are played without searching, as long as there are any
+        self.book = book
+        # 6. evaluator scores the leaves instead of chess.evaluate(), a batch of them at a time
+        self.evaluator = evaluator
+        self.workers = workers
+        self.table_bits = table_bits
+        self.shared_table = shared_table
+        self.null_move_reduction = null_move_reduction
+        self.late_move_after = late_move_after
+        self.after_null_move = False
+        self.search = search
+        self.aspiration_window = aspiration_window
+        self.quiescence_depth = quiescence_depth
+        self.delta_margin = delta_margin
+        self.table = table or TranspositionTable(table_bits)
+        self.orderer = orderer or MoveOrderer()
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.start_time = 0
+        # the time and the nodes of a move count from here, on a ponder hit from the hit
+        self.move_start = 0
+        self.move_nodes = 0
+        self.stopped = False
+        self.best = None
+        self.pv = []
+        self.follow_pv = False
+        self.search_depth = 0
+        self.ponder = ponder
+        self.pondering = False
+        self.ponder_thread = None
+        self.ponder_key = None
+        self.ponder_move = None
+        self.ponder_best = None
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+
+    def get_promotion(self, chess, move):
+        if (move[1][0] == 0 or move[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+            return 'queen'
+        return None
+
+    def out_of_budget(self):
+        # 2. only stop after one search has finished, so that there is always a move to play
+        if self.best is None:
+            return False
+        # pondering has no limits, only stop_pondering ends it
+        if self.pondering:
+            return self.stopped
+        if (self.node_limit and self.stats.get_nodes() - self.move_nodes >= self.node_limit) or \
+                (self.time_limit and time.time() - self.move_start >= self.time_limit):
+            self.stopped = True
+        return self.stopped
+
+    # 2. Quiescence search: evaluate() is only right in a quiet position, not halfway through
+    #    trading pieces. So keep searching the captures, but let the side to move "stand pat"
+    #    on the evaluation when capturing is not better.
+    def quiesce(self, chess, alpha, beta, depth, stand_pat=None):
+        self.stats.quiescence_nodes += 1
+        # 6. the parent may have scored this position together with its brothers already
+        if stand_pat is None:
+            self.stats.evaluations += 1
+            stand_pat = self.evaluator.evaluate(chess) if self.evaluator else chess.evaluate()
+        if self.out_of_budget():
+            return stand_pat
+        white = chess.player == 'white'
+        if white:
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        else:
+            if stand_pat <= alpha:
+                return stand_pat
+            beta = min(beta, stand_pat)
+        moves = chess.get_all_moves()
+        if not moves:
+            if chess.check:
+                return -10000 if white else 10000
+            return 0
+        if self.quiescence_depth is not None and depth >= self.quiescence_depth:
+            return stand_pat
+        captures = []
+        for move in moves:
+            victim = self.orderer.get_victim(chess, move)
+            if victim:
+                captures.append((victim, -chess.get_piece(move[0]).value(), move))
+        captures.sort(reverse=True)
+        # 3. score the captures together, each one is the stand pat of its own quiescence search
+        children = chess.score_children([move for victim, attacker, move in captures], self.evaluator)
+        self.stats.evaluations += len(children)
+        stand_pats = [value for move, value in children]
+        extreme_value = stand_pat
+        for (victim, attacker, move), child_stand_pat in zip(captures, stand_pats):
+            # delta pruning: skip a capture that can not reach alpha (or beta) even when
+            # the captured piece and the margin are won for free
+            if white and stand_pat + victim + self.delta_margin <= alpha:
+                continue
+            if not white and stand_pat - victim - self.delta_margin >= beta:
+                continue
+            undo = chess.make_move(move, self.get_promotion(chess, move), checkmate_check=False)
+            self.stats.moves_made += 1
+            value = self.quiesce(chess, alpha, beta, depth + 1, child_stand_pat)
+            chess.unmake_move(undo)
+            if white:
+                extreme_value = max(extreme_value, value)
+                alpha = max(alpha, value)
+            else:
+                extreme_value = min(extreme_value, value)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+        return extreme_value
+
+    def minimax(self, chess, depth, alpha, beta):
+        after_null_move = self.after_null_move
+        self.after_null_move = False
+        self.stats.nodes += 1
+        if self.out_of_budget():
+            return None, None, 0
+        # 6. the tablebase knows the value exactly, the root still needs a move so search it
+        if self.tablebase and self.search_depth > depth:
+            value = self.tablebase.get_value(chess)
+            if value is not None:
+                return None, None, value
+        # 4. use what the table knows: an exact value or a bound that is outside alpha/beta
+        #    ends the search, a weaker bound narrows alpha/beta
+        hash_move = None
+        entry = self.table.probe(chess.key)
+        if entry:
+            entry_depth, bound, value, hash_move = entry
+            if entry_depth >= depth:
+                if bound == LOWER:
+                    alpha = max(alpha, value)
+                elif bound == UPPER:
+                    beta = min(beta, value)
+                if bound == EXACT or alpha >= beta:
+                    self.stats.table_hits += 1
+                    return hash_move, self.get_promotion(chess, hash_move), value
+        # 3. Null move pruning: if the side to move passes and a shallower search still says
+        #    the position is too good for the opponent (beyond beta for white, alpha for black),
+        #    a real move would be even better, so stop here. Not in check, not twice in a row,
+        #    not at the root, and not with only pawns left, where passing can be the best move.
+        white = chess.player == 'white'
+        if self.null_move_reduction and depth >= 2 and self.search_depth > depth and not after_null_move and \
+                not chess.check and chess.has_pieces(chess.player) and (beta < math.inf if white else alpha > -math.inf):
+            self.stats.null_moves += 1
+            nodes = self.stats.get_nodes()
+            window = (beta - 1, beta) if white else (alpha, alpha + 1)
+            undo = chess.make_null_move()
+            if depth - 1 - self.null_move_reduction >= 0:
+                self.after_null_move = True
+                value = self.minimax(chess, depth - 1 - self.null_move_reduction, *window)[2]
+            else:
+                value = self.quiesce(chess, *window, 0)
+            chess.unmake_null_move(undo)
+            self.stats.null_move_nodes += self.stats.get_nodes() - nodes
+            if self.stopped:
+                return None, None, 0
+            if (white and value >= beta) or (not white and value <= alpha):
+                self.stats.null_move_cutoffs += 1
+                return None, None, beta if white else alpha
+        moves = chess.get_all_moves()
+        # 6. no legal moves: lost when checkmated (as bad as losing the king), 0 for stalemate
+        if not moves:
+            value = 0
+            if chess.check:
+                value = -10000 if chess.player == 'white' else 10000
+            return None, None, value
+        self.orderer.order_moves(chess, moves, self.search_depth - depth, hash_move)
+        # 3. follow the principal variation of the last search, its moves come first again
+        if self.follow_pv:
+            ply = self.search_depth - depth
+            if ply < len(self.pv) and self.pv[ply] in moves:
+                moves.remove(self.pv[ply])
+                moves.insert(0, self.pv[ply])
+            else:
+                self.follow_pv = False
+        extreme_value = -math.inf if chess.player == 'white' else math.inf
+        extreme_move_promotions = []
+        n = len(moves)
+        window = alpha, beta
+        in_check = chess.check
+        stand_pats = None
+        if depth == 0:
+            stand_pats = [value for move, value in chess.score_children(moves, self.evaluator)]
+            self.stats.evaluations += len(stand_pats)
+        for i, move in enumerate(moves):
+            promotion = self.get_promotion(chess, move)
+            late = self.late_move_after and depth >= 2 and i >= self.late_move_after and not in_check and \
+                promotion is None and not self.orderer.get_victim(chess, move)
+            undo = chess.make_move(move, promotion, checkmate_check=False)
+            self.stats.moves_made += 1
+            if self.verbosity >= 2 and depth > 0:
+                self.log(f'{" " * 4 * self.ply}{depth}: Evaluate move [{i}/{n}]:{move}')
+            self.ply += 1
+            scouted = False
+            if late and not chess.check:
+                # 4. Late move reductions: with good move ordering, a quiet move this late is
+                #    rarely the best one, so search it one depth less. Only a move that still
+                #    looks better is searched again at full depth.
+                self.stats.reductions += 1
+                new_move, new_promotion, new_value = self.minimax(chess, depth - 2, alpha, beta)
+                scouted = True
+                better = new_value > alpha if chess.player == 'black' else new_value < beta
+                if better and not self.stopped:
+                    self.stats.reduction_researches += 1
+                    new_move, new_promotion, new_value = self.minimax(chess, depth - 1, alpha, beta)
+                    scouted = False
+            elif depth > 0 and self.search == 'pvs' and i > 0 and beta - alpha > 1:
+                # 2. Principal variation search: after the first move, only try to prove that
+                #    a move is not better, with a window of width 1 that cuts much more. Only a
+                #    move that turns out better is searched again with the real window.
+                # the move is made, so chess.player is already the opponent
+                if chess.player == 'black':
+                    scout_window = alpha, alpha + 1
+                else:
+                    scout_window = beta - 1, beta
+                new_move, new_promotion, new_value = self.minimax(chess, depth - 1, *scout_window)
+                scouted = True
+                if alpha < new_value < beta and not self.stopped:
+                    self.stats.researches += 1
+                    new_move, new_promotion, new_value = self.minimax(chess, depth - 1, alpha, beta)
+                    scouted = False
+            elif depth > 0:
+                new_move, new_promotion, new_value = \
+                    self.minimax(chess, depth - 1, alpha, beta)
+            else:
+                # 3. below depth 0 only captures are searched, until the position is quiet
+                new_value = self.quiesce(chess, alpha, beta, 0, stand_pats[i] if stand_pats else None)
+            self.ply -= 1
+            chess.unmake_move(undo)
+            # 4. a stopped search is thrown away, so do not store it in the table
+            if self.stopped:
+                return None, None, 0
+            self.follow_pv = False
+            if (chess.player == 'white' and new_value >= extreme_value) or \
+               (chess.player == 'black' and new_value <= extreme_value):
+                if new_value != extreme_value:
+                    extreme_move_promotions.clear()
+                extreme_value = new_value
+                # 3. a scouted move with the same value is only known to be no better
+                if not scouted or not extreme_move_promotions:
+                    extreme_move_promotions.append((move, promotion))
+            if chess.player == 'white':
+                alpha = max(extreme_value, alpha)
+            else:
+                beta = min(extreme_value, beta)
+            if alpha >= beta:
+                self.stats.cutoff(i)
+                self.orderer.cutoff(chess, move, self.search_depth - depth, depth, i == 0)
+                break
+        extreme_move, extreme_promotion = random.choice(extreme_move_promotions)
+        # 6. a value outside the window is only a bound: the cut moves could have changed it
+        if extreme_value <= window[0]:
+            bound = UPPER
+        elif extreme_value >= window[1]:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(chess.key, depth, bound, extreme_value, extreme_move)
+        if self.verbosity >= 2:
+            self.log(f'{" " * 4 * self.ply}{depth}: move={extreme_move} value={extreme_value}')
+        return extreme_move, extreme_promotion, extreme_value
+
+    def get_pv(self, chess, depth):
+        # the best moves stored in the table, starting from the current position
+        pv = []
+        undos = []
+        for ply in range(depth + 1):
+            entry = self.table.probe(chess.key)
+            if entry is None or entry[3] not in chess.get_all_moves():
+                break
+            pv.append(entry[3])
+            # the same promotion as in the search, or the keys of the table do not match
+            undos.append(chess.make_move(entry[3], self.get_promotion(chess, entry[3]), checkmate_check=False))
+        for undo in reversed(undos):
+            chess.unmake_move(undo)
+        return pv
+
+    # 3. limits, a dict with any of depth, time_limit and node_limit, replaces them from this
+    #    move on. They change only once the pondering is over or has become the search of this move.
+    def get_move(self, chess, limits=None):
+        # the opponent played the expected reply: the search of this position is already running
+        # or even done
+        if self.ponder_thread and self.finish_pondering(chess, limits):
+            best = self.ponder_best
+        else:
+            self.set_limits(limits)
+            best = self.choose_move(chess)
+        if self.ponder and best:
+            self.start_pondering(chess, best)
+        return best
+
+    def set_limits(self, limits):
+        if limits:
+            self.depth = limits.get('depth', self.depth)
+            self.time_limit = limits.get('time_limit', self.time_limit)
+            self.node_limit = limits.get('node_limit', self.node_limit)
+
+    def choose_move(self, chess):
+        if self.book:
+            book_move = self.book.choose(chess)
+            if book_move:
+                if self.verbosity:
+                    self.log(f'Book move {notation(book_move[0])}')
+                return book_move
+        if self.tablebase:
+            tablebase_move = self.tablebase.get_best_move(chess)
+            if tablebase_move:
+                if self.verbosity:
+                    self.log(f'Tablebase move {notation(tablebase_move[0])}')
+                return tablebase_move
+        if self.workers:
+            return self.get_parallel_move(chess)
+        return self.search_move(chess)
+
+    # 5. iterative deepening: search depth 0, 1, 2, ... and play the move of the last search
+    #    that finished. The small searches cost little and fill the table and the PV, so the
+    #    next search finds its best moves first.
+    def search_move(self, chess):
+        self.stats.reset()
+        self.ply = 0
+        self.start_time = self.move_start = time.time()
+        self.move_nodes = 0
+        self.stopped = False
+        self.best = None
+        self.pv = []
+        self.orderer.new_search()
+        value = 0
+        # self.depth is read again after every depth: a ponder hit can change it
+        depth = 0
+        while depth <= self.depth:
+            self.search_depth = depth
+            self.follow_pv = True
+            depth_nodes, depth_start = self.stats.get_nodes(), time.time()
+            # 4. aspiration window: the value rarely changes much from one depth to the next,
+            #    and a narrow window cuts more. Outside the window the value is only a bound,
+            #    so then search again with the full window.
+            alpha, beta = -math.inf, math.inf
+            if self.search == 'pvs' and self.aspiration_window and self.best:
+                alpha, beta = value - self.aspiration_window, value + self.aspiration_window
+            move, promotion, value = self.minimax(chess, depth, alpha, beta)
+            if not self.stopped and not alpha < value < beta:
+                self.stats.researches += 1
+                self.follow_pv = True
+                move, promotion, value = self.minimax(chess, depth, -math.inf, math.inf)
+            if self.stopped:
+                break
+            self.best = move, promotion
+            self.pv = self.get_pv(chess, depth)
+            elapsed = time.time() - self.start_time
+            self.stats.depths.append((depth, value, self.stats.get_nodes() - depth_nodes, time.time() - depth_start))
+            # while pondering, nobody is waiting for these yet
+            if self.verbosity and not self.pondering:
+                self.log(f'depth={depth} value={value} nodes={self.stats.nodes} '
+                         f'quiescence nodes={self.stats.quiescence_nodes} researches={self.stats.researches} '
+                         f'time={elapsed:.2f}s pv={" ".join(notation(move) for move in self.pv)}')
+            if self.on_depth and not self.pondering:
+                self.on_depth(depth, value, self.pv)
+            # the next search takes several times longer, so do not start it after half the time
+            if self.time_limit and not self.pondering and time.time() - self.move_start > self.time_limit / 2:
+                break
+            depth += 1
+        if self.verbosity and not self.pondering:
+            self.log(self.stats.report())
+            self.log(self.table.report())
+            self.log(self.orderer.report())
+        return self.best
+
+    # 1. Pondering: the second move of the PV is the reply Thinky expects. While the opponent
+    #    thinks, a thread already searches the position after it, without a time limit. When
+    #    the opponent plays it (a ponder hit), the search goes on with the time of a move, or
+    #    its move is played at once when it has finished. Any other move (a miss) stops it,
+    #    and the table it filled still helps the real search.
+    def start_pondering(self, chess, best):
+        move, promotion = best
+        self.ponder_move = None
+        if len(self.pv) < 2 or self.pv[0] != move:
+            return
+        board = chess.clone()
+        board.make_move(move, promotion, checkmate_check=False)
+        reply = self.pv[1]
+        if board.winner is not None or reply not in board.get_all_moves():
+            return
+        board.make_move(reply, self.get_promotion(board, reply), checkmate_check=False)
+        if board.winner is not None or not board.get_all_moves():
+            return
+        self.ponder_key = board.key
+        self.ponder_move = reply
+        self.ponder_best = None
+        self.pondering = True
+        self.ponder_thread = threading.Thread(target=self.ponder_search, args=(board,), daemon=True)
+        self.ponder_thread.start()
+
+    def ponder_search(self, chess):
+        self.ponder_best = self.search_move(chess)
+
+    # 2. True on a hit, after the search has finished with the limits of this move. On a miss
+    #    the thread is stopped before get_move sets the limits.
+    def finish_pondering(self, chess, limits=None):
+        if chess.key != self.ponder_key:
+            self.ponder_misses += 1
+            self.stop_pondering()
+            return False
+        self.ponder_hits += 1
+        if self.verbosity:
+            self.log(f'Ponder hit {notation(self.ponder_move)} after {time.time() - self.start_time:.2f}s')
+        # the running search becomes the search of this move: its limits first, then the clock
+        # and the nodes of the move start now, so the pondering is a head start. The thread
+        # only looks at the limits once pondering is False.
+        finished, ponder_depth = not self.ponder_thread.is_alive(), self.depth
+        self.set_limits(limits)
+        self.move_start = time.time()
+        self.move_nodes = self.stats.get_nodes()
+        self.pondering = False
+        self.ponder_thread.join()
+        self.ponder_thread = None
+        # pondering had finished before a deeper limit came: search again, on its table
+        if finished and self.depth > ponder_depth:
+            return False
+        return self.ponder_best is not None
+
+    # also call this when the game ends or the program quits
+    def stop_pondering(self):
+        if self.ponder_thread is None:
+            return
+        # like stop in uci.py: keep setting stopped until the search has really ended
+        while self.ponder_thread.is_alive():
+            self.stopped = True
+            self.ponder_thread.join(0.01)
+        self.ponder_thread = None
+        self.pondering = False
+
+    def ponder_report(self):
+        guesses = self.ponder_hits + self.ponder_misses
+        rate = 100 * self.ponder_hits / guesses if guesses else 0
+        return f'Ponder: hits={self.ponder_hits} misses={self.ponder_misses} ({rate:.1f}%)'
+
+    # 2. Root split: every root move is searched in one of the worker processes. The workers
+    #    share the best value found so far, so the moves searched later get a narrower window.
+    def get_parallel_move(self, chess):
+        moves = chess.get_all_moves()
+        self.orderer.order_moves(chess, moves, 0, None)
+        white = chess.player == 'white'
+        bound = multiprocessing.Value('d', -math.inf if white else math.inf)
+        options = {'table_bits': self.table_bits, 'quiescence_depth': self.quiescence_depth,
+                   'delta_margin': self.delta_margin, 'search': self.search,
+                   'null_move_reduction': self.null_move_reduction, 'late_move_after': self.late_move_after}
+        table = None
+        if self.shared_table:
+            table = SharedTranspositionTable(self.table_bits)
+            options['table_name'] = table.name
+        # a FEN is a few dozen bytes, much less to send than a pickled Chess with all its pieces
+        fen = get_fen(chess)
+        start = time.time()
+        with ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(bound, options)) as pool:
+            futures = [pool.submit(search_root_move, fen, move, self.depth) for move in moves]
+            results = [future.result() for future in futures]
+        if table:
+            # the probes and stores were counted in the workers
+            if self.verbosity:
+                self.log(f'Shared TT: used={table.get_used()}/{len(table.words) // 2}')
+            table.close()
+        # only a value better than the shared one at the time is exact, the others are bounds
+        exact = [(move, value) for move, value, is_exact, nodes in results if is_exact]
+        value = max(value for move, value in exact) if white else min(value for move, value in exact)
+        move = random.choice([move for move, move_value in exact if move_value == value])
+        self.stats.reset()
+        self.stats.nodes = sum(nodes for move, value, is_exact, nodes in results)
+        if self.verbosity:
+            self.log(f'parallel depth={self.depth} value={value} nodes={self.stats.nodes} workers={self.workers} '
+                     f'time={time.time() - start:.2f}s move={notation(move)}')
+        return move, self.get_promotion(chess, move)
+
+
+def notation(move) -> str:
+    def coord(row_column) -> str:
+        return str(chr(row_column[1] + 65)) + str(8 - row_column[0])
+    return coord(move[0]) + '-' + coord(move[1])
+
+
+# 1. FEN describes a position in one line, e.g. the start position is
+#    rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1
+FEN_ROLES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def load_fen(fen, backend=Chess):
+    fields = fen.split()
+    pieces = []
+    for row, text in enumerate(fields[0].split('/')):
+        column = 0
+        for letter in text:
+            if letter.isdigit():
+                column += int(letter)
+            else:
+                color = 'white' if letter.isupper() else 'black'
+                pieces.append(FEN_ROLES[letter.lower()](color, (row, column)))
+                column += 1
+    # castling rights tell which kings and rooks have not moved yet
+    corners = {'K': (7, 7), 'Q': (7, 0), 'k': (0, 7), 'q': (0, 0)}
+    unmoved = [corners[letter] for letter in fields[2] if letter in corners]
+    for piece in pieces:
+        if isinstance(piece, Rook):
+            piece.moved = piece.grid_pos not in unmoved
+        elif isinstance(piece, King):
+            piece.moved = not any(gp[0] == piece.grid_pos[0] for gp in unmoved)
+    chess = backend(pieces)
+    chess.player = 'white' if fields[1] == 'w' else 'black'
+    # FEN names the square behind the pawn, Chess remembers the pawn itself
+    if fields[3] != '-':
+        row = 8 - int(fields[3][1])
+        chess.en_passant = (4 if row == 5 else 3, ord(fields[3][0]) - ord('a'))
+    king = next(filter(lambda x: isinstance(x, King) and x.color == chess.player, pieces))
+    chess.check = king.grid_pos in chess.get_danger_zone(chess.player)
+    # 7. the player and en passant changed after the key was made
+    chess.key = chess.get_key()
+    return chess
+
+
+# 3. the other way around: write any Chess or BitChess as FEN
+FEN_LETTERS = {'pawn': 'p', 'knight': 'n', 'bishop': 'b', 'rook': 'r', 'queen': 'q', 'king': 'k'}
+
+
+def get_fen(chess):
+    state = chess.get_state()
+    rows = []
+    for row in range(8):
+        text = ''
+        empty = 0
+        for column in range(8):
+            color, role = state[row * 8 + column]
+            if color == 'empty':
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += FEN_LETTERS[role].upper() if color == 'white' else FEN_LETTERS[role]
+        if empty:
+            text += str(empty)
+        rows.append(text)
+    castling = ''.join(letter for bit, letter in enumerate('KQkq') if chess.castling & (1 << bit)) or '-'
+    en_passant = '-'
+    if chess.en_passant:
+        # the square the pawn passed, behind the pawn
+        row, column = chess.en_passant
+        en_passant = chr(ord('a') + column) + str(8 - (row - 1 if row == 3 else row + 1))
+    return f'{"/".join(rows)} {"w" if chess.player == "white" else "b"} {castling} {en_passant} 0 1'
+
+
+# 1. Polyglot opening books (.bin) have their own Zobrist keys, made from these 781 numbers:
+#    64 squares for each of 12 pieces, 4 castling rights, 8 en passant files and the turn.
+POLYGLOT_RANDOM = (
+    0x9D39247E33776D41, 0x2AF7398005AAA5C7, 0x44DB015024623547, 0x9C15F73E62A76AE2, 0x75834465489C0C89,
+    0x3290AC3A203001BF, 0x0FBBAD1F61042279, 0xE83A908FF2FB60CA, 0x0D7E765D58755C10, 0x1A083822CEAFE02D,
+    0x9605D5F0E25EC3B0, 0xD021FF5CD13A2ED5, 0x40BDF15D4A672E32, 0x011355146FD56395, 0x5DB4832046F3D9E5,
+    0x239F8B2D7FF719CC, 0x05D1A1AE85B49AA1, 0x679F848F6E8FC971, 0x7449BBFF801FED0B, 0x7D11CDB1C3B7ADF0,
+    0x82C7709E781EB7CC, 0xF3218F1C9510786C, 0x331478F3AF51BBE6, 0x4BB38DE5E7219443, 0xAA649C6EBCFD50FC,
+    0x8DBD98A352AFD40B, 0x87D2074B81D79217, 0x19F3C751D3E92AE1, 0xB4AB30F062B19ABF, 0x7B0500AC42047AC4,
+    0xC9452CA81A09D85D, 0x24AA6C514DA27500, 0x4C9F34427501B447, 0x14A68FD73C910841, 0xA71B9B83461CBD93,
+    0x03488B95B0F1850F, 0x637B2B34FF93C040, 0x09D1BC9A3DD90A94, 0x3575668334A1DD3B, 0x735E2B97A4C45A23,
+    0x18727070F1BD400B, 0x1FCBACD259BF02E7, 0xD310A7C2CE9B6555, 0xBF983FE0FE5D8244, 0x9F74D14F7454A824,
+    0x51EBDC4AB9BA3035, 0x5C82C505DB9AB0FA, 0xFCF7FE8A3430B241, 0x3253A729B9BA3DDE, 0x8C74C368081B3075,
+    0xB9BC6C87167C33E7, 0x7EF48F2B83024E20, 0x11D505D4C351BD7F, 0x6568FCA92C76A243, 0x4DE0B0F40F32A7B8,
+    0x96D693460CC37E5D, 0x42E240CB63689F2F, 0x6D2BDCDAE2919661, 0x42880B0236E4D951, 0x5F0F4A5898171BB6,
+    0x39F890F579F92F88, 0x93C5B5F47356388B, 0x63DC359D8D231B78, 0xEC16CA8AEA98AD76, 0x5355F900C2A82DC7,
+    0x07FB9F855A997142, 0x5093417AA8A7ED5E, 0x7BCBC38DA25A7F3C, 0x19FC8A768CF4B6D4, 0x637A7780DECFC0D9,
+    0x8249A47AEE0E41F7, 0x79AD695501E7D1E8, 0x14ACBAF4777D5776, 0xF145B6BECCDEA195, 0xDABF2AC8201752FC,
+    0x24C3C94DF9C8D3F6, 0xBB6E2924F03912EA, 0x0CE26C0B95C980D9, 0xA49CD132BFBF7CC4, 0xE99D662AF4243939,
+    0x27E6AD7891165C3F, 0x8535F040B9744FF1, 0x54B3F4FA5F40D873, 0x72B12C32127FED2B, 0xEE954D3C7B411F47,
+    0x9A85AC909A24EAA1, 0x70AC4CD9F04F21F5, 0xF9B89D3E99A075C2, 0x87B3E2B2B5C907B1, 0xA366E5B8C54F48B8,
+    0xAE4A9346CC3F7CF2, 0x1920C04D47267BBD, 0x87BF02C6B49E2AE9, 0x092237AC237F3859, 0xFF07F64EF8ED14D0,
+    0x8DE8DCA9F03CC54E, 0x9C1633264DB49C89, 0xB3F22C3D0B0B38ED, 0x390E5FB44D01144B, 0x5BFEA5B4712768E9,
+    0x1E1032911FA78984, 0x9A74ACB964E78CB3, 0x4F80F7A035DAFB04, 0x6304D09A0B3738C4, 0x2171E64683023A08,
+    0x5B9B63EB9CEFF80C, 0x506AACF489889342, 0x1881AFC9A3A701D6, 0x6503080440750644, 0xDFD395339CDBF4A7,
+    0xEF927DBCF00C20F2, 0x7B32F7D1E03680EC, 0xB9FD7620E7316243, 0x05A7E8A57DB91B77, 0xB5889C6E15630A75,
+    0x4A750A09CE9573F7, 0xCF464CEC899A2F8A, 0xF538639CE705B824, 0x3C79A0FF5580EF7F, 0xEDE6C87F8477609D,
+    0x799E81F05BC93F31, 0x86536B8CF3428A8C, 0x97D7374C60087B73, 0xA246637CFF328532, 0x043FCAE60CC0EBA0,
+    0x920E449535DD359E, 0x70EB093B15B290CC, 0x73A1921916591CBD, 0x56436C9FE1A1AA8D, 0xEFAC4B70633B8F81,
+    0xBB215798D45DF7AF, 0x45F20042F24F1768, 0x930F80F4E8EB7462, 0xFF6712FFCFD75EA1, 0xAE623FD67468AA70,
+    0xDD2C5BC84BC8D8FC, 0x7EED120D54CF2DD9, 0x22FE545401165F1C, 0xC91800E98FB99929, 0x808BD68E6AC10365,
+    0xDEC468145B7605F6, 0x1BEDE3A3AEF53302, 0x43539603D6C55602, 0xAA969B5C691CCB7A, 0xA87832D392EFEE56,
+    0x65942C7B3C7E11AE, 0xDED2D633CAD004F6, 0x21F08570F420E565, 0xB415938D7DA94E3C, 0x91B859E59ECB6350,
+    0x10CFF333E0ED804A, 0x28AED140BE0BB7DD, 0xC5CC1D89724FA456, 0x5648F680F11A2741, 0x2D255069F0B7DAB3,
+    0x9BC5A38EF729ABD4, 0xEF2F054308F6A2BC, 0xAF2042F5CC5C2858, 0x480412BAB7F5BE2A, 0xAEF3AF4A563DFE43,
+    0x19AFE59AE451497F, 0x52593803DFF1E840, 0xF4F076E65F2CE6F0, 0x11379625747D5AF3, 0xBCE5D2248682C115,
+    0x9DA4243DE836994F, 0x066F70B33FE09017, 0x4DC4DE189B671A1C, 0x51039AB7712457C3, 0xC07A3F80C31FB4B4,
+    0xB46EE9C5E64A6E7C, 0xB3819A42ABE61C87, 0x21A007933A522A20, 0x2DF16F761598AA4F, 0x763C4A1371B368FD,
+    0xF793C46702E086A0, 0xD7288E012AEB8D31, 0xDE336A2A4BC1C44B, 0x0BF692B38D079F23, 0x2C604A7A177326B3,
+    0x4850E73E03EB6064, 0xCFC447F1E53C8E1B, 0xB05CA3F564268D99, 0x9AE182C8BC9474E8, 0xA4FC4BD4FC5558CA,
+    0xE755178D58FC4E76, 0x69B97DB1A4C03DFE, 0xF9B5B7C4ACC67C96, 0xFC6A82D64B8655FB, 0x9C684CB6C4D24417,
+    0x8EC97D2917456ED0, 0x6703DF9D2924E97E, 0xC547F57E42A7444E, 0x78E37644E7CAD29E, 0xFE9A44E9362F05FA,
+    0x08BD35CC38336615, 0x9315E5EB3A129ACE, 0x94061B871E04DF75, 0xDF1D9F9D784BA010, 0x3BBA57B68871B59D,
+    0xD2B7ADEEDED1F73F, 0xF7A255D83BC373F8, 0xD7F4F2448C0CEB81, 0xD95BE88CD210FFA7, 0x336F52F8FF4728E7,
+    0xA74049DAC312AC71, 0xA2F61BB6E437FDB5, 0x4F2A5CB07F6A35B3, 0x87D380BDA5BF7859, 0x16B9F7E06C453A21,
+    0x7BA2484C8A0FD54E, 0xF3A678CAD9A2E38C, 0x39B0BF7DDE437BA2, 0xFCAF55C1BF8A4424, 0x18FCF680573FA594,
+    0x4C0563B89F495AC3, 0x40E087931A00930D, 0x8CFFA9412EB642C1, 0x68CA39053261169F, 0x7A1EE967D27579E2,
+    0x9D1D60E5076F5B6F, 0x3810E399B6F65BA2, 0x32095B6D4AB5F9B1, 0x35CAB62109DD038A, 0xA90B24499FCFAFB1,
+    0x77A225A07CC2C6BD, 0x513E5E634C70E331, 0x4361C0CA3F692F12, 0xD941ACA44B20A45B, 0x528F7C8602C5807B,
+    0x52AB92BEB9613989, 0x9D1DFA2EFC557F73, 0x722FF175F572C348, 0x1D1260A51107FE97, 0x7A249A57EC0C9BA2,
+    0x04208FE9E8F7F2D6, 0x5A110C6058B920A0, 0x0CD9A497658A5698, 0x56FD23C8F9715A4C, 0x284C847B9D887AAE,
+    0x04FEABFBBDB619CB, 0x742E1E651C60BA83, 0x9A9632E65904AD3C, 0x881B82A13B51B9E2, 0x506E6744CD974924,
+    0xB0183DB56FFC6A79, 0x0ED9B915C66ED37E, 0x5E11E86D5873D484, 0xF678647E3519AC6E, 0x1B85D488D0F20CC5,
+    0xDAB9FE6525D89021, 0x0D151D86ADB73615, 0xA865A54EDCC0F019, 0x93C42566AEF98FFB, 0x99E7AFEABE000731,
+    0x48CBFF086DDF285A, 0x7F9B6AF1EBF78BAF, 0x58627E1A149BBA21, 0x2CD16E2ABD791E33, 0xD363EFF5F0977996,
+    0x0CE2A38C344A6EED, 0x1A804AADB9CFA741, 0x907F30421D78C5DE, 0x501F65EDB3034D07, 0x37624AE5A48FA6E9,
+    0x957BAF61700CFF4E, 0x3A6C27934E31188A, 0xD49503536ABCA345, 0x088E049589C432E0, 0xF943AEE7FEBF21B8,
+    0x6C3B8E3E336139D3, 0x364F6FFA464EE52E, 0xD60F6DCEDC314222, 0x56963B0DCA418FC0, 0x16F50EDF91E513AF,
+    0xEF1955914B609F93, 0x565601C0364E3228, 0xECB53939887E8175, 0xBAC7A9A18531294B, 0xB344C470397BBA52,
+    0x65D34954DAF3CEBD, 0xB4B81B3FA97511E2, 0xB422061193D6F6A7, 0x071582401C38434D, 0x7A13F18BBEDC4FF5,
+    0xBC4097B116C524D2, 0x59B97885E2F2EA28, 0x99170A5DC3115544, 0x6F423357E7C6A9F9, 0x325928EE6E6F8794,
+    0xD0E4366228B03343, 0x565C31F7DE89EA27, 0x30F5611484119414, 0xD873DB391292ED4F, 0x7BD94E1D8E17DEBC,
+    0xC7D9F16864A76E94, 0x947AE053EE56E63C, 0xC8C93882F9475F5F, 0x3A9BF55BA91F81CA, 0xD9A11FBB3D9808E4,
+    0x0FD22063EDC29FCA, 0xB3F256D8ACA0B0B9, 0xB03031A8B4516E84, 0x35DD37D5871448AF, 0xE9F6082B05542E4E,
+    0xEBFAFA33D7254B59, 0x9255ABB50D532280, 0xB9AB4CE57F2D34F3, 0x693501D628297551, 0xC62C58F97DD949BF,
+    0xCD454F8F19C5126A, 0xBBE83F4ECC2BDECB, 0xDC842B7E2819E230, 0xBA89142E007503B8, 0xA3BC941D0A5061CB,
+    0xE9F6760E32CD8021, 0x09C7E552BC76492F, 0x852F54934DA55CC9, 0x8107FCCF064FCF56, 0x098954D51FFF6580,
+    0x23B70EDB1955C4BF, 0xC330DE426430F69D, 0x4715ED43E8A45C0A, 0xA8D7E4DAB780A08D, 0x0572B974F03CE0BB,
+    0xB57D2E985E1419C7, 0xE8D9ECBE2CF3D73F, 0x2FE4B17170E59750, 0x11317BA87905E790, 0x7FBF21EC8A1F45EC,
+    0x1725CABFCB045B00, 0x964E915CD5E2B207, 0x3E2B8BCBF016D66D, 0xBE7444E39328A0AC, 0xF85B2B4FBCDE44B7,
+    0x49353FEA39BA63B1, 0x1DD01AAFCD53486A, 0x1FCA8A92FD719F85, 0xFC7C95D827357AFA, 0x18A6A990C8B35EBD,
+    0xCCCB7005C6B9C28D, 0x3BDBB92C43B17F26, 0xAA70B5B4F89695A2, 0xE94C39A54A98307F, 0xB7A0B174CFF6F36E,
+    0xD4DBA84729AF48AD, 0x2E18BC1AD9704A68, 0x2DE0966DAF2F8B1C, 0xB9C11D5B1E43A07E, 0x64972D68DEE33360,
+    0x94628D38D0C20584, 0xDBC0D2B6AB90A559, 0xD2733C4335C6A72F, 0x7E75D99D94A70F4D, 0x6CED1983376FA72B,
+    0x97FCAACBF030BC24, 0x7B77497B32503B12, 0x8547EDDFB81CCB94, 0x79999CDFF70902CB, 0xCFFE1939438E9B24,
+    0x829626E3892D95D7, 0x92FAE24291F2B3F1, 0x63E22C147B9C3403, 0xC678B6D860284A1C, 0x5873888850659AE7,
+    0x0981DCD296A8736D, 0x9F65789A6509A440, 0x9FF38FED72E9052F, 0xE479EE5B9930578C, 0xE7F28ECD2D49EECD,
+    0x56C074A581EA17FE, 0x5544F7D774B14AEF, 0x7B3F0195FC6F290F, 0x12153635B2C0CF57, 0x7F5126DBBA5E0CA7,
+    0x7A76956C3EAFB413, 0x3D5774A11D31AB39, 0x8A1B083821F40CB4, 0x7B4A38E32537DF62, 0x950113646D1D6E03,
+    0x4DA8979A0041E8A9, 0x3BC36E078F7515D7, 0x5D0A12F27AD310D1, 0x7F9D1A2E1EBE1327, 0xDA3A361B1C5157B1,
+    0xDCDD7D20903D0C25, 0x36833336D068F707, 0xCE68341F79893389, 0xAB9090168DD05F34, 0x43954B3252DC25E5,
+    0xB438C2B67F98E5E9, 0x10DCD78E3851A492, 0xDBC27AB5447822BF, 0x9B3CDB65F82CA382, 0xB67B7896167B4C84,
+    0xBFCED1B0048EAC50, 0xA9119B60369FFEBD, 0x1FFF7AC80904BF45, 0xAC12FB171817EEE7, 0xAF08DA9177DDA93D,
+    0x1B0CAB936E65C744, 0xB559EB1D04E5E932, 0xC37B45B3F8D6F2BA, 0xC3A9DC228CAAC9E9, 0xF3B8B6675A6507FF,
+    0x9FC477DE4ED681DA, 0x67378D8ECCEF96CB, 0x6DD856D94D259236, 0xA319CE15B0B4DB31, 0x073973751F12DD5E,
+    0x8A8E849EB32781A5, 0xE1925C71285279F5, 0x74C04BF1790C0EFE, 0x4DDA48153C94938A, 0x9D266D6A1CC0542C,
+    0x7440FB816508C4FE, 0x13328503DF48229F, 0xD6BF7BAEE43CAC40, 0x4838D65F6EF6748F, 0x1E152328F3318DEA,
+    0x8F8419A348F296BF, 0x72C8834A5957B511, 0xD7A023A73260B45C, 0x94EBC8ABCFB56DAE, 0x9FC10D0F989993E0,
+    0xDE68A2355B93CAE6, 0xA44CFE79AE538BBE, 0x9D1D84FCCE371425, 0x51D2B1AB2DDFB636, 0x2FD7E4B9E72CD38C,
+    0x65CA5B96B7552210, 0xDD69A0D8AB3B546D, 0x604D51B25FBF70E2, 0x73AA8A564FB7AC9E, 0x1A8C1E992B941148,
+    0xAAC40A2703D9BEA0, 0x764DBEAE7FA4F3A6, 0x1E99B96E70A9BE8B, 0x2C5E9DEB57EF4743, 0x3A938FEE32D29981,
+    0x26E6DB8FFDF5ADFE, 0x469356C504EC9F9D, 0xC8763C5B08D1908C, 0x3F6C6AF859D80055, 0x7F7CC39420A3A545,
+    0x9BFB227EBDF4C5CE, 0x89039D79D6FC5C5C, 0x8FE88B57305E2AB6, 0xA09E8C8C35AB96DE, 0xFA7E393983325753,
+    0xD6B6D0ECC617C699, 0xDFEA21EA9E7557E3, 0xB67C1FA481680AF8, 0xCA1E3785A9E724E5, 0x1CFC8BED0D681639,
+    0xD18D8549D140CAEA, 0x4ED0FE7E9DC91335, 0xE4DBF0634473F5D2, 0x1761F93A44D5AEFE, 0x53898E4C3910DA55,
+    0x734DE8181F6EC39A, 0x2680B122BAA28D97, 0x298AF231C85BAFAB, 0x7983EED3740847D5, 0x66C1A2A1A60CD889,
+    0x9E17E49642A3E4C1, 0xEDB454E7BADC0805, 0x50B704CAB602C329, 0x4CC317FB9CDDD023, 0x66B4835D9EAFEA22,
+    0x219B97E26FFC81BD, 0x261E4E4C0A333A9D, 0x1FE2CCA76517DB90, 0xD7504DFA8816EDBB, 0xB9571FA04DC089C8,
+    0x1DDC0325259B27DE, 0xCF3F4688801EB9AA, 0xF4F5D05C10CAB243, 0x38B6525C21A42B0E, 0x36F60E2BA4FA6800,
+    0xEB3593803173E0CE, 0x9C4CD6257C5A3603, 0xAF0C317D32ADAA8A, 0x258E5A80C7204C4B, 0x8B889D624D44885D,
+    0xF4D14597E660F855, 0xD4347F66EC8941C3, 0xE699ED85B0DFB40D, 0x2472F6207C2D0484, 0xC2A1E7B5B459AEB5,
+    0xAB4F6451CC1D45EC, 0x63767572AE3D6174, 0xA59E0BD101731A28, 0x116D0016CB948F09, 0x2CF9C8CA052F6E9F,
+    0x0B090A7560A968E3, 0xABEEDDB2DDE06FF1, 0x58EFC10B06A2068D, 0xC6E57A78FBD986E0, 0x2EAB8CA63CE802D7,
+    0x14A195640116F336, 0x7C0828DD624EC390, 0xD74BBE77E6116AC7, 0x804456AF10F5FB53, 0xEBE9EA2ADF4321C7,
+    0x03219A39EE587A30, 0x49787FEF17AF9924, 0xA1E9300CD8520548, 0x5B45E522E4B1B4EF, 0xB49C3B3995091A36,
+    0xD4490AD526F14431, 0x12A8F216AF9418C2, 0x001F837CC7350524, 0x1877B51E57A764D5, 0xA2853B80F17F58EE,
+    0x993E1DE72D36D310, 0xB3598080CE64A656, 0x252F59CF0D9F04BB, 0xD23C8E176D113600, 0x1BDA0492E7E4586E,
+    0x21E0BD5026C619BF, 0x3B097ADAF088F94E, 0x8D14DEDB30BE846E, 0xF95CFFA23AF5F6F4, 0x3871700761B3F743,
+    0xCA672B91E9E4FA16, 0x64C8E531BFF53B55, 0x241260ED4AD1E87D, 0x106C09B972D2E822, 0x7FBA195410E5CA30,
+    0x7884D9BC6CB569D8, 0x0647DFEDCD894A29, 0x63573FF03E224774, 0x4FC8E9560F91B123, 0x1DB956E450275779,
+    0xB8D91274B9E9D4FB, 0xA2EBEE47E2FBFCE1, 0xD9F1F30CCD97FB09, 0xEFED53D75FD64E6B, 0x2E6D02C36017F67F,
+    0xA9AA4D20DB084E9B, 0xB64BE8D8B25396C1, 0x70CB6AF7C2D5BCF0, 0x98F076A4F7A2322E, 0xBF84470805E69B5F,
+    0x94C3251F06F90CF3, 0x3E003E616A6591E9, 0xB925A6CD0421AFF3, 0x61BDD1307C66E300, 0xBF8D5108E27E0D48,
+    0x240AB57A8B888B20, 0xFC87614BAF287E07, 0xEF02CDD06FFDB432, 0xA1082C0466DF6C0A, 0x8215E577001332C8,
+    0xD39BB9C3A48DB6CF, 0x2738259634305C14, 0x61CF4F94C97DF93D, 0x1B6BACA2AE4E125B, 0x758F450C88572E0B,
+    0x959F587D507A8359, 0xB063E962E045F54D, 0x60E8ED72C0DFF5D1, 0x7B64978555326F9F, 0xFD080D236DA814BA,
+    0x8C90FD9B083F4558, 0x106F72FE81E2C590, 0x7976033A39F7D952, 0xA4EC0132764CA04B, 0x733EA705FAE4FA77,
+    0xB4D8F77BC3E56167, 0x9E21F4F903B33FD9, 0x9D765E419FB69F6D, 0xD30C088BA61EA5EF, 0x5D94337FBFAF7F5B,
+    0x1A4E4822EB4D7A59, 0x6FFE73E81B637FB3, 0xDDF957BC36D8B9CA, 0x64D0E29EEA8838B3, 0x08DD9BDFD96B9F63,
+    0x087E79E5A57D1D13, 0xE328E230E3E2B3FB, 0x1C2559E30F0946BE, 0x720BF5F26F4D2EAA, 0xB0774D261CC609DB,
+    0x443F64EC5A371195, 0x4112CF68649A260E, 0xD813F2FAB7F5C5CA, 0x660D3257380841EE, 0x59AC2C7873F910A3,
+    0xE846963877671A17, 0x93B633ABFA3469F8, 0xC0C0F5A60EF4CDCF, 0xCAF21ECD4377B28C, 0x57277707199B8175,
+    0x506C11B9D90E8B1D, 0xD83CC2687A19255F, 0x4A29C6465A314CD1, 0xED2DF21216235097, 0xB5635C95FF7296E2,
+    0x22AF003AB672E811, 0x52E762596BF68235, 0x9AEBA33AC6ECC6B0, 0x944F6DE09134DFB6, 0x6C47BEC883A7DE39,
+    0x6AD047C430A12104, 0xA5B1CFDBA0AB4067, 0x7C45D833AFF07862, 0x5092EF950A16DA0B, 0x9338E69C052B8E7B,
+    0x455A4B4CFE30E3F5, 0x6B02E63195AD0CF8, 0x6B17B224BAD6BF27, 0xD1E0CCD25BB9C169, 0xDE0C89A556B9AE70,
+    0x50065E535A213CF6, 0x9C1169FA2777B874, 0x78EDEFD694AF1EED, 0x6DC93D9526A50E68, 0xEE97F453F06791ED,
+    0x32AB0EDB696703D3, 0x3A6853C7E70757A7, 0x31865CED6120F37D, 0x67FEF95D92607890, 0x1F2B1D1F15F6DC9C,
+    0xB69E38A8965C6B65, 0xAA9119FF184CCCF4, 0xF43C732873F24C13, 0xFB4A3D794A9A80D2, 0x3550C2321FD6109C,
+    0x371F77E76BB8417E, 0x6BFA9AAE5EC05779, 0xCD04F3FF001A4778, 0xE3273522064480CA, 0x9F91508BFFCFC14A,
+    0x049A7F41061A9E60, 0xFCB6BE43A9F2FE9B, 0x08DE8A1C7797DA9B, 0x8F9887E6078735A1, 0xB5B4071DBFC73A66,
+    0x230E343DFBA08D33, 0x43ED7F5A0FAE657D, 0x3A88A0FBBCB05C63, 0x21874B8B4D2DBC4F, 0x1BDEA12E35F6A8C9,
+    0x53C065C6C8E63528, 0xE34A1D250E7A8D6B, 0xD6B04D3B7651DD7E, 0x5E90277E7CB39E2D, 0x2C046F22062DC67D,
+    0xB10BB459132D0A26, 0x3FA9DDFB67E2F199, 0x0E09B88E1914F7AF, 0x10E8B35AF3EEAB37, 0x9EEDECA8E272B933,
+    0xD4C718BC4AE8AE5F, 0x81536D601170FC20, 0x91B534F885818A06, 0xEC8177F83F900978, 0x190E714FADA5156E,
+    0xB592BF39B0364963, 0x89C350C893AE7DC1, 0xAC042E70F8B383F2, 0xB49B52E587A1EE60, 0xFB152FE3FF26DA89,
+    0x3E666E6F69AE2C15, 0x3B544EBE544C19F9, 0xE805A1E290CF2456, 0x24B33C9D7ED25117, 0xE74733427B72F0C1,
+    0x0A804D18B7097475, 0x57E3306D881EDB4F, 0x4AE7D6A36EB5DBCB, 0x2D8D5432157064C8, 0xD1E649DE1E7F268B,
+    0x8A328A1CEDFE552C, 0x07A3AEC79624C7DA, 0x84547DDC3E203C94, 0x990A98FD5071D263, 0x1A4FF12616EEFC89,
+    0xF6F7FD1431714200, 0x30C05B1BA332F41C, 0x8D2636B81555A786, 0x46C9FEB55D120902, 0xCCEC0A73B49C9921,
+    0x4E9D2827355FC492, 0x19EBB029435DCB0F, 0x4659D2B743848A2C, 0x963EF2C96B33BE31, 0x74F85198B05A2E7D,
+    0x5A0F544DD2B1FB18, 0x03727073C2E134B1, 0xC7F6AA2DE59AEA61, 0x352787BAA0D7C22F, 0x9853EAB63B5E0B35,
+    0xABBDCDD7ED5C0860, 0xCF05DAF5AC8D77B0, 0x49CAD48CEBF4A71E, 0x7A4C10EC2158C4A6, 0xD9E92AA246BF719E,
+    0x13AE978D09FE5557, 0x730499AF921549FF, 0x4E4B705B92903BA4, 0xFF577222C14F0A3A, 0x55B6344CF97AAFAE,
+    0xB862225B055B6960, 0xCAC09AFBDDD2CDB4, 0xDAF8E9829FE96B5F, 0xB5FDFC5D3132C498, 0x310CB380DB6F7503,
+    0xE87FBB46217A360E, 0x2102AE466EBB1148, 0xF8549E1A3AA5E00D, 0x07A69AFDCC42261A, 0xC4C118BFE78FEAAE,
+    0xF9F4892ED96BD438, 0x1AF3DBE25D8F45DA, 0xF5B4B0B0D2DEEEB4, 0x962ACEEFA82E1C84, 0x046E3ECAAF453CE9,
+    0xF05D129681949A4C, 0x964781CE734B3C84, 0x9C2ED44081CE5FBD, 0x522E23F3925E319E, 0x177E00F9FC32F791,
+    0x2BC60A63A6F3B3F2, 0x222BBFAE61725606, 0x486289DDCC3D6780, 0x7DC7785B8EFDFC80, 0x8AF38731C02BA980,
+    0x1FAB64EA29A2DDF7, 0xE4D9429322CD065A, 0x9DA058C67844F20C, 0x24C0E332B70019B0, 0x233003B5A6CFE6AD,
+    0xD586BD01C5C217F6, 0x5E5637885F29BC2B, 0x7EBA726D8C94094B, 0x0A56A5F0BFE39272, 0xD79476A84EE20D06,
+    0x9E4C1269BAA4BF37, 0x17EFEE45B0DEE640, 0x1D95B0A5FCF90BC6, 0x93CBE0B699C2585D, 0x65FA4F227A2B6D79,
+    0xD5F9E858292504D5, 0xC2B5A03F71471A6F, 0x59300222B4561E00, 0xCE2F8642CA0712DC, 0x7CA9723FBB2E8988,
+    0x2785338347F2BA08, 0xC61BB3A141E50E8C, 0x150F361DAB9DEC26, 0x9F6A419D382595F4, 0x64A53DC924FE7AC9,
+    0x142DE49FFF7A7C3D, 0x0C335248857FA9E7, 0x0A9C32D5EAE45305, 0xE6C42178C4BBB92E, 0x71F1CE2490D20B07,
+    0xF1BCC3D275AFE51A, 0xE728E8C83C334074, 0x96FBF83A12884624, 0x81A1549FD6573DA5, 0x5FA7867CAF35E149,
+    0x56986E2EF3ED091B, 0x917F1DD5F8886C61, 0xD20D8C88C8FFE65F, 0x31D71DCE64B2C310, 0xF165B587DF898190,
+    0xA57E6339DD2CF3A0, 0x1EF6E6DBB1961EC9, 0x70CC73D90BC26E24, 0xE21A6B35DF0C3AD7, 0x003A93D8B2806962,
+    0x1C99DED33CB890A1, 0xCF3145DE0ADD4289, 0xD0E4427A5514FB72, 0x77C621CC9FB3A483, 0x67A34DAC4356550B,
+    0xF8D626AAAF278509,
+)
+POLYGLOT_PROMOTIONS = (None, 'knight', 'bishop', 'rook', 'queen')
+
+
+# 2. Polyglot numbers the squares from a1, so row 7 of the board is its rank 0. A piece is
+#    2 * role + 1 for white, 2 * role for black. The en passant file only counts when a pawn
+#    can really take en passant.
+def get_polyglot_key(chess):
+    state = chess.get_state()
+    key = 0
+    for index, (color, role) in enumerate(state):
+        if color != 'empty':
+            key ^= POLYGLOT_RANDOM[64 * (2 * ROLES.index(role) + (color == 'white')) + (index ^ 56)]
+    for bit in range(4):
+        if chess.castling & (1 << bit):
+            key ^= POLYGLOT_RANDOM[768 + bit]
+    if chess.en_passant:
+        row, column = chess.en_passant
+        for side in (column - 1, column + 1):
+            if 0 <= side < 8 and state[row * 8 + side] == (chess.player, 'pawn'):
+                key ^= POLYGLOT_RANDOM[772 + column]
+                break
+    if chess.player == 'white':
+        key ^= POLYGLOT_RANDOM[780]
+    return key
+
+
+# 3. A book is a file of 16-byte entries sorted by key: key, move, weight and a learn field
+#    nobody uses. The file is mapped into memory and searched in place, so even a big book
+#    costs nothing to open and only the pages that are looked at are read.
+class OpeningBook:
+    ENTRY = struct.Struct('>QHHI')
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.map) // self.ENTRY.size
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, i):
+        return struct.unpack_from('>Q', self.map, i * self.ENTRY.size)[0]
+
+    def get_entries(self, key):
+        # binary search for the first entry with the key, its moves follow it
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size and self.get_key(low) == key:
+            entries.append(self.ENTRY.unpack_from(self.map, low * self.ENTRY.size))
+            low += 1
+        return entries
+
+    def get_moves(self, chess):
+        # (move, promotion, weight) for every book move that is legal here
+        moves = []
+        legal_moves = chess.get_all_moves()
+        state = chess.get_state()
+        for key, move, weight, learn in self.get_entries(get_polyglot_key(chess)):
+            source = 7 - (move >> 9 & 7), move >> 6 & 7
+            destination = 7 - (move >> 3 & 7), move & 7
+            # castling is written as the king taking its own rook
+            if source in ((7, 4), (0, 4)) and destination[0] == source[0] and destination[1] in (0, 7) and \
+                    state[grid_to_index(source)][1] == 'king':
+                destination = source[0], 6 if destination[1] == 7 else 2
+            if weight and (source, destination) in legal_moves:
+                moves.append(((source, destination), POLYGLOT_PROMOTIONS[move >> 12 & 7], weight))
+        return moves
+
+    def choose(self, chess):
+        # a random book move, the heavier the more often; None out of book
+        moves = self.get_moves(chess)
+        if not moves:
+            self.misses += 1
+            return None
+        self.hits += 1
+        move, promotion, weight = random.choices(moves, [weight for move, promotion, weight in moves])[0]
+        return move, promotion
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+# 2. Endgame tablebases: for a king and a few pieces against a lone king, the result of every
+#    position with perfect play. A position is written as the squares of the strong king, the
+#    weak king and the strong pieces, and the side to move. The strong side is always white
+#    in the table, a position where black is the strong side is turned upside down first.
+TABLEBASE_ORDER = ('queen', 'rook', 'bishop', 'knight', 'pawn')
+INSUFFICIENT = ((), ('bishop',), ('knight',))  # no mate possible: always a draw
+TABLEBASE_WIN = 5000  # a won tablebase position, minus the plies to mate
+
+
+def get_tablebase_name(roles):
+    return 'K' + ''.join(FEN_LETTERS[role].upper() for role in roles) + 'K'
+
+
+def sort_roles(roles):
+    return tuple(sorted(roles, key=TABLEBASE_ORDER.index))
+
+
+# 3. The board looks the same turned or mirrored in 8 ways. Without pawns the strong king can
+#    always be brought into the triangle a1-d1-d4, with pawns only the left-right mirror keeps
+#    the rules, and the king can be brought to the files a-d. That makes the tables 6 and 2
+#    times smaller.
+def make_transforms():
+    transforms = []
+    for flip_row in (False, True):
+        for flip_column in (False, True):
+            for swap in (False, True):
+                transform = []
+                for index in range(64):
+                    row, column = INDEX_TO_GRID[index]
+                    if swap:
+                        row, column = column, row
+                    if flip_row:
+                        row = 7 - row
+                    if flip_column:
+                        column = 7 - column
+                    transform.append(row * 8 + column)
+                transforms.append(transform)
+    return transforms
+
+
+TRANSFORMS = make_transforms()
+# the squares of the strong king, without and with pawns
+TABLEBASE_SQUARES = ([56, 57, 58, 59, 49, 50, 51, 42, 43, 35], [row * 8 + column for row in range(8) for column in range(4)])
+TABLEBASE_BASE = [{square: i for i, square in enumerate(squares)} for squares in TABLEBASE_SQUARES]
+TABLEBASE_TRANSFORMS = [[[transform for transform in transforms if transform[square] in TABLEBASE_BASE[pawns]]
+                         for square in range(64)] for pawns, transforms in enumerate((TRANSFORMS, TRANSFORMS[:3:2]))]
+
+
+def get_tablebase_index(squares, turn, pawns, same=()):
+    # the smallest index of all the ways to turn the position, so that every position has one
+    # index. same has the (start, end) of pieces of the same role, those are sorted by square.
+    best = -1
+    for transform in TABLEBASE_TRANSFORMS[pawns][squares[0]]:
+        moved = [transform[square] for square in squares]
+        for start, end in same:
+            moved[start:end] = sorted(moved[start:end])
+        index = TABLEBASE_BASE[pawns][moved[0]]
+        for square in moved[1:]:
+            index = index * 64 + square
+        index = index * 2 + turn
+        if best < 0 or index < best:
+            best = index
+    return best
+
+
+def get_same(roles):
+    same = []
+    start = 0
+    for end in range(1, len(roles) + 1):
+        if end == len(roles) or roles[end] != roles[start]:
+            if end - start > 1:
+                same.append((start + 2, end + 2))
+            start = end
+    return same
+
+
+def get_piece_attacks(role, square, occupancy):
+    if role == 'knight':
+        return KNIGHT_ATTACKS[square]
+    if role == 'bishop':
+        return bishop_attacks(square, occupancy)
+    if role == 'rook':
+        return rook_attacks(square, occupancy)
+    if role == 'queen':
+        return bishop_attacks(square, occupancy) | rook_attacks(square, occupancy)
+    return PAWN_ATTACKS['white'][square]
+
+
+def get_white_attacks(squares, roles, occupancy):
+    attacks = KING_ATTACKS[squares[0]]
+    for square, role in zip(squares[2:], roles):
+        attacks |= get_piece_attacks(role, square, occupancy)
+    return attacks
+
+
+def is_tablebase_legal(squares, roles, turn):
+    occupancy = 0
+    for square in squares:
+        occupancy |= 1 << square
+    if bin(occupancy).count('1') < len(squares) or KING_ATTACKS[squares[0]] & (1 << squares[1]):
+        return False
+    if any(role == 'pawn' and not 8 <= square < 56 for square, role in zip(squares[2:], roles)):
+        return False
+    # the side that just moved can not be in check
+    return turn == 1 or not get_white_attacks(squares, roles, occupancy) & (1 << squares[1])
+
+
+def get_white_moves(squares, roles):
+    # the (squares, roles) after every white move, a promotion changes the roles
+    occupancy = 0
+    for square in squares:
+        occupancy |= 1 << square
+    children = []
+    for target in get_bits(KING_ATTACKS[squares[0]] & ~occupancy & ~KING_ATTACKS[squares[1]]):
+        children.append(([target] + squares[1:], roles))
+    for k, role in enumerate(roles, 2):
+        square = squares[k]
+        if role == 'pawn':
+            targets = []
+            if not occupancy & (1 << (square - 8)):
+                targets.append(square - 8)
+                if square >= 48 and not occupancy & (1 << (square - 16)):
+                    targets.append(square - 16)
+            for target in targets:
+                if target < 8:
+                    for promotion in ('queen', 'rook', 'bishop', 'knight'):
+                        children.append((squares[:k] + [target] + squares[k + 1:],
+                                         roles[:k - 2] + (promotion,) + roles[k - 1:]))
+                else:
+                    children.append((squares[:k] + [target] + squares[k + 1:], roles))
+            continue
+        # only the black king could be taken, and that never happens
+        for target in get_bits(get_piece_attacks(role, square, occupancy) & ~occupancy):
+            children.append((squares[:k] + [target] + squares[k + 1:], roles))
+    return children
+
+
+def get_black_moves(squares, roles):
+    # the children after every black king move, a capture takes the piece off, and is black in check?
+    occupancy = 0
+    for square in squares:
+        occupancy |= 1 << square
+    attacks = get_white_attacks(squares, roles, occupancy & ~(1 << squares[1]))
+    children = []
+    for target in get_bits(KING_ATTACKS[squares[1]] & ~attacks):
+        if occupancy & (1 << target):
+            k = squares.index(target)
+            children.append((squares[:1] + [target] + squares[2:k] + squares[k + 1:], roles[:k - 2] + roles[k - 1:]))
+        else:
+            children.append((squares[:1] + [target] + squares[2:], roles))
+    return children, bool(attacks & (1 << squares[1]))
+
+
+def get_white_unmoves(squares, roles):
+    # the positions white could have moved from, the opposite of get_white_moves
+    occupancy = 0
+    for square in squares:
+        occupancy |= 1 << square
+    parents = []
+    for source in get_bits(KING_ATTACKS[squares[0]] & ~occupancy & ~KING_ATTACKS[squares[1]]):
+        parents.append([source] + squares[1:])
+    for k, role in enumerate(roles, 2):
+        square = squares[k]
+        if role == 'pawn':
+            if square + 8 < 56 and not occupancy & (1 << (square + 8)):
+                parents.append(squares[:k] + [square + 8] + squares[k + 1:])
+                if 32 <= square < 40 and not occupancy & (1 << (square + 16)):
+                    parents.append(squares[:k] + [square + 16] + squares[k + 1:])
+            continue
+        for source in get_bits(get_piece_attacks(role, square, occupancy) & ~occupancy):
+            parents.append(squares[:k] + [source] + squares[k + 1:])
+    return parents
+
+
+def get_black_unmoves(squares):
+    occupancy = 0
+    for square in squares:
+        occupancy |= 1 << square
+    return [squares[:1] + [source] + squares[2:]
+            for source in get_bits(KING_ATTACKS[squares[1]] & ~occupancy & ~KING_ATTACKS[squares[0]])]
+
+
+def probe_table(tables, squares, roles, turn):
+    # the entry of a position in another table, after a capture or a promotion
+    order = sorted(range(len(roles)), key=lambda k: TABLEBASE_ORDER.index(roles[k]))
+    roles = tuple(roles[k] for k in order)
+    if roles in INSUFFICIENT:
+        return 0
+    squares = squares[:2] + [squares[k + 2] for k in order]
+    return tables[get_tablebase_name(roles)][get_tablebase_index(squares, turn, 'pawn' in roles, get_same(roles))]
+
+
+# 4. Retrograde analysis: start from the checkmates and go backwards. An entry is 0 for a draw,
+#    255 for a position that can not happen, and otherwise 1 + the plies to mate: white to move
+#    wins, black to move loses. A white position wins as soon as one move reaches a lost black
+#    position. A black position is lost when the last of its moves reaches a won white one, so
+#    every black position counts the positions its moves reach. Going through the plies in
+#    order makes every distance the shortest mate for the winner and the longest for the loser.
+def generate_tablebase(roles, directory='tablebases', tables=None):
+    roles = sort_roles(roles)
+    name = get_tablebase_name(roles)
+    tables = {} if tables is None else tables
+    # the tables reached by a capture or a promotion come first
+    for k, role in enumerate(roles):
+        for new_role in ('queen', 'rook', 'bishop', 'knight') if role == 'pawn' else (None,):
+            sub_roles = sort_roles(roles[:k] + ((new_role,) if new_role else ()) + roles[k + 1:])
+            sub_name = get_tablebase_name(sub_roles)
+            if sub_roles in INSUFFICIENT or sub_name in tables:
+                continue
+            path = os.path.join(directory, sub_name + '.tb')
+            if os.path.exists(path):
+                with open(path, 'rb') as file:
+                    tables[sub_name] = file.read()
+            else:
+                generate_tablebase(sub_roles, directory, tables)
+    start = time.time()
+    pawns = 'pawn' in roles
+    same = get_same(roles)
+    size = len(TABLEBASE_SQUARES[pawns]) * 64 ** (len(roles) + 1) * 2
+    result = bytearray(size)
+    remaining = bytearray(size)  # black: positions reached that are not known to be won, 255: never lost
+    external = bytearray(size)  # black: 1 + the longest mate after a capture
+    done = bytearray(size)  # a position can be in the buckets more than once, go back from it only once
+    buckets = [[] for ply in range(255)]
+
+    def get_squares(index):
+        rest = index >> 1
+        squares = [0] * (len(roles) + 2)
+        for k in range(len(roles) + 1, 0, -1):
+            squares[k] = rest & 63
+            rest >>= 6
+        squares[0] = TABLEBASE_SQUARES[pawns][rest]
+        return squares
+
+    for index in range(size):
+        turn = index & 1
+        squares = get_squares(index)
+        if get_tablebase_index(squares, turn, pawns, same) != index or not is_tablebase_legal(squares, roles, turn):
+            result[index] = 255
+            continue
+        if turn == 0:
+            # a promotion to a lost black position wins
+            for child_squares, child_roles in get_white_moves(squares, roles):
+                if child_roles != roles:
+                    value = probe_table(tables, child_squares, list(child_roles), 1)
+                    if value and value != 255:
+                        buckets[value].append(index)
+            continue
+        children, check = get_black_moves(squares, roles)
+        if not children:
+            if check:
+                result[index] = 1
+                buckets[0].append(index)
+            else:
+                remaining[index] = 255
+            continue
+        reached = set()
+        for child_squares, child_roles in children:
+            if child_roles == roles:
+                reached.add(get_tablebase_index(child_squares, 0, pawns, same))
+                continue
+            value = probe_table(tables, child_squares, list(child_roles), 0)
+            if value == 0:
+                remaining[index] = 255
+                break
+            external[index] = max(external[index], value)
+        else:
+            remaining[index] = len(reached)
+            if not reached:
+                result[index] = external[index] + 1
+                buckets[external[index]].append(index)
+    for ply in range(254):
+        for index in buckets[ply]:
+            if result[index] == 0:
+                result[index] = ply + 1
+            elif result[index] != ply + 1 or done[index]:
+                continue
+            done[index] = 1
+            squares = get_squares(index)
+            if index & 1:
+                # lost for black: every white move into it wins
+                for parent_squares in get_white_unmoves(squares, roles):
+                    parent = get_tablebase_index(parent_squares, 0, pawns, same)
+                    if result[parent] == 0:
+                        result[parent] = ply + 2
+                        buckets[ply + 1].append(parent)
+            else:
+                # won for white: one way out less for every black position before it
+                for parent in {get_tablebase_index(parent_squares, 1, pawns, same)
+                               for parent_squares in get_black_unmoves(squares)}:
+                    if result[parent] == 0 and remaining[parent] != 255:
+                        remaining[parent] -= 1
+                        if remaining[parent] == 0:
+                            loss = max(ply + 1, external[parent])
+                            result[parent] = loss + 1
+                            buckets[loss].append(parent)
+    tables[name] = bytes(result)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name + '.tb'), 'wb') as file:
+        file.write(result)
+    won = sum(1 for index in range(0, size, 2) if 0 < result[index] < 255)
+    longest = max(value for value in result if value != 255) - 1
+    print(f'{name}: {size} entries, {won} won for white to move, longest mate {(longest + 1) // 2} moves, '
+          f'{time.time() - start:.1f}s')
+    return tables[name]
+
+
+# 5. The tables are read with mmap, so opening one costs nothing and a probe only reads the
+#    page of its entry.
+class Tablebase:
+    def __init__(self, directory='tablebases'):
+        self.directory = directory
+        self.tables = {}
+        names = [name[:-3] for name in os.listdir(directory) if name.endswith('.tb')] if os.path.isdir(directory) else []
+        self.max_pieces = max((len(name) for name in names), default=2)
+        self.hits = 0
+
+    def get_table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + '.tb')
+            self.tables[name] = None
+            if os.path.exists(path):
+                with open(path, 'rb') as file:
+                    self.tables[name] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.tables[name]
+
+    def probe(self, chess):
+        # ('win', plies), ('loss', plies) or ('draw', 0) for the side to move, None without a table
+        if chess.count_pieces() > self.max_pieces:
+            return None
+        pieces = {'white': [], 'black': []}
+        for index, (color, role) in enumerate(chess.get_state()):
+            if color != 'empty':
+                pieces[color].append((role, index))
+        strong = 'white' if len(pieces['black']) == 1 else 'black'
+        if len(pieces[other_color(strong)]) > 1:
+            return None
+        roles = sort_roles([role for role, index in pieces[strong] if role != 'king'])
+        if roles in INSUFFICIENT:
+            self.hits += 1
+            return 'draw', 0
+        table = self.get_table(get_tablebase_name(roles))
+        if table is None:
+            return None
+        flip = 56 if strong == 'black' else 0
+        kings = [index for role, index in pieces[strong] if role == 'king']
+        kings += [index for role, index in pieces[other_color(strong)]]
+        others = sorted((TABLEBASE_ORDER.index(role), index) for role, index in pieces[strong] if role != 'king')
+        squares = [index ^ flip for index in kings] + [index ^ flip for order, index in others]
+        turn = 0 if chess.player == strong else 1
+        value = table[get_tablebase_index(squares, turn, 'pawn' in roles, get_same(roles))]
+        if value == 255:
+            return None
+        self.hits += 1
+        if value == 0:
+            return 'draw', 0
+        return ('win' if turn == 0 else 'loss'), value - 1
+
+    def get_value(self, chess):
+        # the probe as a value for white, like minimax
+        entry = self.probe(chess)
+        if entry is None:
+            return None
+        result, plies = entry
+        value = {'win': TABLEBASE_WIN - plies, 'draw': 0, 'loss': plies - TABLEBASE_WIN}[result]
+        return value if chess.player == 'white' else -value
+
+    def get_best_move(self, chess):
+        # the fastest mate when winning, the slowest when losing, None without a table
+        if self.probe(chess) is None:
+            return None
+        best = None
+        for move in chess.get_all_moves():
+            for promotion in get_promotions(chess, move):
+                undo = chess.make_move(move, promotion, checkmate_check=False)
+                entry = self.probe(chess)
+                chess.unmake_move(undo)
+                if entry is None:
+                    return None
+                result, plies = entry
+                # the opponent's result, as a score for this side
+                score = {'loss': TABLEBASE_WIN - plies, 'draw': 0, 'win': plies - TABLEBASE_WIN}[result]
+                if best is None or score > best[0]:
+                    best = score, move, promotion
+        return best and (best[1], best[2])
+
+
+# 2. perft counts the positions reachable in exactly depth moves.
+#    The counts for well known positions are published, so a different count means a bug.
+def get_promotions(chess, move):
+    # a pawn reaching the last row makes four different moves
+    if (move[1][0] == 0 or move[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+        return ['queen', 'rook', 'bishop', 'knight']
+    return [None]
+
+
+def perft(chess, depth):
+    if depth == 0:
+        return 1
+    moves = chess.get_all_moves()
+    if depth == 1:
+        return sum(len(get_promotions(chess, move)) for move in moves)
+    nodes = 0
+    for move in moves:
+        for promotion in get_promotions(chess, move):
+            undo = chess.make_move(move, promotion, checkmate_check=False)
+            nodes += perft(chess, depth - 1)
+            chess.unmake_move(undo)
+    return nodes
+
+
+# 3. divide prints the count below every first move, to find which move is wrong
+def divide(chess, depth):
+    start = time.time()
+    total = 0
+    for move in chess.get_all_moves():
+        for promotion in get_promotions(chess, move):
+            undo = chess.make_move(move, promotion, checkmate_check=False)
+            nodes = perft(chess, depth - 1)
+            chess.unmake_move(undo)
+            print(f'{notation(move)}{" " + promotion if promotion else ""}: {nodes}')
+            total += nodes
+    seconds = time.time() - start
+    print(f'total={total} time={seconds:.2f}s nodes/s={int(total / seconds) if seconds else 0}')
+    return total
+
+
+# 4. reference positions and their counts for depth 1, 2, 3, ... as found by other chess programs
+PERFT_POSITIONS = (
+    ('start', START_FEN, (20, 400, 8902, 197281)),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', (48, 2039, 97862)),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', (14, 191, 2812, 43238)),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', (6, 264, 9467)),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', (44, 1486, 62379)),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P3/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', (47, 1845, 81467))
+)
+
+
+def perft_check(backend):
+    passed = True
+    for name, fen, counts in PERFT_POSITIONS:
+        for depth, expected in enumerate(counts, 1):
+            chess = load_fen(fen, backend)
+            start = time.time()
+            nodes = perft(chess, depth)
+            seconds = time.time() - start
+            result = 'ok' if nodes == expected else f'FAILED, expected {expected}'
+            print(f'{backend.__name__} {name} depth={depth} nodes={nodes} '
+                  f'nodes/s={int(nodes / seconds) if seconds else 0} {result}')
+            passed = passed and nodes == expected
+    return passed
+
+
+# 4. Each worker process has its own Thinky, so its transposition table is kept from one
+#    root move to the next. bound is shared by all of them: the best value of any root move
+#    so far (for the side to move).
+search_bound = None
+worker_thinky = None
+
+
+def init_worker(bound, options):
+    global search_bound, worker_thinky
+    search_bound = bound
+    options = dict(options)
+    # 3. join the shared table when there is one
+    table_name = options.pop('table_name', None)
+    table = SharedTranspositionTable(options['table_bits'], table_name) if table_name else None
+    worker_thinky = Thinky('white', table=table, **options)
+
+
+def search_root_move(fen, move, depth):
+    chess = load_fen(fen, BitChess)
+    white = chess.player == 'white'
+    chess.make_move(move, worker_thinky.get_promotion(chess, move), checkmate_check=False)
+    bound = search_bound.value
+    alpha, beta = (bound, math.inf) if white else (-math.inf, bound)
+    nodes = worker_thinky.stats.get_nodes()
+    worker_thinky.search_depth = depth
+    if depth > 0:
+        value = worker_thinky.minimax(chess, depth - 1, alpha, beta)[2]
+    else:
+        value = worker_thinky.quiesce(chess, alpha, beta, 0)
+    is_exact = value > bound if white else value < bound
+    with search_bound.get_lock():
+        if (white and value > search_bound.value) or (not white and value < search_bound.value):
+            search_bound.value = value
+    return move, value, is_exact, worker_thinky.stats.get_nodes() - nodes
+
+
+def parallel_benchmark(depth, workers, options=None, backend=BitChess):
+    # 4. the same search in this process, in the workers and in the workers sharing one table,
+    #    on every reference position
+    options = options or {'search': 'pvs'}
+    times = {'serial': 0, 'parallel': 0, 'shared': 0}
+    nodes = {'serial': 0, 'parallel': 0, 'shared': 0}
+    for name, fen, counts in PERFT_POSITIONS:
+        for kind, thinky in (('serial', Thinky('white', depth=depth, **options)),
+                             ('parallel', Thinky('white', depth=depth, workers=workers, **options)),
+                             ('shared', Thinky('white', depth=depth, workers=workers, shared_table=True, **options))):
+            start = time.time()
+            move = thinky.get_move(load_fen(fen, backend))
+            seconds = time.time() - start
+            times[kind] += seconds
+            nodes[kind] += thinky.stats.get_nodes()
+            print(f'{name} {kind} move={notation(move[0])} nodes={thinky.stats.get_nodes()} '
+                  f'time={seconds:.2f}s')
+    print(f'serial={times["serial"]:.2f}s parallel={times["parallel"]:.2f}s shared={times["shared"]:.2f}s '
+          f'speedup={times["serial"] / times["shared"]:.2f} with {workers} workers on {multiprocessing.cpu_count()} cores')
+    print(f'nodes: serial={nodes["serial"]} parallel={nodes["parallel"]} shared={nodes["shared"]} '
+          f'saved by sharing={100 - 100 * nodes["shared"] / nodes["parallel"]:.1f}%')
+
+
+# positions where one move is clearly the best: the workers must find the same one as the
+# search in this process. Without quiescence a depth of 1 only sees the promotion itself.
+PARALLEL_POSITIONS = (
+    ('promotion', '8/P7/8/8/8/8/k7/7K w - - 0 1', 1),
+)
+
+
+def parallel_check(workers=2, backend=BitChess):
+    passed = True
+    for name, fen, depth in PARALLEL_POSITIONS:
+        serial = Thinky('white', depth=depth, quiescence_depth=0).get_move(load_fen(fen, backend))
+        parallel = Thinky('white', depth=depth, quiescence_depth=0, workers=workers).get_move(load_fen(fen, backend))
+        result = 'ok' if parallel == serial else f'FAILED, the serial search plays {notation(serial[0])} {serial[1]}'
+        print(f'{name} depth={depth} move={notation(parallel[0])} {parallel[1]} {result}')
+        passed = passed and parallel == serial
+    return passed
+
+# 7. two Thinkys play an endgame to the end, with the tablebases their moves are instant
+def endgame(fen, backend=BitChess):
+    tablebase = Tablebase()
+    chess = load_fen(fen, backend)
+    players = {color: Thinky(color, depth=2, tablebase=tablebase) for color in ('white', 'black')}
+    moves = 0
+    while chess.winner is None and moves < 200:
+        print(f'{chess.player}: {tablebase.probe(chess)}')
+        move, promotion = players[chess.player].get_move(chess)
+        print(f'{chess.player} plays {notation(move)}')
+        chess.make_move(move, promotion)
+        moves += 1
+    print(f'{chess.winner} after {moves} moves: {get_fen(chess)}')
+
+
+# 8. Thinky ponders against an opponent that does not: how often it guessed the reply, and
+#    how long its moves took after a hit and after a miss. Both are in this process, so the
+#    pondering thread takes turns with the opponent's search (one Python thread runs at a time).
+#    Between two programs, like two uci.py, it has a core of its own.
+def ponder_match(depth=3, moves=20, backend=BitChess):
+    chess = load_fen(START_FEN, backend)
+    players = {'white': Thinky('white', depth=depth, search='pvs', ponder=True),
+               'black': Thinky('black', depth=depth, search='pvs')}
+    thinky = players['white']
+    times = {'hit': [], 'miss': []}
+    for i in range(2 * moves):
+        if chess.winner is not None:
+            break
+        hits, misses = thinky.ponder_hits, thinky.ponder_misses
+        start = time.time()
+        move, promotion = players[chess.player].get_move(chess)
+        seconds = time.time() - start
+        if thinky.ponder_hits > hits:
+            times['hit'].append(seconds)
+        elif thinky.ponder_misses > misses:
+            times['miss'].append(seconds)
+        chess.make_move(move, promotion)
+    thinky.stop_pondering()
+    print(thinky.ponder_report())
+    for kind, seconds in times.items():
+        if seconds:
+            print(f'{kind}: {len(seconds)} moves, {sum(seconds) / len(seconds):.3f}s per move')
+
+
+# 5. play from the start position as long as the book has a move, and show its choices
+def book_line(path, backend=BitChess):
+    book = OpeningBook(path)
+    chess = load_fen(START_FEN, backend)
+    while chess.winner is None:
+        moves = book.get_moves(chess)
+        if not moves:
+            break
+        print(' '.join(f'{notation(move)}:{weight}' for move, promotion, weight in moves))
+        move, promotion = book.choose(chess)
+        print(f'{chess.player} plays {notation(move)}')
+        chess.make_move(move, promotion)
+    print(f'out of book after {book.hits} moves: {get_fen(chess)}')
+    book.close()
+
+
+# 5. count the nodes Thinky searches on the reference positions with different settings,
+#    compared with the first settings
+SEARCH_SETTINGS = (
+    {},
+    {'search': 'pvs'},
+    {'search': 'pvs', 'null_move_reduction': 2},
+    {'search': 'pvs', 'late_move_after': 3},
+    {'search': 'pvs', 'null_move_reduction': 2, 'late_move_after': 3}
+)
+
+
+def search_benchmark(depth, settings=SEARCH_SETTINGS, backend=BitChess):
+    first = None
+    for options in settings:
+        nodes = 0
+        start = time.time()
+        for name, fen, counts in PERFT_POSITIONS:
+            thinky = Thinky('white', depth=depth, **options)
+            thinky.get_move(load_fen(fen, backend))
+            nodes += thinky.stats.get_nodes()
+        seconds = time.time() - start
+        first = first or nodes
+        print(f'{options} nodes={nodes} saved={first - nodes} ({100 * (first - nodes) / first:.1f}%) '
+              f'time={seconds:.2f}s')
+
+
+# Q-Learning Paper
+# https://link.springer.com/article/10.1007/BF00992698
+#
+class QMatrix:
+    def __init__(self):
+        self.q_entries = {}
+
+    def __repr__(self):
+        return f"""QMatrix({self.q_entries})"""
+
+    def set_entry(self, state, action, value):
+        if state and action:
+            entry = self.q_entries.get(state, None)
+            if entry:
+                entry[action] = value
+            else:
+                self.q_entries[state] = {action: value}
+
+    def get_entry(self, state, action):
+        if state and action:
+            entry = self.q_entries.get(state, None)
+            if entry:
+                return entry.get(action, 0)
+        return 0
+
+
+class Trainer(Player):
+    def __init__(self, color: str, q_matrix: QMatrix, alpha: float, gamma: float, epsilon: float):
+        super().__init__(color)
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.q_matrix = q_matrix
+        self.last_state = None
+        self.last_action = None
+
+    def __repr__(self):
+        return f"""
+Trainer(alpha={self.alpha} gamma={self.gamma} epsilon={self.epsilon}
+{self.q_matrix})
+"""
+
+    def endgame(self, reward):
+        if self.last_state and self.last_action:
+            last_score = self.q_matrix.get_entry(self.last_state, self.last_action)
+            score = (1 - self.alpha) * last_score + self.alpha * reward
+            self.q_matrix.set_entry(self.last_state, self.last_action, score)
+
+    def get_move(self, chess: Chess):
+        # 8. the Zobrist key is the state, much cheaper to build and compare than the 64 squares
+        chess_state = chess.key
+        chess_moves = chess.get_all_moves()
+        if chess_moves is None:
+            for i, state in enumerate(chess.get_state()):
+                role = state[1][:1]
+                if state[0] == 'white':
+                    role = role.upper()
+                print(role, end=' ')
+                if (i+1) % 8 == 0:
+                    print('')
+        # chess_state and all chess_moves are prepared
+        if random.random() <= self.epsilon:
+            move = random.choice(chess_moves)
+        else:
+            entries = [self.q_matrix.get_entry(chess_state, tuple(move)) for move in chess_moves]
+            # use Q-Learning formula to update
+            old_score = self.q_matrix.get_entry(self.last_state, self.last_action)
+            score = (1 - self.alpha) * old_score + self.alpha * self.gamma * max(entries)
+            self.q_matrix.set_entry(self.last_state, self.last_action, score)
+            valid_moves = list(filter(lambda x: self.q_matrix.get_entry(chess_state, x) == entries, chess_moves))
+            if valid_moves:
+                move = random.choice(valid_moves)
+            else:
+                move = random.choice(chess_moves)
+        self.last_state = chess_state
+        self.last_action = tuple(move)
+        return move, 'queen'
+
+
+class TrainingApp:
+    def __init__(self, trainer, backend=Chess):
+        self.chess = backend(create_pieces())
+        self.players = [Greedy('white'), trainer]
+
+    def run(self):
+        # 7. kings are never captured any more, so stop a game that goes on too long as a draw
+        moves = 0
+        while self.chess.winner is None:
+            moves += 1
+            if moves > 300:
+                self.chess.winner = 'draw'
+                break
+            current_player = next(filter(lambda x: x.color == self.chess.player, self.players))
+            move, promotion = current_player.get_move(self.chess)
+            piece = self.chess.get_piece(move[0])
+            self.chess.apply_move(move[0], move[1])
+            check_str = 'Checkmate!' if self.chess.checkmate else 'Check!' if self.chess.check else ''
+            print(f'{piece.color} {piece.get_role()}: {notation(move)} {check_str}')
+        trainers = list(filter(lambda x: isinstance(x, Trainer), self.players))
+        print(f"The winner is {self.chess.winner}")
+        for trainer in trainers:
+            reward = 1 if trainer.color == self.chess.winner else 0 if self.chess.winner == 'draw' else -1
+            trainer.endgame(reward)
+        return list(filter(lambda x: isinstance(x, Trainer), self.players))
@@ -0,0 +1,1582 @@
+import random
+import pygame as pg
+import math
+import sys
+import time
+
+# Lesson 1: read the files
+# Lesson 2: draw the board and scale the piece
+# Lesson 3: reformat the classes for pieces
+# Lesson 4: legal moves (1/3) rook, bishop, queen
+# Lesson 5: legal moves (2/3) king, knight
+# Lesson 6: legal moves (3/3) pawn
+# Lesson 7: Mouse control states
+# Lesson 8: End Game
+# Lesson 9: Polymorphism
+# Lesson 10: En Passant
+# Lesson 11: Check, Moved, Castling
+# Lesson 12: Promotion
+# Lesson 13: Introduce Player and Monkey
+# Lesson 14: Static Evaluation and clone
+# Lesson 15: Think in More Steps (MiniMax)
+# Lesson 16: Undo
+# Lesson 17: Alpha/Beta Pruning (and fix infinity loop in castling)
+# Lesson 18: Checkmate!, no move and add Notation
+# Lesson 19: Refactor draw and image and fix danger_zone
+# Lesson 20: Q-Learning: Setup Q-Matrix and train one game
+# Lesson 21: Multiple games training
+# Lesson 22: Board array (mailbox) for fast square lookups
+# Lesson 23: Bitboards, a much faster Chess
+# Lesson 24: Ray tables instead of recursion
+# Lesson 25: Attack maps kept up to date move by move
+# Lesson 26: Make and unmake moves instead of cloning
+# Lesson 27: Only legal moves: pins, checks and stalemate
+# Lesson 28: Perft, counting moves to test the move generator
+
+
+GRID = 80
+WIDTH, HEIGHT = 8 * GRID, 8 * GRID
+RESOLUTION = WIDTH, HEIGHT
+
+
+class PiecesImage:
+    def __init__(self, image_filename, screen):
+        self.piece_infos = (
+            ('black', 'king'), ('black', 'queen'), ('black', 'bishop'), ('black', 'knight'),
+            ('white', 'king'), ('white', 'queen'), ('black', 'rook'), ('black', 'pawn'),
+            ('white', 'bishop'), ('white', 'knight'), ('white', 'rook'), ('white', 'pawn'))
+        self.pieces_image = pg.image.load(image_filename).convert(screen)
+        self.w, self.h = self.pieces_image.get_size()
+        self.w //= 4
+        self.h //= 3
+
+    def get_image(self, color, role):
+        idx = self.piece_infos.index((color, role))
+        x = self.w * (idx % 4)
+        y = self.h * (idx // 4)
+        return self.pieces_image.subsurface((x, y), (self.w, self.h))
+
+
+def apply_dx_dy(grid_pos, dxdy):
+    return grid_pos[0] + dxdy[1], grid_pos[1] + dxdy[0]
+
+
+# 1. each square has a number from 0 to 63: row * 8 + column
+def grid_to_index(grid_pos):
+    return grid_pos[0] * 8 + grid_pos[1]
+
+
+ORTHOGONAL = ((0, -1), (0, 1), (1, 0), (-1, 0))
+DIAGONAL = ((-1, -1), (1, 1), (1, -1), (-1, 1))
+
+
+# 1. walk every ray once when the program starts.
+#    RAY_SQUARES[dxdy][index] holds (index, grid_pos) of each square in that direction, nearest first
+def make_ray_squares(dxdy):
+    table = []
+    for index in range(64):
+        squares = []
+        gp = apply_dx_dy((index // 8, index % 8), dxdy)
+        while 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+            squares.append((grid_to_index(gp), gp))
+            gp = apply_dx_dy(gp, dxdy)
+        table.append(tuple(squares))
+    return table
+
+
+RAY_SQUARES = {dxdy: make_ray_squares(dxdy) for dxdy in ORTHOGONAL + DIAGONAL}
+
+
+# 1. Identify and remove the draw function
+class Piece:
+    # 2. remove image
+    def __init__(self, color, grid_pos):
+        self.color = color
+        self.grid_pos = grid_pos
+        self.moved = False
+        # 1. the squares (0 to 63) this piece attacks, kept up to date by Chess
+        self.attacks = []
+
+    def clone_params(self, piece):
+        piece.moved = self.moved
+        piece.attacks = self.attacks
+
+    def value(self):
+        return 0
+
+    # 6. get_role()
+    def get_role(self):
+        return 'unknown'
+
+    # 2. one loop over the ray tables replaces the recursive trace_legal_moves
+    #    and the list concatenation in trace_orthogonal and trace_diagonal
+    def trace_rays(self, chess, directions, cont, danger_zone):
+        legal_moves = []
+        board = chess.board
+        index = grid_to_index(self.grid_pos)
+        for dxdy in directions:
+            for square, gp in RAY_SQUARES[dxdy][index]:
+                piece = board[square]
+                if piece is None:
+                    legal_moves.append(gp)
+                    if not cont:
+                        break
+                else:
+                    # a friend is only included for the danger_zone
+                    if piece.color != self.color or danger_zone:
+                        legal_moves.append(gp)
+                    break
+        return legal_moves
+
+    def get_legal_moves(self, chess, ignore_castile=False):
+        print("not implemented")
+        return []
+
+
+class Rook(Piece):
+    def clone(self):
+        new = Rook(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 10
+
+    def get_role(self):
+        return 'rook'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        return self.trace_rays(chess, ORTHOGONAL, True, ignore_castle)
+
+
+class Knight(Piece):
+    def clone(self):
+        new = Knight(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 2
+
+    def get_role(self):
+        return 'knight'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        moves = (
+            (-1, -2), (1, -2),
+            (-1, 2), (1, 2),
+            (2, -1), (2, 1),
+            (-2, -1), (-2, 1)
+        )
+        legal_moves = []
+        for move in moves:
+            gp = apply_dx_dy(self.grid_pos, move)
+            side = chess.report(gp, self.color)
+            if side == 'opponent' or side == 'none' or ignore_castle:
+                legal_moves.append(gp)
+        return legal_moves
+
+
+class Bishop(Piece):
+    def clone(self):
+        new = Bishop(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 5
+
+    def get_role(self):
+        return 'bishop'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        return self.trace_rays(chess, DIAGONAL, True, ignore_castle)
+
+
+class Queen(Piece):
+    def clone(self):
+        new = Queen(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 100
+
+    def get_role(self):
+        return 'queen'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        return self.trace_rays(chess, ORTHOGONAL + DIAGONAL, True, ignore_castle)
+
+
+class King(Piece):
+    def clone(self):
+        new = King(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 10000
+
+    def get_role(self):
+        return 'king'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        legal_moves = self.trace_rays(chess, ORTHOGONAL + DIAGONAL, False, ignore_castle)
+        # 1. the king may not castle out of check, through check or into check
+        if not self.moved and not ignore_castle and not chess.in_danger(self.grid_pos, self.color):
+            for rook in filter(lambda x: isinstance(x, Rook) and x.color == self.color, chess.pieces):
+                if not rook.moved and rook.grid_pos[0] == self.grid_pos[0]:
+                    xs = range(rook.grid_pos[1] + 1, self.grid_pos[1]) \
+                        if rook.grid_pos[1] < self.grid_pos[1] else range(self.grid_pos[1] + 1, rook.grid_pos[1])
+                    gps = map(lambda x: chess.report((self.grid_pos[0], x), self.color) == 'none', xs)
+                    if all(gps):
+                        step = -1 if rook.grid_pos[1] < self.grid_pos[1] else 1
+                        ys = (self.grid_pos[1] + step, self.grid_pos[1] + 2 * step)
+                        gs = map(lambda x: chess.in_danger((self.grid_pos[0], x), self.color), ys)
+                        if not any(gs):
+                            legal_moves.append((self.grid_pos[0], self.grid_pos[1] + 2 * step))
+        # 10. remove all moves from within danger_zone
+        if not ignore_castle:
+            legal_moves = list(filter(lambda move: not chess.in_danger(move, self.color), legal_moves))
+        return legal_moves
+
+
+class Pawn(Piece):
+    def clone(self):
+        new = Pawn(self.color, self.grid_pos)
+        super().clone_params(new)
+        return new
+
+    def value(self):
+        return 1
+
+    def get_role(self):
+        return 'pawn'
+
+    def get_legal_moves(self, chess, ignore_castle=False):
+        legal_moves = []
+        dy = -1 if self.color == 'white' else 1
+        # en passant capture?
+        if chess.en_passant:
+            if chess.en_passant[0] == self.grid_pos[0] and abs(chess.en_passant[1] - self.grid_pos[1]) == 1:
+                legal_moves.append((self.grid_pos[0] + dy, chess.en_passant[1]))
+        # capture?
+        for dx in [-1, 1]:
+            gp = apply_dx_dy(self.grid_pos, (dx, dy))
+            side = chess.report(gp, self.color)
+            if side == 'opponent' or ignore_castle: # 11. fix pawn movement for danger_zone
+                legal_moves.append(gp)
+        # march 1?
+        if not ignore_castle: # 11. fix pawn movement for danger_zone
+            gp = apply_dx_dy(self.grid_pos, (0, dy))
+            side = chess.report(gp, self.color)
+            if side == 'none':
+                legal_moves.append(gp)
+                # march 2?
+                if (self.color == 'black' and self.grid_pos[0] == 1) or \
+                        (self.color == 'white' and self.grid_pos[0] == 6):
+                    dy = -2 if self.color == 'white' else 2
+                    gp = apply_dx_dy(self.grid_pos, (0, dy))
+                    side = chess.report(gp, self.color)
+                    if side == 'none':
+                        legal_moves.append(gp)
+        return legal_moves
+
+
+# 3. remove piece_images and piece_images.get_image(color, role)
+def create_pieces():
+    return [
+        Rook('black', (0, 0)),
+        Knight('black', (0, 1)),
+        Bishop('black', (0, 2)),
+        Queen('black', (0, 3)),
+        King('black', (0, 4)),
+        Bishop('black', (0, 5)),
+        Knight('black', (0, 6)),
+        Rook('black', (0, 7)),
+        *[Pawn('black', (1, n)) for n in range(8)],
+
+        *[Pawn('white', (6, n)) for n in range(8)],
+        Rook('white', (7, 0)),
+        Knight('white', (7, 1)),
+        Bishop('white', (7, 2)),
+        Queen('white', (7, 3)),
+        King('white', (7, 4)),
+        Bishop('white', (7, 5)),
+        Knight('white', (7, 6)),
+        Rook('white', (7, 7))
+    ]
+
+
+def get_grid(pos):
+    return pos[1] // GRID, pos[0] // GRID
+
+
+def grid_to_rect(grid_pos):
+    coord = grid_pos[1] * GRID, grid_pos[0] * GRID
+    return pg.Rect(coord, (GRID, GRID))
+
+
+# 1. everything make_move changes, so that unmake_move can put it back
+class Undo:
+    def __init__(self, chess, piece, move):
+        self.move = move
+        self.piece = piece
+        self.moved = piece.moved
+        self.changed_squares = [grid_to_index(move[0]), grid_to_index(move[1])]
+        self.captured = None
+        self.captured_index = None
+        self.rook = None
+        self.rook_source = None
+        self.rook_moved = False
+        self.promoted = None
+        self.piece_index = None
+        self.player = chess.player
+        self.winner = chess.winner
+        self.en_passant = chess.en_passant
+        self.check = chess.check
+        self.checkmate = chess.checkmate
+        self.stalemate = chess.stalemate
+
+
+class Chess:
+    def __init__(self, pieces, attack_map=None):
+        self.pieces = pieces
+        # 2. the board remembers which piece stands on each of the 64 squares
+        self.board = [None] * 64
+        for piece in self.pieces:
+            self.board[grid_to_index(piece.grid_pos)] = piece
+        self.deadpile = []
+        self.player = 'white'
+        self.winner = None
+        self.en_passant = None
+        self.check = False
+        self.checkmate = False
+        self.stalemate = False
+        # 2. attack_map[color][square] counts the pieces of color attacking the square
+        if attack_map:
+            self.attack_map = {color: list(attack_map[color]) for color in attack_map}
+        else:
+            self.attack_map = {'white': [0] * 64, 'black': [0] * 64}
+            for piece in self.pieces:
+                self.add_attacks(piece)
+
+    def clone(self):
+        new_pieces = [piece.clone() for piece in self.pieces]
+        # 3. the cloned pieces keep their attacks, so copy the map instead of rebuilding it
+        new_chess = Chess(new_pieces, self.attack_map)
+        new_chess.player = self.player
+        new_chess.winner = self.winner
+        new_chess.en_passant = self.en_passant
+        new_chess.check = self.check
+        new_chess.checkmate = self.checkmate
+        new_chess.stalemate = self.stalemate
+        return new_chess
+
+    def compute_legal_moves(self, piece):
+        return piece.get_legal_moves(self)
+
+    # 3. keep self.pieces and self.board in sync
+    def add_piece(self, piece):
+        self.pieces.append(piece)
+        self.board[grid_to_index(piece.grid_pos)] = piece
+        self.add_attacks(piece)
+
+    def remove_piece(self, piece):
+        self.pieces.remove(piece)
+        self.board[grid_to_index(piece.grid_pos)] = None
+        self.remove_attacks(piece)
+
+    # 4. a piece's attacks are its danger_zone moves that stay on the board
+    def add_attacks(self, piece):
+        attacks = set()
+        for gp in piece.get_legal_moves(self, ignore_castle=True):
+            if 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+                attacks.add(grid_to_index(gp))
+        piece.attacks = list(attacks)
+        for square in piece.attacks:
+            self.attack_map[piece.color][square] += 1
+
+    def remove_attacks(self, piece):
+        for square in piece.attacks:
+            self.attack_map[piece.color][square] -= 1
+        piece.attacks = []
+
+    # 5. after a move, only the moved pieces and the rooks, bishops and queens whose
+    #    rays reached one of the changed squares attack something different
+    def update_attacks(self, squares, moved_pieces):
+        for piece in self.pieces:
+            if piece in moved_pieces or \
+                    (isinstance(piece, (Rook, Bishop, Queen)) and any(square in piece.attacks for square in squares)):
+                self.remove_attacks(piece)
+                self.add_attacks(piece)
+
+    def in_danger(self, grid_pos, color):
+        # is grid_pos attacked by the opponent of color?
+        oppo_color = 'black' if color == 'white' else 'white'
+        return self.attack_map[oppo_color][grid_to_index(grid_pos)] > 0
+
+    def move_piece(self, piece, destination):
+        self.board[grid_to_index(piece.grid_pos)] = None
+        piece.grid_pos = destination
+        self.board[grid_to_index(destination)] = piece
+
+    # 4. look up the board instead of searching every piece
+    def report(self, grid_pos, color):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            piece = self.board[grid_to_index(grid_pos)]
+            if piece is None:
+                return 'none'
+            return 'friend' if piece.color == color else 'opponent'
+        else:
+            return 'OOB'
+
+    def get_piece(self, grid_pos):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            return self.board[grid_to_index(grid_pos)]
+        return None
+
+    def get_legal_moves(self, grid_pos):
+        piece = self.get_piece(grid_pos)
+        if piece and piece.color == self.player:
+            return [move[1] for move in self.get_all_moves() if move[0] == grid_pos]
+        return []
+
+    def get_danger_zone(self, color):
+        oppo_color = 'black' if color == 'white' else 'white'
+        return {(square // 8, square % 8) for square in range(64) if self.attack_map[oppo_color][square] > 0}
+
+    def get_line(self, grid_pos, target):
+        # the squares from grid_pos (not included) to target (included) when they are on one line
+        index = grid_to_index(grid_pos)
+        for dxdy in ORTHOGONAL + DIAGONAL:
+            line = []
+            for square, gp in RAY_SQUARES[dxdy][index]:
+                line.append(gp)
+                if gp == target:
+                    return line
+                if self.board[square]:
+                    break
+        return [target]
+
+    # 2. a friend is pinned when it is the only piece between our king and an opponent
+    #    rook, bishop or queen on that line. It may only move along the line.
+    def get_pins(self, king):
+        pins = {}
+        index = grid_to_index(king.grid_pos)
+        for dxdy in ORTHOGONAL + DIAGONAL:
+            sliders = (Rook, Queen) if dxdy in ORTHOGONAL else (Bishop, Queen)
+            friend = None
+            line = []
+            for square, gp in RAY_SQUARES[dxdy][index]:
+                line.append(gp)
+                piece = self.board[square]
+                if piece is None:
+                    continue
+                if piece.color == king.color and friend is None:
+                    friend = piece
+                    continue
+                if friend and piece.color != king.color and isinstance(piece, sliders):
+                    pins[friend] = line
+                break
+        return pins
+
+    def is_safe(self, move, king):
+        # try the move and see if our king is attacked afterwards
+        undo = self.make_move(move, checkmate_check=False)
+        safe = not self.in_danger(king.grid_pos, king.color)
+        self.unmake_move(undo)
+        return safe
+
+    # 3. only legal moves: find the checkers and pins once, then keep the moves that
+    #    leave our king safe
+    def get_all_moves(self):
+        pieces = list(filter(lambda x: x.color == self.player, self.pieces))
+        king = next(filter(lambda x: isinstance(x, King), pieces))
+        king_index = grid_to_index(king.grid_pos)
+        checkers = list(filter(lambda x: x.color != self.player and king_index in x.attacks, self.pieces))
+        # with one checker, the others must capture it or block its line
+        blocks = self.get_line(king.grid_pos, checkers[0].grid_pos) if len(checkers) == 1 else None
+        # the king may not step back along the line of a checking rook, bishop or queen,
+        # that square is only safe because the king itself stands in the way
+        behind = []
+        for checker in checkers:
+            if isinstance(checker, (Rook, Bishop, Queen)):
+                dy = (king.grid_pos[0] > checker.grid_pos[0]) - (king.grid_pos[0] < checker.grid_pos[0])
+                dx = (king.grid_pos[1] > checker.grid_pos[1]) - (king.grid_pos[1] < checker.grid_pos[1])
+                behind.append(apply_dx_dy(king.grid_pos, (dx, dy)))
+        pins = self.get_pins(king)
+        moves = []
+        for piece in pieces:
+            if piece is not king and len(checkers) > 1:
+                continue
+            destinations = piece.get_legal_moves(self)
+            for destination in destinations:
+                move = piece.grid_pos, destination
+                if piece is king:
+                    if destination in behind:
+                        continue
+                elif isinstance(piece, Pawn) and destination[1] != piece.grid_pos[1] and \
+                        self.board[grid_to_index(destination)] is None:
+                    # en passant removes two pawns from one row, so simply try it
+                    if not self.is_safe(move, king):
+                        continue
+                else:
+                    if blocks and destination not in blocks:
+                        continue
+                    if piece in pins and destination not in pins[piece]:
+                        continue
+                moves.append(move)
+        return moves
+
+    def apply_move(self, source, destination, promotion=None, checkmate_check=True):
+        # check the state
+        # 5. find the moving piece on the board
+        piece = self.get_piece(source)
+        if piece and piece.color == self.player:
+            if destination in self.get_legal_moves(source):
+                self.make_move((source, destination), promotion, checkmate_check)
+
+    # 2. make_move does the work of apply_move without checking the move again,
+    #    and returns an Undo so that unmake_move can take it back
+    def make_move(self, move, promotion=None, checkmate_check=True):
+        source, destination = move
+        piece = self.get_piece(source)
+        undo = Undo(self, piece, move)
+        # capture opponent piece
+        # 1. fix: capture the piece on destination, or the pawn passed by en passant,
+        #    never another piece next to it
+        oppo_piece = self.get_piece(destination)
+        if oppo_piece is None and isinstance(piece, Pawn) and destination[1] != source[1]:
+            oppo_piece = self.get_piece((source[0], destination[1]))
+        if oppo_piece and oppo_piece.color != self.player:
+            undo.changed_squares.append(grid_to_index(oppo_piece.grid_pos))
+            undo.captured = oppo_piece
+            undo.captured_index = self.pieces.index(oppo_piece)
+            self.remove_piece(oppo_piece)
+            self.deadpile.append(oppo_piece)
+            if isinstance(oppo_piece, King):
+                self.winner = 'black' if oppo_piece.color == 'white' else 'white'
+        # move
+        self.en_passant = None  # Muse be placed AFTER capture
+        # castling?
+        if isinstance(piece, King) and abs(piece.grid_pos[1] - destination[1]) > 1:
+            if destination[1] > piece.grid_pos[1]:
+                gp = piece.grid_pos[0], 7
+                gpd = piece.grid_pos[0], destination[1] - 1
+            else:
+                gp = piece.grid_pos[0], 0
+                gpd = piece.grid_pos[0], destination[1] + 1
+            rook = self.get_piece(gp)
+            undo.changed_squares += [grid_to_index(gp), grid_to_index(gpd)]
+            undo.rook = rook
+            undo.rook_source = gp
+            undo.rook_moved = rook.moved
+            self.move_piece(rook, gpd)
+            rook.moved = True
+        self.move_piece(piece, destination)
+        # 4. Fix promotion
+        if promotion and isinstance(piece, Pawn) and (destination[0] == 0 or destination[0] == 7):
+            role = promotion
+            if role == 'queen':
+                new_piece = Queen(piece.color, destination)
+            elif role == 'bishop':
+                new_piece = Bishop(piece.color, destination)
+            elif role == 'knight':
+                new_piece = Knight(piece.color, destination)
+            else:
+                new_piece = Rook(piece.color, destination)
+            undo.piece_index = self.pieces.index(piece)
+            undo.promoted = new_piece
+            self.remove_piece(piece)
+            self.deadpile.append(piece)
+            self.add_piece(new_piece)
+            piece = new_piece
+        self.update_attacks(undo.changed_squares, [piece, undo.rook])
+        piece.moved = True
+        if isinstance(piece, Pawn) and 2 == abs(source[0] - destination[0]):
+            self.en_passant = destination
+        # check?
+        self.check = False
+        if self.winner is None:
+            oppo_king = next(filter(lambda x: isinstance(x, King) and x.color != self.player, self.pieces))
+            # 1. detect Checkmate! only inside check
+            self.check = self.in_danger(oppo_king.grid_pos, oppo_king.color)
+        self.player = 'white' if self.player == 'black' else 'black'
+        # 4. no legal moves after switching player: checkmate in check, otherwise stalemate
+        if checkmate_check and self.winner is None and not self.get_all_moves():
+            if self.check:
+                self.winner = 'black' if self.player == 'white' else 'white'
+                self.checkmate = True
+            else:
+                self.winner = 'draw'
+                self.stalemate = True
+        return undo
+
+    # 4. put everything back the way it was before make_move
+    def unmake_move(self, undo):
+        piece = undo.piece
+        source, destination = undo.move
+        self.player = undo.player
+        self.winner = undo.winner
+        self.en_passant = undo.en_passant
+        self.check = undo.check
+        self.checkmate = undo.checkmate
+        self.stalemate = undo.stalemate
+        if undo.promoted:
+            self.remove_piece(undo.promoted)
+            self.deadpile.pop()
+            self.pieces.insert(undo.piece_index, piece)
+            self.board[grid_to_index(destination)] = piece
+        self.move_piece(piece, source)
+        piece.moved = undo.moved
+        if undo.rook:
+            self.move_piece(undo.rook, undo.rook_source)
+            undo.rook.moved = undo.rook_moved
+        if undo.captured:
+            self.deadpile.pop()
+            self.pieces.insert(undo.captured_index, undo.captured)
+            self.board[grid_to_index(undo.captured.grid_pos)] = undo.captured
+        # the attacks only depend on the board, so update them the same way as make_move did
+        self.update_attacks(undo.changed_squares, [piece, undo.rook, undo.captured])
+
+    def evaluate(self):
+        sum = 0
+        for piece in self.pieces:
+            sign = 1 if piece.color == 'white' else -1
+            sum += piece.value() * sign
+        return sum
+
+    # 2. the board as 64 (color, role) pairs, used as the Q-Learning state
+    def get_state(self):
+        chess_state = [('empty', '')] * 64
+        for piece in self.pieces:
+            chess_state[grid_to_index(piece.grid_pos)] = piece.color, piece.get_role()
+        return tuple(chess_state)
+
+
+# 3. Bitboards: one 64-bit number per color and role.
+#    Bit number row * 8 + column is 1 when that kind of piece stands on the square.
+ROLES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+ROLE_CLASSES = {'pawn': Pawn, 'knight': Knight, 'bishop': Bishop, 'rook': Rook, 'queen': Queen, 'king': King}
+ROLE_VALUES = {role: ROLE_CLASSES[role]('white', (0, 0)).value() for role in ROLES}
+INDEX_TO_GRID = [(index // 8, index % 8) for index in range(64)]
+
+
+def other_color(color):
+    return 'black' if color == 'white' else 'white'
+
+
+def get_bits(bits):
+    # the square numbers of all the 1 bits, lowest first
+    indexes = []
+    while bits:
+        low = bits & -bits
+        indexes.append(low.bit_length() - 1)
+        bits ^= low
+    return indexes
+
+
+# 4. precompute where a knight, king or pawn attacks from every square
+def make_step_table(steps):
+    table = []
+    for index in range(64):
+        bits = 0
+        for step in steps:
+            gp = apply_dx_dy(INDEX_TO_GRID[index], step)
+            if 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+                bits |= 1 << grid_to_index(gp)
+        table.append(bits)
+    return table
+
+
+KNIGHT_ATTACKS = make_step_table(((-1, -2), (1, -2), (-1, 2), (1, 2), (2, -1), (2, 1), (-2, -1), (-2, 1)))
+KING_ATTACKS = make_step_table(((0, -1), (0, 1), (1, 0), (-1, 0), (-1, -1), (1, 1), (1, -1), (-1, 1)))
+PAWN_ATTACKS = {
+    'white': make_step_table(((-1, -1), (1, -1))),
+    'black': make_step_table(((-1, 1), (1, 1)))
+}
+
+# 5. precompute the rays: every square a rook or bishop could reach on an empty board
+def make_ray_table(dxdy):
+    table = []
+    for index in range(64):
+        bits = 0
+        gp = apply_dx_dy(INDEX_TO_GRID[index], dxdy)
+        while 0 <= gp[0] < 8 and 0 <= gp[1] < 8:
+            bits |= 1 << grid_to_index(gp)
+            gp = apply_dx_dy(gp, dxdy)
+        table.append(bits)
+    return table
+
+
+RAYS = {dxdy: make_ray_table(dxdy) for dxdy in ORTHOGONAL + DIAGONAL}
+
+
+def slide(index, occupancy, directions):
+    # 6. cut each ray after the first piece in its way (the blocker itself is included)
+    attacks = 0
+    for dxdy in directions:
+        ray = RAYS[dxdy][index]
+        blockers = ray & occupancy
+        if blockers:
+            if dxdy[1] * 8 + dxdy[0] > 0:
+                first = (blockers & -blockers).bit_length() - 1  # lowest bit is the nearest
+            else:
+                first = blockers.bit_length() - 1  # highest bit is the nearest
+            ray ^= RAYS[dxdy][first]
+        attacks |= ray
+    return attacks
+
+
+# 7. a slider only cares about the pieces on its own lines (rank, file and two diagonals).
+#    For every square and line, remember the answer of slide() for every way those squares
+#    can be filled, then look it up instead of walking the rays.
+def make_line_table(index, dxdy):
+    back = (-dxdy[0], -dxdy[1])
+    mask = 0
+    for direction in (dxdy, back):
+        ray = RAYS[direction][index]
+        if ray:
+            last = ray.bit_length() - 1 if direction[1] * 8 + direction[0] > 0 else (ray & -ray).bit_length() - 1
+            mask |= ray ^ (1 << last)  # the last square of a ray never blocks anything
+    table = {}
+    subset = 0
+    while True:
+        table[subset] = slide(index, subset, (dxdy, back))
+        subset = (subset - mask) & mask
+        if subset == 0:
+            break
+    return mask, table
+
+
+ORTHOGONAL_LINES = [(make_line_table(index, (1, 0)), make_line_table(index, (0, 1))) for index in range(64)]
+DIAGONAL_LINES = [(make_line_table(index, (1, 1)), make_line_table(index, (1, -1))) for index in range(64)]
+
+
+def rook_attacks(index, occupancy):
+    (mask1, table1), (mask2, table2) = ORTHOGONAL_LINES[index]
+    return table1[occupancy & mask1] | table2[occupancy & mask2]
+
+
+def bishop_attacks(index, occupancy):
+    (mask1, table1), (mask2, table2) = DIAGONAL_LINES[index]
+    return table1[occupancy & mask1] | table2[occupancy & mask2]
+
+
+# 5. BETWEEN[a][b] has the squares strictly between a and b when they share a line
+def make_between_table():
+    table = [[0] * 64 for index in range(64)]
+    for index in range(64):
+        for dxdy in ORTHOGONAL + DIAGONAL:
+            for square in get_bits(RAYS[dxdy][index]):
+                table[index][square] = RAYS[dxdy][index] & ~RAYS[dxdy][square] & ~(1 << square)
+    return table
+
+
+BETWEEN = make_between_table()
+
+
+class BitChess:
+    # 8. same methods and attributes as Chess, so every bot can use either one
+    def __init__(self, pieces):
+        self.boards = {color: {role: 0 for role in ROLES} for color in ('white', 'black')}
+        self.occupancy = {'white': 0, 'black': 0}
+        self.unmoved = 0  # squares of the pieces that never moved, used for castling
+        for piece in pieces:
+            self.put(piece.color, piece.get_role(), grid_to_index(piece.grid_pos))
+            if not piece.moved:
+                self.unmoved |= 1 << grid_to_index(piece.grid_pos)
+        self.player = 'white'
+        self.winner = None
+        self.en_passant = None
+        self.check = False
+        self.checkmate = False
+        self.stalemate = False
+
+    def clone(self):
+        new_chess = BitChess([])
+        new_chess.boards = {color: dict(self.boards[color]) for color in self.boards}
+        new_chess.occupancy = dict(self.occupancy)
+        new_chess.unmoved = self.unmoved
+        new_chess.player = self.player
+        new_chess.winner = self.winner
+        new_chess.en_passant = self.en_passant
+        new_chess.check = self.check
+        new_chess.checkmate = self.checkmate
+        new_chess.stalemate = self.stalemate
+        return new_chess
+
+    def put(self, color, role, index):
+        self.boards[color][role] |= 1 << index
+        self.occupancy[color] |= 1 << index
+
+    def take(self, color, role, index):
+        self.boards[color][role] &= ~(1 << index)
+        self.occupancy[color] &= ~(1 << index)
+
+    def find(self, index):
+        bit = 1 << index
+        for color in ('white', 'black'):
+            if self.occupancy[color] & bit:
+                for role in ROLES:
+                    if self.boards[color][role] & bit:
+                        return color, role
+        return None, None
+
+    @property
+    def pieces(self):
+        # only for drawing: build Piece objects from the bits
+        pieces = []
+        for color in ('white', 'black'):
+            for role in ROLES:
+                for index in get_bits(self.boards[color][role]):
+                    pieces.append(self.get_piece(INDEX_TO_GRID[index]))
+        return pieces
+
+    def report(self, grid_pos, color):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            bit = 1 << grid_to_index(grid_pos)
+            if self.occupancy[color] & bit:
+                return 'friend'
+            if self.occupancy[other_color(color)] & bit:
+                return 'opponent'
+            return 'none'
+        else:
+            return 'OOB'
+
+    def get_piece(self, grid_pos):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            index = grid_to_index(grid_pos)
+            color, role = self.find(index)
+            if color:
+                piece = ROLE_CLASSES[role](color, grid_pos)
+                piece.moved = not (self.unmoved & (1 << index))
+                return piece
+        return None
+
+    def get_state(self):
+        chess_state = [('empty', '')] * 64
+        for color in ('white', 'black'):
+            for role in ROLES:
+                for index in get_bits(self.boards[color][role]):
+                    chess_state[index] = color, role
+        return tuple(chess_state)
+
+    def get_attacks(self, color):
+        # 9. every square attacked by color, including squares of its own pieces
+        boards = self.boards[color]
+        occupancy = self.occupancy['white'] | self.occupancy['black']
+        attacks = 0
+        for index in get_bits(boards['pawn']):
+            attacks |= PAWN_ATTACKS[color][index]
+        for index in get_bits(boards['knight']):
+            attacks |= KNIGHT_ATTACKS[index]
+        for index in get_bits(boards['king']):
+            attacks |= KING_ATTACKS[index]
+        for index in get_bits(boards['bishop'] | boards['queen']):
+            attacks |= bishop_attacks(index, occupancy)
+        for index in get_bits(boards['rook'] | boards['queen']):
+            attacks |= rook_attacks(index, occupancy)
+        return attacks
+
+    def attacked(self, index, color):
+        # 10. is one square attacked by color? Look outwards from the square instead of
+        #    building the whole attack map
+        boards = self.boards[color]
+        occupancy = self.occupancy['white'] | self.occupancy['black']
+        return bool(PAWN_ATTACKS[other_color(color)][index] & boards['pawn'] or
+                    KNIGHT_ATTACKS[index] & boards['knight'] or
+                    KING_ATTACKS[index] & boards['king'] or
+                    bishop_attacks(index, occupancy) & (boards['bishop'] | boards['queen']) or
+                    rook_attacks(index, occupancy) & (boards['rook'] | boards['queen']))
+
+    def get_attackers(self, index, color, occupancy):
+        # 6. the pieces of color attacking one square, as bits
+        boards = self.boards[color]
+        return (PAWN_ATTACKS[other_color(color)][index] & boards['pawn'] |
+                KNIGHT_ATTACKS[index] & boards['knight'] |
+                KING_ATTACKS[index] & boards['king'] |
+                bishop_attacks(index, occupancy) & (boards['bishop'] | boards['queen']) |
+                rook_attacks(index, occupancy) & (boards['rook'] | boards['queen']))
+
+    def get_danger_zone(self, color):
+        return {INDEX_TO_GRID[index] for index in get_bits(self.get_attacks(other_color(color)))}
+
+    def get_targets(self, index, color, role):
+        # 11. the destinations of one piece as bits, following the same rules as Piece.get_legal_moves
+        own = self.occupancy[color]
+        opponent = self.occupancy[other_color(color)]
+        if role == 'knight':
+            return KNIGHT_ATTACKS[index] & ~own
+        if role == 'bishop':
+            return bishop_attacks(index, own | opponent) & ~own
+        if role == 'rook':
+            return rook_attacks(index, own | opponent) & ~own
+        if role == 'queen':
+            return (bishop_attacks(index, own | opponent) | rook_attacks(index, own | opponent)) & ~own
+        row, column = INDEX_TO_GRID[index]
+        if role == 'pawn':
+            targets = PAWN_ATTACKS[color][index] & opponent
+            dy = -1 if color == 'white' else 1
+            if self.en_passant:
+                if self.en_passant[0] == row and abs(self.en_passant[1] - column) == 1:
+                    targets |= 1 << grid_to_index((row + dy, self.en_passant[1]))
+            empty = ~(own | opponent)
+            if 0 <= row + dy < 8 and empty & (1 << (index + dy * 8)):
+                targets |= 1 << (index + dy * 8)
+                if (color == 'black' and row == 1) or (color == 'white' and row == 6):
+                    if empty & (1 << (index + dy * 16)):
+                        targets |= 1 << (index + dy * 16)
+            return targets
+        # king
+        oppo_color = other_color(color)
+        targets = KING_ATTACKS[index] & ~own
+        # 7. castle like the King class: not out of, through or into check
+        if self.unmoved & (1 << index) and not self.attacked(index, oppo_color):
+            for rook_index in get_bits(self.boards[color]['rook'] & self.unmoved):
+                rook_row, rook_column = INDEX_TO_GRID[rook_index]
+                if rook_row != row:
+                    continue
+                if rook_column < column:
+                    xs = range(rook_column + 1, column)
+                else:
+                    xs = range(column + 1, rook_column)
+                if all(self.report((row, x), color) == 'none' for x in xs):
+                    step = -1 if rook_column < column else 1
+                    if not self.attacked(index + step, oppo_color) and not self.attacked(index + 2 * step, oppo_color):
+                        targets |= 1 << (index + 2 * step)
+        # 8. look for attackers as if the king was already gone from its square,
+        #    so it cannot step back along the line of a checking rook, bishop or queen
+        occupancy = (own | opponent) & ~(1 << index)
+        for target in get_bits(targets):
+            if self.get_attackers(target, oppo_color, occupancy):
+                targets ^= 1 << target
+        return targets
+
+    def get_legal_moves(self, grid_pos):
+        if 0 <= grid_pos[0] < 8 and 0 <= grid_pos[1] < 8:
+            index = grid_to_index(grid_pos)
+            color, role = self.find(index)
+            if color == self.player:
+                return [move[1] for move in self.get_all_moves() if move[0] == grid_pos]
+        return []
+
+    def get_all_moves(self):
+        color = self.player
+        oppo_color = other_color(color)
+        boards = self.boards[color]
+        oppo_boards = self.boards[oppo_color]
+        own = self.occupancy[color]
+        opponent = self.occupancy[oppo_color]
+        occupancy = own | opponent
+        king_index = boards['king'].bit_length() - 1
+        king = INDEX_TO_GRID[king_index]
+        moves = [(king, INDEX_TO_GRID[target]) for target in get_bits(self.get_targets(king_index, color, 'king'))]
+        # 9. with two checkers only the king may move
+        checkers = self.get_attackers(king_index, oppo_color, occupancy)
+        if checkers & (checkers - 1):
+            return moves
+        # 10. with one checker, the other pieces must capture it or block its line
+        check_mask = ~0
+        if checkers:
+            check_mask = checkers | BETWEEN[king_index][checkers.bit_length() - 1]
+        # 11. look from the king through our own pieces: an opponent rook, bishop or queen
+        #     with exactly one of our pieces in between pins that piece to the line
+        pins = {}
+        snipers = rook_attacks(king_index, opponent) & (oppo_boards['rook'] | oppo_boards['queen']) | \
+            bishop_attacks(king_index, opponent) & (oppo_boards['bishop'] | oppo_boards['queen'])
+        for sniper in get_bits(snipers):
+            blockers = BETWEEN[king_index][sniper] & occupancy
+            if blockers & own and blockers & (blockers - 1) == 0:
+                pins[blockers.bit_length() - 1] = BETWEEN[king_index][sniper] | (1 << sniper)
+        # 12. knights and sliders need no special rules, so work them out right here
+        for role in ('knight', 'bishop', 'rook', 'queen'):
+            for index in get_bits(boards[role]):
+                if role == 'knight':
+                    targets = KNIGHT_ATTACKS[index]
+                elif role == 'bishop':
+                    targets = bishop_attacks(index, occupancy)
+                elif role == 'rook':
+                    targets = rook_attacks(index, occupancy)
+                else:
+                    targets = bishop_attacks(index, occupancy) | rook_attacks(index, occupancy)
+                targets &= ~own & check_mask
+                if index in pins:
+                    targets &= pins[index]
+                source = INDEX_TO_GRID[index]
+                while targets:
+                    low = targets & -targets
+                    moves.append((source, INDEX_TO_GRID[low.bit_length() - 1]))
+                    targets ^= low
+        for index in get_bits(boards['pawn']):
+            source = INDEX_TO_GRID[index]
+            targets = self.get_targets(index, color, 'pawn')
+            # en passant removes two pawns from one row, so simply try it
+            en_passant = targets & PAWN_ATTACKS[color][index] & ~opponent
+            targets &= ~en_passant & check_mask
+            if index in pins:
+                targets &= pins[index]
+            for target in get_bits(targets):
+                moves.append((source, INDEX_TO_GRID[target]))
+            if en_passant:
+                move = source, INDEX_TO_GRID[en_passant.bit_length() - 1]
+                undo = self.make_move(move, checkmate_check=False)
+                if not self.attacked(king_index, oppo_color):
+                    moves.append(move)
+                self.unmake_move(undo)
+        return moves
+
+    def apply_move(self, source, destination, promotion=None, checkmate_check=True):
+        index = grid_to_index(source)
+        color, role = self.find(index)
+        if color != self.player:
+            return
+        if destination not in self.get_legal_moves(source):
+            return
+        self.make_move((source, destination), promotion, checkmate_check)
+
+    # 5. a BitChess is only a few numbers, so its Undo is simply a copy of them
+    def make_move(self, move, promotion=None, checkmate_check=True):
+        undo = ({color: dict(self.boards[color]) for color in self.boards}, dict(self.occupancy), self.unmoved,
+                self.player, self.winner, self.en_passant, self.check, self.checkmate, self.stalemate)
+        source, destination = move
+        index = grid_to_index(source)
+        target = grid_to_index(destination)
+        color, role = self.find(index)
+        oppo_color = other_color(color)
+        # capture opponent piece (en passant takes the pawn beside the source)
+        captured_index = target
+        if role == 'pawn' and destination[1] != source[1] and not self.occupancy[oppo_color] & (1 << target):
+            captured_index = grid_to_index((source[0], destination[1]))
+        captured_color, captured_role = self.find(captured_index)
+        if captured_color == oppo_color:
+            self.take(oppo_color, captured_role, captured_index)
+            self.unmoved &= ~(1 << captured_index)
+            if captured_role == 'king':
+                self.winner = color
+        self.en_passant = None
+        # castling?
+        if role == 'king' and abs(source[1] - destination[1]) > 1:
+            if destination[1] > source[1]:
+                rook_index = grid_to_index((source[0], 7))
+                rook_target = target - 1
+            else:
+                rook_index = grid_to_index((source[0], 0))
+                rook_target = target + 1
+            self.take(color, 'rook', rook_index)
+            self.put(color, 'rook', rook_target)
+            self.unmoved &= ~(1 << rook_index)
+        self.take(color, role, index)
+        if promotion and role == 'pawn' and (destination[0] == 0 or destination[0] == 7):
+            role = promotion if promotion in ('queen', 'bishop', 'knight') else 'rook'
+        self.put(color, role, target)
+        self.unmoved &= ~(1 << index)
+        if role == 'pawn' and 2 == abs(source[0] - destination[0]):
+            self.en_passant = destination
+        # check?
+        self.check = False
+        king = self.boards[oppo_color]['king']
+        if self.winner is None and king:
+            self.check = self.attacked(king.bit_length() - 1, color)
+        self.player = oppo_color
+        if checkmate_check and self.winner is None and not self.get_all_moves():
+            if self.check:
+                self.winner = color
+                self.checkmate = True
+            else:
+                self.winner = 'draw'
+                self.stalemate = True
+        return undo
+
+    def unmake_move(self, undo):
+        boards, occupancy, self.unmoved, self.player, self.winner, self.en_passant, self.check, self.checkmate, \
+            self.stalemate = undo
+        self.boards = boards
+        self.occupancy = occupancy
+
+    def evaluate(self):
+        sum = 0
+        for role in ROLES:
+            sum += ROLE_VALUES[role] * (bin(self.boards['white'][role]).count('1') -
+                                        bin(self.boards['black'][role]).count('1'))
+        return sum
+
+
+class Player:
+    def __init__(self, color):
+        self.color = color
+
+
+class Human(Player):
+    pass
+
+
+class Monkey(Player):
+    # 7. remove piece_images
+    # 13. ask chess for the moves so that Chess and BitChess both work
+    def get_move(self, chess):
+        moves = chess.get_all_moves()
+        move = random.choice(moves)
+        promotion = None
+        if (move[1][0] == 0 or move[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+            promotion = 'queen'
+        return move, promotion
+
+
+class Greedy(Player):
+    def get_move(self, chess):
+        moves = chess.get_all_moves()
+
+        # we have all possible moves now
+        # 6. try the move on the board itself, then take it back
+        def get_value(move):
+            undo = chess.make_move(move, checkmate_check=False)
+            value = chess.evaluate()
+            chess.unmake_move(undo)
+            return value
+        values = [get_value(move) for move in moves]
+        max_value = max(values) if self.color == 'white' else min(values)
+        valid_moves = list(filter(lambda x: get_value(x) == max_value, moves))
+        move = random.choice(valid_moves)
+        promotion = None
+        if (move[1][0] == 0 or move[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+            promotion = 'queen'
+        return move, promotion
+
+
+indent = 0
+
+
+class Thinky(Player):
+    def minimax(self, chess, depth, alpha, beta):
+        moves = chess.get_all_moves()
+        global indent
+        # 6. no legal moves: lost when checkmated (as bad as losing the king), 0 for stalemate
+        if not moves:
+            value = 0
+            if chess.check:
+                value = -10000 if chess.player == 'white' else 10000
+            return None, None, value
+        if depth == 0:
+            # 7. search in place with make_move and unmake_move, no more clones
+            def get_value(move):
+                undo = chess.make_move(move, checkmate_check=False)
+                value = chess.evaluate()
+                chess.unmake_move(undo)
+                return value
+
+            values = [get_value(move) for move in moves]
+            max_value = max(values) if chess.player == 'white' else min(values)
+            valid_moves = list(filter(lambda x: get_value(x) == max_value, moves))
+            move = random.choice(valid_moves)
+            promotion = None
+            if (moves[1][0] == 0 or moves[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+                promotion = 'queen'
+            print(' ' * 4 * indent, end='')
+            print(f'{depth}: move={move} value={max_value}')
+            return move, promotion, max_value
+        else:
+            extreme_value = -math.inf if chess.player == 'white' else math.inf
+            extreme_move_promotions = []
+            n = len(moves)
+            for i, move in enumerate(moves):
+                promotion = None
+                if (moves[1][0] == 0 or moves[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+                    promotion = 'queen'
+                undo = chess.make_move(move, checkmate_check=False)
+                print(' ' * 4 * indent, end='')
+                print(f'{depth}: Evaluate move [{i}/{n}]:{move}')
+                indent += 1
+                new_move, new_promotion, new_value = \
+                    self.minimax(chess, depth - 1, alpha, beta)
+                indent -= 1
+                chess.unmake_move(undo)
+                if (chess.player == 'white' and new_value >= extreme_value) or \
+                   (chess.player == 'black' and new_value <= extreme_value):
+                    if new_value != extreme_value:
+                        extreme_move_promotions.clear()
+                    extreme_value = new_value
+                    extreme_move_promotions.append((move, promotion))
+                if chess.player == 'white':
+                    alpha = max(extreme_value, alpha)
+                else:
+                    beta = min(extreme_value, beta)
+                if alpha >= beta:
+                    break
+            extreme_move, extreme_promotion = random.choice(extreme_move_promotions)
+            print(' ' * 4 * indent, end='')
+            print(f'{depth}: move={extreme_move} value={extreme_value}')
+            return extreme_move, extreme_promotion, extreme_value
+
+    def get_move(self, chess):
+        move, promotion, value = self.minimax(chess, 2, -math.inf, math.inf)
+        return move, promotion
+
+
+def notation(move) -> str:
+    def coord(row_column) -> str:
+        return str(chr(row_column[1] + 65)) + str(8 - row_column[0])
+    return coord(move[0]) + '-' + coord(move[1])
+
+
+# 1. FEN describes a position in one line, e.g. the start position is
+#    rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1
+FEN_ROLES = {'p': Pawn, 'n': Knight, 'b': Bishop, 'r': Rook, 'q': Queen, 'k': King}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+def load_fen(fen, backend=Chess):
+    fields = fen.split()
+    pieces = []
+    for row, text in enumerate(fields[0].split('/')):
+        column = 0
+        for letter in text:
+            if letter.isdigit():
+                column += int(letter)
+            else:
+                color = 'white' if letter.isupper() else 'black'
+                pieces.append(FEN_ROLES[letter.lower()](color, (row, column)))
+                column += 1
+    # castling rights tell which kings and rooks have not moved yet
+    corners = {'K': (7, 7), 'Q': (7, 0), 'k': (0, 7), 'q': (0, 0)}
+    unmoved = [corners[letter] for letter in fields[2] if letter in corners]
+    for piece in pieces:
+        if isinstance(piece, Rook):
+            piece.moved = piece.grid_pos not in unmoved
+        elif isinstance(piece, King):
+            piece.moved = not any(gp[0] == piece.grid_pos[0] for gp in unmoved)
+    chess = backend(pieces)
+    chess.player = 'white' if fields[1] == 'w' else 'black'
+    # FEN names the square behind the pawn, Chess remembers the pawn itself
+    if fields[3] != '-':
+        row = 8 - int(fields[3][1])
+        chess.en_passant = (4 if row == 5 else 3, ord(fields[3][0]) - ord('a'))
+    king = next(filter(lambda x: isinstance(x, King) and x.color == chess.player, pieces))
+    chess.check = king.grid_pos in chess.get_danger_zone(chess.player)
+    return chess
+
+
+# 2. perft counts the positions reachable in exactly depth moves.
+#    The counts for well known positions are published, so a different count means a bug.
+def get_promotions(chess, move):
+    # a pawn reaching the last row makes four different moves
+    if (move[1][0] == 0 or move[1][0] == 7) and isinstance(chess.get_piece(move[0]), Pawn):
+        return ['queen', 'rook', 'bishop', 'knight']
+    return [None]
+
+
+def perft(chess, depth):
+    if depth == 0:
+        return 1
+    moves = chess.get_all_moves()
+    if depth == 1:
+        return sum(len(get_promotions(chess, move)) for move in moves)
+    nodes = 0
+    for move in moves:
+        for promotion in get_promotions(chess, move):
+            undo = chess.make_move(move, promotion, checkmate_check=False)
+            nodes += perft(chess, depth - 1)
+            chess.unmake_move(undo)
+    return nodes
+
+
+# 3. divide prints the count below every first move, to find which move is wrong
+def divide(chess, depth):
+    start = time.time()
+    total = 0
+    for move in chess.get_all_moves():
+        for promotion in get_promotions(chess, move):
+            undo = chess.make_move(move, promotion, checkmate_check=False)
+            nodes = perft(chess, depth - 1)
+            chess.unmake_move(undo)
+            print(f'{notation(move)}{" " + promotion if promotion else ""}: {nodes}')
+            total += nodes
+    seconds = time.time() - start
+    print(f'total={total} time={seconds:.2f}s nodes/s={int(total / seconds) if seconds else 0}')
+    return total
+
+
+# 4. reference positions and their counts for depth 1, 2, 3, ... as found by other chess programs
+PERFT_POSITIONS = (
+    ('start', START_FEN, (20, 400, 8902, 197281)),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', (48, 2039, 97862)),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', (14, 191, 2812, 43238)),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', (6, 264, 9467)),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', (44, 1486, 62379)),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P3/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', (47, 1845, 81467))
+)
+
+
+def perft_check(backend):
+    passed = True
+    for name, fen, counts in PERFT_POSITIONS:
+        for depth, expected in enumerate(counts, 1):
+            chess = load_fen(fen, backend)
+            start = time.time()
+            nodes = perft(chess, depth)
+            seconds = time.time() - start
+            result = 'ok' if nodes == expected else f'FAILED, expected {expected}'
+            print(f'{backend.__name__} {name} depth={depth} nodes={nodes} '
+                  f'nodes/s={int(nodes / seconds) if seconds else 0} {result}')
+            passed = passed and nodes == expected
+    return passed
+
+
+class App:
+    # 15. choose the backend: Chess or BitChess
+    def __init__(self, backend=Chess):
+        pg.init()
+        self.screen = pg.display.set_mode(RESOLUTION)
+        self.piece_images = PiecesImage('chess_pieces.png', self.screen)
+        self.chess = backend(create_pieces())
+        self.saves = [self.chess.clone()]
+        self.state = 'free'
+        self.hover = None
+        self.source = None
+        self.players = [Human('white'), Greedy('black')]
+
+    def draw_board(self):
+        for row in range(8):
+            for column in range(8):
+                color = 'white' if (row + column) % 2 == 0 else 'black'
+                rect = grid_to_rect((row, column))
+                self.screen.fill(color, rect)
+
+    # 5. make draw_piece function
+    def draw_piece(self, piece):
+        image = self.piece_images.get_image(piece.color, piece.get_role())
+        image = pg.transform.scale(image, (GRID, GRID))
+        self.screen.blit(image, (piece.grid_pos[1] * GRID, piece.grid_pos[0] * GRID))
+
+    def run(self):
+        while True:
+            # drawing
+            pg.display.flip()
+            self.draw_board()
+            [self.draw_piece(piece) for piece in self.chess.pieces]
+
+            # draw self.hover
+            if self.hover:
+                s = pg.surface.Surface((GRID, GRID))
+                s.fill('blue')
+                s.set_alpha(150)
+                self.screen.blit(s, grid_to_rect(self.hover))
+                legal_moves = self.chess.get_legal_moves(self.hover)
+                s.fill('yellow')
+                s.set_alpha(150)
+                [self.screen.blit(s, grid_to_rect(p)) for p in legal_moves]
+
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    exit(0)
+
+                if self.chess.winner is None:
+                    current_player = next(filter(lambda x: x.color == self.chess.player, self.players))
+                    if isinstance(current_player, Human):
+                        if event.type == pg.MOUSEMOTION:
+                            if self.state == 'free' and self.chess.winner is None:
+                                pos = pg.mouse.get_pos()
+                                self.hover = get_grid(pos)
+                        elif event.type == pg.KEYDOWN:
+                            if pg.key.get_pressed()[pg.K_COMMA]:
+                                if len(self.saves) >= 3:
+                                    self.saves = self.saves[:-2]
+                                    self.chess = self.saves[-1].clone()
+                                    self.state = 'free'
+                                    self.hover = None
+                                    self.source = None
+                        elif event.type == pg.MOUSEBUTTONDOWN:
+                            # mouse interaction. Move
+                            left, mid, right = pg.mouse.get_pressed(3)
+                            if right:
+                                # right-click
+                                self.state = 'free'
+                                self.hover = None
+                                self.source = None
+                            elif left:
+                                # left-click
+                                grid_pos = get_grid(pg.mouse.get_pos())
+                                if self.state == 'free':
+                                    side = self.chess.report(grid_pos, self.chess.player)
+                                    if side == 'friend':
+                                        self.source = grid_pos
+                                        self.state = 'selected'
+                                elif self.state == 'selected':
+                                    if grid_pos in self.chess.get_legal_moves(self.source):
+                                        if isinstance(self.chess.get_piece(self.source), Pawn) and \
+                                                (grid_pos[0] == 0 or grid_pos[0] == 7):
+                                            answer = 0
+                                            while answer < 1 or answer > 4:
+                                                answer = int(input('Promotion: [1]Queen [2]Bishop [3]Knight [4]Rook'))
+                                            role = ['queen', 'bishop', 'knight', 'rook'][answer - 1]
+                                            self.chess.apply_move(self.source, grid_pos, promotion=role)
+                                        else:
+                                            self.chess.apply_move(self.source, grid_pos)
+                                        print(f'{self.chess.get_piece(self.source).color}: {notation((self.source, grid_pos))}')
+                                        if self.chess.stalemate:
+                                            print('Stalemate!')
+                                        elif self.chess.winner:
+                                            print(f'{self.chess.winner} won!!!')
+                                        elif self.chess.check:
+                                            print("Check!")
+                                        self.saves.append(self.chess.clone())
+                                        self.state = 'free'
+                                        self.hover = None
+                                        self.source = None
+                    else:
+                        move, promotion = current_player.get_move(self.chess)
+                        print(move, promotion)
+                        self.chess.apply_move(move[0], move[1], promotion=promotion)
+                        print(notation(move))
+                        if self.chess.stalemate:
+                            print('Stalemate!')
+                        elif self.chess.winner:
+                            print(f'{self.chess.winner} won!!!')
+                        elif self.chess.check:
+                            print("Check!")
+                        self.saves.append(self.chess.clone())
+
+
+def gui_app():
+    app = App()
+    app.run()
+
+
+# Q-Learning Paper
+# https://link.springer.com/article/10.1007/BF00992698
+#
+class QMatrix:
+    def __init__(self):
+        self.q_entries = {}
+
+    def __repr__(self):
+        return f"""QMatrix({self.q_entries})"""
+
+    def set_entry(self, state, action, value):
+        if state and action:
+            entry = self.q_entries.get(state, None)
+            if entry:
+                entry[action] = value
+            else:
+                self.q_entries[state] = {action: value}
+
+    def get_entry(self, state, action):
+        if state and action:
+            entry = self.q_entries.get(state, None)
+            if entry:
+                return entry.get(action, 0)
+        return 0
+
+
+class Trainer(Player):
+    def __init__(self, color: str, q_matrix: QMatrix, alpha: float, gamma: float, epsilon: float):
+        super().__init__(color)
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.q_matrix = q_matrix
+        self.last_state = None
+        self.last_action = None
+
+    def __repr__(self):
+        return f"""
+Trainer(alpha={self.alpha} gamma={self.gamma} epsilon={self.epsilon}
+{self.q_matrix})
+"""
+
+    def endgame(self, reward):
+        if self.last_state and self.last_action:
+            last_score = self.q_matrix.get_entry(self.last_state, self.last_action)
+            score = (1 - self.alpha) * last_score + self.alpha * reward
+            self.q_matrix.set_entry(self.last_state, self.last_action, score)
+
+    def get_move(self, chess: Chess):
+        # 14. Chess and BitChess both build the state
+        chess_state = chess.get_state()
+        chess_moves = chess.get_all_moves()
+        if chess_moves is None:
+            for i, state in enumerate(chess_state):
+                role = state[1][:1]
+                if state[0] == 'white':
+                    role = role.upper()
+                print(role, end=' ')
+                if (i+1) % 8 == 0:
+                    print('')
+        # chess_state and all chess_moves are prepared
+        if random.random() <= self.epsilon:
+            move = random.choice(chess_moves)
+        else:
+            entries = [self.q_matrix.get_entry(chess_state, tuple(move)) for move in chess_moves]
+            # use Q-Learning formula to update
+            old_score = self.q_matrix.get_entry(self.last_state, self.last_action)
+            score = (1 - self.alpha) * old_score + self.alpha * self.gamma * max(entries)
+            self.q_matrix.set_entry(self.last_state, self.last_action, score)
+            valid_moves = list(filter(lambda x: self.q_matrix.get_entry(chess_state, x) == entries, chess_moves))
+            if valid_moves:
+                move = random.choice(valid_moves)
+            else:
+                move = random.choice(chess_moves)
+        self.last_state = chess_state
+        self.last_action = tuple(move)
+        return move, 'queen'
+
+
+class TrainingApp:
+    def __init__(self, trainer, backend=Chess):
+        self.chess = backend(create_pieces())
+        self.players = [Greedy('white'), trainer]
+
+    def run(self):
+        # 7. kings are never captured any more, so stop a game that goes on too long as a draw
+        moves = 0
+        while self.chess.winner is None:
+            moves += 1
+            if moves > 300:
+                self.chess.winner = 'draw'
+                break
+            current_player = next(filter(lambda x: x.color == self.chess.player, self.players))
+            move, promotion = current_player.get_move(self.chess)
+            piece = self.chess.get_piece(move[0])
+            self.chess.apply_move(move[0], move[1])
+            check_str = 'Checkmate!' if self.chess.checkmate else 'Check!' if self.chess.check else ''
+            print(f'{piece.color} {piece.get_role()}: {notation(move)} {check_str}')
+        trainers = list(filter(lambda x: isinstance(x, Trainer), self.players))
+        print(f"The winner is {self.chess.winner}")
+        for trainer in trainers:
+            reward = 1 if trainer.color == self.chess.winner else 0 if self.chess.winner == 'draw' else -1
+            trainer.endgame(reward)
+        return list(filter(lambda x: isinstance(x, Trainer), self.players))
+
+
+# Try 10 games:
+# 1. use my_trainer that persists for all games
+# 2. gradually reduce epsilon
+# 3. print the moves and detect and fix errors
+# 4. print my_trainer after each game to examine the results
+#
+# Try perft:
+# python main28.py perft            check every reference position with Chess and BitChess
+# python main28.py perft 3          divide from the start position
+# python main28.py perft 3 <fen>    divide from any position
+if len(sys.argv) > 1 and sys.argv[1] == 'perft':
+    if len(sys.argv) > 2:
+        fen = ' '.join(sys.argv[3:]) if len(sys.argv) > 3 else START_FEN
+        divide(load_fen(fen, BitChess), int(sys.argv[2]))
+    else:
+        perft_check(BitChess)
+        perft_check(Chess)
+else:
+    num_games = 10
+    epsilon = 1.0
+    epsilon_delta = 1 / num_games
+    my_trainer = Trainer('black', QMatrix(), 0.1, 0.1, epsilon)
+    for game in range(num_games):
+        app = TrainingApp(my_trainer, BitChess)
+        my_trainer = app.run()[0]
+        print(my_trainer)
+        my_trainer.epsilon -= epsilon_delta
+
+
+
@@ -0,0 +1,229 @@
+import sys
+import time
+import threading
+from chess_engine import BitChess, Thinky, START_FEN, load_fen
+
+# The Universal Chess Interface: a GUI or a tournament program (cutechess-cli, Arena, ...)
+# sends commands on stdin and Thinky answers on stdout. Start it with
+#
+# python uci.py
+#
+# and type for example:
+#
+# uci
+# position startpos moves e2e4 e7e5
+# go movetime 2000
+#
+# Only the commands this engine needs are understood, the others are ignored as the
+# protocol asks.
+
+ENGINE_NAME = 'Thinky'
+ENGINE_AUTHOR = 'bruce-liang1029'
+# go without a depth searches until stop, the time or the nodes end it
+MAX_DEPTH = 64
+# with wtime/btime, use this part of the time left for one move
+MOVES_TO_GO = 30
+
+
+# 1. UCI names the squares a1 to h8, the engine uses (row, column) from the top left
+def parse_square(text):
+    return 8 - int(text[1]), ord(text[0]) - ord('a')
+
+
+def format_square(grid_pos):
+    return chr(grid_pos[1] + ord('a')) + str(8 - grid_pos[0])
+
+
+UCI_PROMOTIONS = {'q': 'queen', 'r': 'rook', 'b': 'bishop', 'n': 'knight'}
+
+
+def parse_move(text):
+    move = parse_square(text[0:2]), parse_square(text[2:4])
+    return move, UCI_PROMOTIONS.get(text[4:5])
+
+
+def format_move(move, promotion=None):
+    letters = {role: letter for letter, role in UCI_PROMOTIONS.items()}
+    return format_square(move[0]) + format_square(move[1]) + letters.get(promotion, '')
+
+
+class UCI:
+    def __init__(self, backend=BitChess, options=None):
+        self.backend = backend
+        # the settings of Thinky, the strongest ones of search_benchmark
+        self.options = options or {'search': 'pvs', 'null_move_reduction': 2, 'late_move_after': 3}
+        self.chess = load_fen(START_FEN, backend)
+        # 6. the Ponder option: Thinky searches the expected reply after its move
+        self.ponder = False
+        # the go command that came with go ponder, searched when ponderhit comes
+        self.ponder_words = None
+        self.thinky = self.new_thinky()
+        self.thread = None
+        # the position being searched, the board of the search thread
+        self.searching = None
+        # the search thread and the command loop both write
+        self.lock = threading.Lock()
+
+    def new_thinky(self):
+        return Thinky('white', on_depth=self.send_info, ponder=self.ponder, **self.options)
+
+    def send(self, line):
+        with self.lock:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    # 2. after every depth: the same numbers every engine reports, so nps can be compared
+    def send_info(self, depth, value, pv):
+        nodes = self.thinky.stats.get_nodes()
+        elapsed = time.time() - self.thinky.start_time
+        # the engine scores from white's side in pawns, UCI from the side to move in centipawns
+        if self.searching.player == 'black':
+            value = -value
+        if abs(value) >= 10000:
+            moves = (len(pv) + 1) // 2
+            score = f'mate {moves if value > 0 else -moves}'
+        else:
+            score = f'cp {round(100 * value)}'
+        line = f'info depth {depth} score {score} nodes {nodes} nps {int(nodes / elapsed) if elapsed else 0} ' \
+               f'time {int(1000 * elapsed)}'
+        # checkmated or stalemated: there is no pv
+        self.send(f'{line} pv {self.format_pv(pv)}' if pv else line)
+
+    def format_pv(self, pv):
+        # the table only keeps the squares, play the moves on a copy to find the promotions.
+        # on_depth is called between two depths, so the board of the search is not moving.
+        chess = self.searching.clone()
+        texts = []
+        for move in pv:
+            promotion = self.thinky.get_promotion(chess, move)
+            texts.append(format_move(move, promotion))
+            chess.make_move(move, promotion, checkmate_check=False)
+        return ' '.join(texts)
+
+    # 3. position startpos [moves ...] or position fen <fen> [moves ...]
+    def position(self, words):
+        moves = words.index('moves') if 'moves' in words else len(words)
+        fen = START_FEN if words[1] == 'startpos' else ' '.join(words[2:moves])
+        self.chess = load_fen(fen, self.backend)
+        for text in words[moves + 1:]:
+            move, promotion = parse_move(text)
+            self.chess.make_move(move, promotion)
+
+    # 4. go depth / movetime / wtime btime winc binc / nodes / infinite
+    def go(self, words):
+        args = {words[i]: int(words[i + 1]) for i in range(1, len(words) - 1) if words[i + 1].lstrip('-').isdigit()}
+        # Thinky takes the limits in get_move, after its pondering has ended or become this search
+        limits = {'depth': args.get('depth', MAX_DEPTH), 'node_limit': args.get('nodes'), 'time_limit': None}
+        if 'movetime' in args:
+            limits['time_limit'] = args['movetime'] / 1000
+        else:
+            white = self.chess.player == 'white'
+            left = args.get('wtime' if white else 'btime')
+            if left is not None:
+                increment = args.get('winc' if white else 'binc', 0)
+                moves_to_go = args.get('movestogo', MOVES_TO_GO)
+                limits['time_limit'] = min(left / moves_to_go + increment, left / 2) / 1000
+        # search a copy, so that a position command can not change the board under the search
+        self.searching = self.chess.clone()
+        self.thread = threading.Thread(target=self.search, args=(self.searching, limits), daemon=True)
+        self.thread.start()
+
+    def search(self, chess, limits):
+        best = self.thinky.get_move(chess, limits)
+        # no move: stopped before the first depth finished, or checkmate or stalemate, where
+        # the search gives (None, None). The GUI still waits for a bestmove.
+        if best is None or best[0] is None:
+            moves = chess.get_all_moves()
+            best = (moves[0], self.thinky.get_promotion(chess, moves[0])) if moves else None
+        if best is None:
+            self.send('bestmove 0000')
+        elif self.thinky.ponder and self.thinky.ponder_move:
+            # get_move has played the move on its board already to start pondering
+            reply = self.thinky.ponder_move
+            after = chess.clone()
+            after.make_move(best[0], best[1], checkmate_check=False)
+            self.send(f'bestmove {format_move(*best)} ponder {format_move(reply, self.thinky.get_promotion(after, reply))}')
+        else:
+            self.send(f'bestmove {format_move(*best)}')
+
+    # 5. the search checks stopped at every node, so it ends within a node. It could still be
+    #    setting up and clear stopped again, so keep setting it until the thread is done.
+    def stop(self):
+        while self.thread and self.thread.is_alive():
+            self.thinky.stopped = True
+            self.thread.join(0.01)
+        self.thread = None
+
+    def run(self, lines=sys.stdin):
+        for line in lines:
+            words = line.split()
+            if not words:
+                continue
+            command = words[0]
+            if command == 'uci':
+                self.send(f'id name {ENGINE_NAME}')
+                self.send(f'id author {ENGINE_AUTHOR}')
+                self.send('option name Ponder type check default false')
+                self.send('uciok')
+            elif command == 'isready':
+                self.send('readyok')
+            elif command == 'setoption' and len(words) >= 5 and words[2] == 'Ponder':
+                self.ponder = words[4] == 'true'
+                self.thinky.ponder = self.ponder
+            elif command == 'ucinewgame':
+                self.stop()
+                self.thinky.stop_pondering()
+                self.thinky = self.new_thinky()
+            elif command == 'position':
+                self.stop()
+                self.position(words)
+            elif command == 'go' and 'ponder' in words:
+                # 7. the GUI plays the expected reply and lets the engine think on it. Thinky
+                #    has done so since its last move already, so only wait for the result.
+                self.stop()
+                self.ponder_words = [word for word in words if word != 'ponder']
+            elif command == 'ponderhit':
+                words, self.ponder_words = self.ponder_words, None
+                if words:
+                    self.go(words)
+            elif command == 'go':
+                self.stop()
+                self.go(words)
+            elif command == 'stop':
+                if self.ponder_words:
+                    # the reply was not played: the pondering stops in the next go
+                    self.ponder_words = None
+                    self.send('bestmove 0000')
+                self.stop()
+            elif command == 'quit':
+                break
+        self.stop()
+        self.thinky.stop_pondering()
+
+
+# 8. positions with a known answer, the ones without a legal move must still send a bestmove
+UCI_POSITIONS = (
+    ('checkmated', '7k/6Q1/6K1/8/8/8/8/8 b - - 0 1', 'bestmove 0000'),
+    ('stalemate', '7k/8/6QK/8/8/8/8/8 b - - 0 1', 'bestmove 0000'),
+    ('mate in one', '6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1', 'bestmove a1a8'),
+)
+
+
+def uci_check():
+    for name, fen, expected in UCI_POSITIONS:
+        uci = UCI()
+        lines = []
+        uci.send = lines.append
+        uci.position(['position', 'fen'] + fen.split())
+        uci.go(['go', 'depth', '3'])
+        uci.thread.join()
+        answer = lines[-1] if lines else None
+        print(f'{name}: {answer} {"ok" if answer == expected else "expected " + expected}')
+
+
+# python uci.py check    play the positions of UCI_POSITIONS
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        uci_check()
+    else:
+        UCI().run()